@@ -0,0 +1,332 @@
+"""
+Latency, throughput and memory of the API endpoints.
+
+Run from the ``backend`` directory:
+
+    python -m benchmarks.api --rows 100000 --output results.json
+    python -m benchmarks.api --cold --baseline results.json
+
+Every scenario runs in its own process against a fresh temporary database,
+cache and report directory, with requests issued through Django's test
+client. Read scenarios are warm by default (the response cache and rendered
+PDFs are reused); ``--cold`` invalidates both before every request so the
+full query and render cost is measured. With ``--baseline`` the run is
+compared to an earlier results file and exits non-zero if any scenario's
+p95 latency regressed by more than ``--tolerance``.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+
+from .synthetic import TYPES, write_csv
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+PERCENTILES = [50, 90, 95, 99]
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _consume(response):
+    if response.streaming:
+        size = sum(len(part) for part in response.streaming_content)
+    else:
+        size = len(response.content)
+    response.close()
+    return size
+
+
+class Scenario:
+    """
+    One timed endpoint. ``setup`` loads data; ``prepare`` runs untimed before
+    every call; ``request`` issues one call; ``invalidate`` drops whatever a
+    warm run would reuse.
+    """
+    iterations_option = 'iterations'
+
+    def __init__(self, config):
+        self.config = config
+
+    def setup(self, client):
+        pass
+
+    def prepare(self):
+        pass
+
+    def invalidate(self):
+        from equipment.caching import bump_data_version
+        bump_data_version()
+
+    def request(self, client):
+        raise NotImplementedError
+
+    def ingest(self, count):
+        from equipment.ingest import ingest_csv
+
+        datasets = []
+        for _ in range(count):
+            with open(self.config['csv'], 'rb') as file:
+                datasets.append(ingest_csv(file).dataset)
+        return datasets
+
+
+class Upload(Scenario):
+    iterations_option = 'upload_iterations'
+
+    def setup(self, client):
+        self.path = Path(self.config['workdir']) / 'upload.csv'
+        self.uploads = 0
+
+    def prepare(self):
+        # Distinct content per upload, or every upload after the first would
+        # be answered by deduplication instead of being ingested.
+        self.uploads += 1
+        shutil.copyfile(self.config['csv'], self.path)
+        with open(self.path, 'a') as file:
+            file.write(f'Bench-{self.uploads},{TYPES[0]},1,1,1\n')
+
+    def invalidate(self):
+        pass
+
+    def request(self, client):
+        with open(self.path, 'rb') as file:
+            response = client.post('/api/upload/', {'file': file})
+        if response.status_code != 201:
+            raise RuntimeError(f"upload returned {response.status_code}: {response.content[:200]!r}")
+        return response
+
+
+class Summary(Scenario):
+    def setup(self, client):
+        self.ingest(1)
+
+    def request(self, client):
+        return client.get('/api/summary/')
+
+
+class History(Scenario):
+    def setup(self, client):
+        self.ingest(self.config['datasets'])
+
+    def request(self, client):
+        return client.get('/api/history/')
+
+
+class ReportPDF(Scenario):
+    detail = ''
+
+    def setup(self, client):
+        self.dataset = self.ingest(1)[0]
+
+    def invalidate(self):
+        from equipment import reports
+        super().invalidate()
+        reports.delete_reports(self.dataset.id)
+
+    def request(self, client):
+        return client.get('/api/report_pdf/', {'detail': self.detail} if self.detail else {})
+
+
+class ReportPDFFull(ReportPDF):
+    detail = 'full'
+
+
+SCENARIOS = {
+    'upload': Upload,
+    'summary': Summary,
+    'history': History,
+    'report_pdf': ReportPDF,
+    'report_pdf_full': ReportPDFFull,
+}
+DEFAULT_SCENARIOS = ['upload', 'summary', 'history', 'report_pdf']
+
+
+def configure(workdir):
+    """
+    Point every on-disk location at ``workdir``. Must run before the first
+    cache access.
+    """
+    from django.conf import settings
+
+    settings.CACHES['equipment']['LOCATION'] = str(workdir / 'cache')
+    settings.EQUIPMENT_STAGING_DIR = workdir / 'staging'
+    settings.EQUIPMENT_COLUMNAR_DIR = workdir / 'columnar'
+    settings.EQUIPMENT_REPORT_DIR = workdir / 'reports'
+    # Background pre-rendering would compete with the request being timed.
+    settings.EQUIPMENT_REPORT_PRERENDER = False
+
+
+def run_worker(name, config):
+    import django
+    from django.core.management import call_command
+    from django.test import Client
+
+    django.setup()
+    configure(Path(config['workdir']))
+    call_command('migrate', verbosity=0)
+
+    scenario = SCENARIOS[name](config)
+    client = Client()
+    scenario.setup(client)
+
+    latencies = []
+    statuses = {}
+    sizes = []
+    for _ in range(config[scenario.iterations_option]):
+        if config['cold']:
+            scenario.invalidate()
+        scenario.prepare()
+        started = time.perf_counter()
+        response = scenario.request(client)
+        sizes.append(_consume(response))
+        latencies.append(time.perf_counter() - started)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    total = sum(latencies)
+    result = {
+        'iterations': len(latencies),
+        'status_codes': {str(code): count for code, count in sorted(statuses.items())},
+        'latency_ms': {
+            **{f'p{p}': round(float(np.percentile(latencies, p)) * 1000, 2) for p in PERCENTILES},
+            'mean': round(total / len(latencies) * 1000, 2),
+            'max': round(max(latencies) * 1000, 2),
+        },
+        'throughput_rps': round(len(latencies) / total, 2),
+        'response_bytes': int(np.mean(sizes)),
+        'peak_rss_mb': peak_rss_mb(),
+    }
+    if name == 'upload':
+        result['rows_per_sec'] = round(config['rows'] * len(latencies) / total, 1)
+    print(json.dumps(result))
+
+
+def run_scenario(name, config):
+    workdir = Path(config['workdir']) / name
+    workdir.mkdir()
+    env = dict(os.environ)
+    env['EQUIPMENT_DB_PATH'] = str(workdir / 'db.sqlite3')
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.api', '--worker', name, json.dumps(dict(config, workdir=str(workdir)))],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """
+    Print p50/p95 against ``baseline`` and return the regressed scenarios.
+    """
+    regressed = []
+    print(f"\n{'scenario':<16} {'p50 ms':>10} {'base':>10} {'p95 ms':>10} {'base':>10} {'change':>8}")
+    for name, result in results['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if previous is None:
+            continue
+        now, before = result['latency_ms'], previous['latency_ms']
+        change = now['p95'] / before['p95'] - 1 if before['p95'] else 0.0
+        flag = ' !' if change > tolerance else ''
+        print(
+            f"{name:<16} {now['p50']:>10.2f} {before['p50']:>10.2f} "
+            f"{now['p95']:>10.2f} {before['p95']:>10.2f} {change:>+7.0%}{flag}"
+        )
+        if change > tolerance:
+            regressed.append(name)
+    return regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the equipment API endpoints.')
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=DEFAULT_SCENARIOS)
+    parser.add_argument('--rows', type=int, default=100000, help='rows per dataset')
+    parser.add_argument('--types', type=int, default=len(TYPES), help='distinct equipment types')
+    parser.add_argument('--datasets', type=int, default=10, help='datasets loaded for the history scenario')
+    parser.add_argument('--iterations', type=int, default=20, help='requests per read scenario')
+    parser.add_argument('--upload-iterations', type=int, default=3)
+    parser.add_argument('--cold', action='store_true', help='invalidate caches before every request')
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--baseline', help='earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed p95 slowdown against the baseline')
+    parser.add_argument('--worker', nargs=2, metavar=('SCENARIO', 'CONFIG'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        run_worker(args.worker[0], json.loads(args.worker[1]))
+        return 0
+
+    config = {
+        'rows': args.rows,
+        'types': args.types,
+        'datasets': args.datasets,
+        'iterations': args.iterations,
+        'upload_iterations': args.upload_iterations,
+        'cold': args.cold,
+    }
+    results = {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            **config,
+        },
+        'scenarios': {},
+    }
+
+    with tempfile.TemporaryDirectory() as workdir:
+        config['workdir'] = workdir
+        config['csv'] = str(write_csv(Path(workdir) / 'equipment.csv', args.rows, args.types))
+        print(f"{'scenario':<16} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'req/s':>9} {'rss MB':>8}")
+        for name in args.scenarios:
+            result = run_scenario(name, config)
+            results['scenarios'][name] = result
+            latency = result['latency_ms']
+            print(
+                f"{name:<16} {latency['p50']:>10.2f} {latency['p95']:>10.2f} {latency['p99']:>10.2f} "
+                f"{result['throughput_rps']:>9.2f} {result['peak_rss_mb'] or '-':>8}"
+            )
+
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(results, out, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressed = compare(results, json.load(file), args.tolerance)
+        if regressed:
+            print(f"\nRegressed: {', '.join(regressed)}")
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
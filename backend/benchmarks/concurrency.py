@@ -0,0 +1,286 @@
+"""
+Many concurrent clients against the WSGI and the ASGI deployment.
+
+Run from the ``backend`` directory:
+
+    python -m benchmarks.concurrency --clients 500 --requests 10
+    python -m benchmarks.concurrency --clients 500 --streams 50
+    python -m benchmarks.concurrency --modes asgi --path /api/history/
+
+Each mode gets a fresh temporary database, cache and report directory with
+``--datasets`` uploads of ``--rows`` rows, and is served by a real server:
+gunicorn with threaded workers for WSGI (``config.wsgi``) and uvicorn for
+ASGI (``config.asgi``, which routes the read endpoints to their async
+views), both with ``--workers`` processes. ``--clients`` connections are
+opened at once and each sends ``--requests`` keep-alive GETs of ``--path``
+in turn; latency is measured per request from the client side, and
+requests without a response after ``--timeout`` seconds count as errors.
+With ``--streams``, that many dashboards keep ``/api/events/`` open during
+the run: under WSGI each one holds a server thread for as long as it is
+connected, under ASGI none do.
+
+Both modes run one server process by default. With several uvicorn workers
+the accepted sockets miss TCP_NODELAY (they come from a socket created
+with protocol 0, which asyncio skips), and delayed ACKs then add ~40 ms to
+every response, which would measure the socket setup rather than the app.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from .api import BACKEND_DIR, PERCENTILES, configure
+from .synthetic import TYPES, write_csv
+
+HOST = '127.0.0.1'
+
+SETTINGS = '''from config.settings import *  # noqa
+from pathlib import Path
+
+WORKDIR = Path({workdir!r})
+CACHES['equipment']['LOCATION'] = str(WORKDIR / 'cache')
+EQUIPMENT_STAGING_DIR = WORKDIR / 'staging'
+EQUIPMENT_COLUMNAR_DIR = WORKDIR / 'columnar'
+EQUIPMENT_REPORT_DIR = WORKDIR / 'reports'
+'''
+
+
+def server_command(mode, port, workers, threads):
+    if mode == 'wsgi':
+        return [
+            sys.executable, '-m', 'gunicorn', 'config.wsgi:application', '--bind', f'{HOST}:{port}',
+            '--workers', str(workers), '--worker-class', 'gthread', '--threads', str(threads),
+            '--log-level', 'warning',
+        ]
+    return [
+        sys.executable, '-m', 'uvicorn', 'config.asgi:application', '--host', HOST, '--port', str(port),
+        '--workers', str(workers), '--log-level', 'warning', '--no-access-log',
+    ]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"server exited with status {process.returncode}")
+        try:
+            with socket.create_connection((HOST, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"server did not listen on port {port} within {timeout}s")
+
+
+def load_data(config):
+    """
+    Migrate the mode's database and upload the datasets, in this process.
+    """
+    import django
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.core.management import call_command
+    from django.test import Client
+
+    django.setup()
+    configure(Path(config['workdir']))
+    call_command('migrate', verbosity=0)
+    client = Client()
+    for i in range(config['datasets']):
+        # Distinct content per dataset, or uploads would be deduplicated.
+        body = Path(config['csv']).read_bytes() + f'Extra-{i},{TYPES[0]},1,1,1\n'.encode()
+        response = client.post('/api/upload/', {'file': SimpleUploadedFile(f'equipment_{i}.csv', body)})
+        if response.status_code != 201:
+            raise RuntimeError(f"upload failed with {response.status_code}: {response.content[:200]!r}")
+
+
+async def fetch(reader, writer, path):
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: {HOST}\r\n\r\n'.encode())
+    await writer.drain()
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = dict(line.split(': ', 1) for line in lines[1:] if ': ' in line)
+    length = {name.lower(): value for name, value in headers.items()}.get('content-length')
+    if length is None:
+        raise RuntimeError(f"{path} answered without Content-Length")
+    await reader.readexactly(int(length))
+    return status
+
+
+async def hold_stream(port, connected):
+    reader, writer = await asyncio.open_connection(HOST, port)
+    try:
+        writer.write(f'GET /api/events/ HTTP/1.1\r\nHost: {HOST}\r\n\r\n'.encode())
+        await writer.drain()
+        await reader.readuntil(b'\r\n\r\n')
+        connected.append(True)
+        while await reader.read(4096):
+            pass
+    finally:
+        writer.close()
+
+
+async def client(port, path, requests, timeout, latencies, statuses):
+    try:
+        reader, writer = await asyncio.open_connection(HOST, port)
+    except OSError:
+        statuses['connect_error'] = statuses.get('connect_error', 0) + requests
+        return
+    try:
+        for _ in range(requests):
+            started = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(fetch(reader, writer, path), timeout)
+            except asyncio.TimeoutError:
+                statuses['timeout'] = statuses.get('timeout', 0) + 1
+                return
+            except (OSError, asyncio.IncompleteReadError, RuntimeError):
+                statuses['error'] = statuses.get('error', 0) + 1
+                return
+            latencies.append(time.perf_counter() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def load(port, path, clients, requests, timeout, streams=0):
+    connected = []
+    holders = [asyncio.ensure_future(hold_stream(port, connected)) for _ in range(streams)]
+    # Give the streams a moment to be accepted; some may never be.
+    deadline = time.monotonic() + 5
+    while len(connected) < streams and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+
+    latencies = []
+    statuses = {}
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(client(port, path, requests, timeout, latencies, statuses) for _ in range(clients)))
+    finally:
+        for holder in holders:
+            holder.cancel()
+        await asyncio.gather(*holders, return_exceptions=True)
+    return latencies, statuses, time.perf_counter() - started, len(connected)
+
+
+def run_mode(mode, config):
+    workdir = Path(config['workdir']) / mode
+    workdir.mkdir()
+    (workdir / 'bench_settings.py').write_text(SETTINGS.format(workdir=str(workdir)))
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(workdir), str(BACKEND_DIR), env.get('PYTHONPATH')]))
+    env['DJANGO_SETTINGS_MODULE'] = 'bench_settings'
+    env['EQUIPMENT_DB_PATH'] = str(workdir / 'db.sqlite3')
+    env['EQUIPMENT_ASYNC_VIEWS'] = '1' if mode == 'asgi' else '0'
+
+    subprocess.run(
+        [sys.executable, '-m', 'benchmarks.concurrency', '--load-data', json.dumps(dict(config, workdir=str(workdir)))],
+        cwd=BACKEND_DIR, env=env, check=True,
+    )
+
+    port = free_port()
+    server = subprocess.Popen(
+        server_command(mode, port, config['workers'], config['threads']), cwd=BACKEND_DIR, env=env,
+    )
+    try:
+        wait_for_port(port, server)
+        # One request per worker process warms imports, connections and the cache.
+        asyncio.run(load(port, config['path'], config['workers'] * 2, 1, config['timeout']))
+        latencies, statuses, elapsed, streams = asyncio.run(load(
+            port, config['path'], config['clients'], config['requests'], config['timeout'], config['streams'],
+        ))
+    finally:
+        server.terminate()
+        try:
+            server.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            # Threads still inside an event stream delay a graceful exit.
+            server.kill()
+            server.wait()
+
+    if not latencies:
+        return {'streams_connected': streams, 'status_codes': {str(code): count for code, count in statuses.items()}}
+    return {
+        'streams_connected': streams,
+        'requests': len(latencies),
+        'status_codes': {str(code): count for code, count in sorted(statuses.items(), key=str)},
+        'latency_ms': {
+            **{f'p{p}': round(float(np.percentile(latencies, p)) * 1000, 2) for p in PERCENTILES},
+            'mean': round(float(np.mean(latencies)) * 1000, 2),
+            'max': round(max(latencies) * 1000, 2),
+        },
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the WSGI and ASGI deployments under concurrent load.')
+    parser.add_argument('--modes', nargs='+', choices=['wsgi', 'asgi'], default=['wsgi', 'asgi'])
+    parser.add_argument('--path', default='/api/summary/', help='endpoint every client requests')
+    parser.add_argument('--clients', type=int, default=500, help='concurrent connections')
+    parser.add_argument('--requests', type=int, default=10, help='requests per connection')
+    parser.add_argument('--streams', type=int, default=0, help='event streams held open during the run')
+    parser.add_argument('--timeout', type=float, default=30, help='seconds before a request counts as failed')
+    parser.add_argument('--workers', type=int, default=1, help='server processes in both modes')
+    parser.add_argument('--threads', type=int, default=8, help='threads per gunicorn worker (WSGI)')
+    parser.add_argument('--rows', type=int, default=10000, help='rows per dataset')
+    parser.add_argument('--datasets', type=int, default=5)
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--load-data', metavar='CONFIG', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.load_data:
+        load_data(json.loads(args.load_data))
+        return 0
+
+    config = {
+        'path': args.path,
+        'clients': args.clients,
+        'requests': args.requests,
+        'streams': args.streams,
+        'timeout': args.timeout,
+        'workers': args.workers,
+        'threads': args.threads,
+        'rows': args.rows,
+        'datasets': args.datasets,
+    }
+    results = {'meta': dict(config), 'modes': {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        config['workdir'] = workdir
+        config['csv'] = str(write_csv(Path(workdir) / 'equipment.csv', args.rows, len(TYPES)))
+        print(f"{'mode':<6} {'streams':>8} {'requests':>9} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} "
+              f"{'p99 ms':>9} {'req/s':>9}")
+        for mode in args.modes:
+            result = run_mode(mode, config)
+            results['modes'][mode] = result
+            errors = sum(count for code, count in result['status_codes'].items() if not code.startswith('2'))
+            if 'latency_ms' not in result:
+                print(f"{mode:<6} {result['streams_connected']:>8} {0:>9} {errors:>7}")
+                continue
+            latency = result['latency_ms']
+            print(
+                f"{mode:<6} {result['streams_connected']:>8} {result['requests']:>9} {errors:>7} {latency['p50']:>9.2f} "
+                f"{latency['p95']:>9.2f} {latency['p99']:>9.2f} {result['throughput_rps']:>9.2f}"
+            )
+
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(results, out, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
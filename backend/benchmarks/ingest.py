@@ -0,0 +1,134 @@
+"""
+Ingest throughput of the original upload path, the streaming ORM path and the
+SQLite bulk-load path.
+
+Run from the ``backend`` directory:
+
+    python -m benchmarks.ingest --rows 100000 1000000 10000000
+
+Modes:
+
+* ``baseline`` -- the upload path before streaming ingestion: the whole file
+  read with ``read_csv``, one ``Equipment`` per ``iterrows`` row and a single
+  ``bulk_create``. Type names are interned up front, since ``Equipment.type``
+  is a foreign key now. Its memory grows with the file, so sizes above
+  ``--baseline-max-rows`` skip it.
+* ``orm`` -- ``ingest_csv`` with the default sink: chunked, column-wise
+  ``bulk_create``.
+* ``bulk`` -- ``ingest_csv`` with ``EQUIPMENT_BULK_INGEST`` enabled.
+
+``orm`` and ``bulk`` also build and save the dataset summary inside the timed
+section; ``baseline`` does not. Speedups are relative to the first mode run
+for each size, ``baseline`` by default.
+
+Each size and mode is loaded into a fresh temporary database in a separate
+process (``EQUIPMENT_DB_PATH``), so page cache and connection state do not
+carry over between runs.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from .synthetic import write_csv
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+MODES = ['baseline', 'orm', 'bulk']
+BASELINE_MAX_ROWS = 1000000
+
+
+def run_worker(path, mode):
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+
+    django.setup()
+    call_command('migrate', verbosity=0)
+    settings.EQUIPMENT_STORAGE = 'database'
+    settings.EQUIPMENT_BULK_INGEST = dict(settings.EQUIPMENT_BULK_INGEST, ENABLED=(mode == 'bulk'))
+
+    if mode == 'baseline':
+        rows, seconds = ingest_baseline(path)
+        print(json.dumps({'rows': rows, 'seconds': seconds}))
+        return
+
+    from equipment.ingest import ingest_csv
+
+    with open(path, 'rb') as file:
+        result = ingest_csv(file)
+    print(json.dumps({'rows': result.rows, 'seconds': result.seconds}))
+
+
+def ingest_baseline(path):
+    import pandas as pd
+    from django.utils import timezone
+
+    from equipment.models import Dataset, Equipment, EquipmentType
+
+    started = time.perf_counter()
+    df = pd.read_csv(path)
+    df.columns = df.columns.str.strip()
+    dataset = Dataset.objects.create(uploaded_at=timezone.now())
+    type_ids = EquipmentType.objects.intern(df['Type'].unique().tolist())
+    equipment_list = []
+    for _, row in df.iterrows():
+        equipment_list.append(Equipment(
+            dataset=dataset,
+            name=row['Equipment Name'],
+            type_id=type_ids[row['Type']],
+            flowrate=row['Flowrate'],
+            pressure=row['Pressure'],
+            temperature=row['Temperature'],
+            uploaded_at=dataset.uploaded_at,
+        ))
+    Equipment.objects.bulk_create(equipment_list)
+    return len(equipment_list), time.perf_counter() - started
+
+
+def run_one(path, mode, workdir):
+    env = dict(os.environ)
+    env['EQUIPMENT_DB_PATH'] = str(Path(workdir) / f'{mode}.sqlite3')
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+    output = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.ingest', '--worker', str(path), mode],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100000, 1000000, 10000000])
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--baseline-max-rows', type=int, default=BASELINE_MAX_ROWS,
+                        help='largest size to run the baseline mode on')
+    parser.add_argument('--worker', nargs=2, metavar=('CSV', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        run_worker(*args.worker)
+        return
+
+    print(f"{'rows':>10} {'mode':>8} {'seconds':>9} {'rows/sec':>11} {'speedup':>8}")
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as workdir:
+            started = time.perf_counter()
+            path = write_csv(Path(workdir) / f'equipment_{rows}.csv', rows)
+            print(f"# generated {rows} rows in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+            reference = None
+            for mode in args.modes:
+                if mode == 'baseline' and rows > args.baseline_max_rows:
+                    print(f"# skipped baseline for {rows} rows (--baseline-max-rows)", file=sys.stderr)
+                    continue
+                result = run_one(path, mode, workdir)
+                reference = reference or result['seconds']
+                print(f"{rows:>10} {mode:>8} {result['seconds']:>9.2f} {result['rows'] / result['seconds']:>11.0f} "
+                      f"{reference / result['seconds']:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
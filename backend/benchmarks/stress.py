@@ -0,0 +1,184 @@
+"""
+Simultaneous uploads and reads against a multi-process server.
+
+Run from the ``backend`` directory:
+
+    python -m benchmarks.stress --workers 4 --uploaders 4 --uploads 5 --readers 16
+
+Starts gunicorn with ``--workers`` processes on a fresh temporary database.
+``--uploaders`` threads each post ``--uploads`` distinct CSVs of ``--rows``
+rows, so ingest transactions and the retention pruning after each upload
+overlap in different processes, while ``--readers`` threads request the
+summary, history and readings endpoints until the last upload is done.
+
+Prints the status codes and latencies per endpoint and exits non-zero if any
+request failed: a 5xx (including 503 "database is busy"), a connection error
+or a ``database is locked`` message in the server log.
+"""
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import requests
+
+from .api import BACKEND_DIR
+from .concurrency import SETTINGS, free_port, server_command, wait_for_port
+from .synthetic import TYPES, write_csv
+
+READ_PATHS = ['/api/summary/', '/api/history/', '/api/datasets/{id}/readings/?points=200']
+
+
+class Recorder:
+    """
+    Status codes and latencies per endpoint, shared by all client threads.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.statuses = {}
+        self.latencies = {}
+
+    def record(self, endpoint, status, seconds=None):
+        with self._lock:
+            counts = self.statuses.setdefault(endpoint, {})
+            counts[str(status)] = counts.get(str(status), 0) + 1
+            if seconds is not None:
+                self.latencies.setdefault(endpoint, []).append(seconds)
+
+    def failures(self):
+        return sum(
+            count for counts in self.statuses.values() for status, count in counts.items()
+            if not status.isdigit() or int(status) >= 500
+        )
+
+
+def timed_request(recorder, endpoint, method, url, **kwargs):
+    started = time.perf_counter()
+    try:
+        response = requests.request(method, url, timeout=120, **kwargs)
+    except requests.RequestException as e:
+        recorder.record(endpoint, type(e).__name__)
+        return None
+    recorder.record(endpoint, response.status_code, time.perf_counter() - started)
+    return response
+
+
+def uploader(base_url, csv, uploads, counter, recorder, latest):
+    template = Path(csv).read_bytes()
+    for _ in range(uploads):
+        # Distinct content per upload, or it would be deduplicated.
+        body = template + f'Stress-{next(counter)},{TYPES[0]},1,1,1\n'.encode()
+        response = timed_request(recorder, 'upload', 'POST', base_url + '/api/upload/',
+                                 files={'file': ('equipment.csv', body)})
+        if response is not None and response.status_code == 201:
+            latest[0] = response.json()['dataset_id']
+
+
+def reader(base_url, done, recorder, latest):
+    for path in itertools.cycle(READ_PATHS):
+        if done.is_set():
+            return
+        timed_request(recorder, path.split('?')[0].replace('{id}', '<id>'), 'GET',
+                      base_url + path.format(id=latest[0]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run simultaneous uploads and reads against gunicorn.')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=4, help='threads per worker')
+    parser.add_argument('--uploaders', type=int, default=4, help='concurrent upload threads')
+    parser.add_argument('--uploads', type=int, default=5, help='uploads per upload thread')
+    parser.add_argument('--readers', type=int, default=16, help='concurrent read threads')
+    parser.add_argument('--rows', type=int, default=50000, help='rows per upload')
+    parser.add_argument('--output', help='write results to this JSON file')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        workdir = Path(workdir)
+        csv = write_csv(workdir / 'equipment.csv', args.rows, len(TYPES))
+        (workdir / 'bench_settings.py').write_text(SETTINGS.format(workdir=str(workdir)))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(workdir), str(BACKEND_DIR), env.get('PYTHONPATH')]))
+        env['DJANGO_SETTINGS_MODULE'] = 'bench_settings'
+        env['EQUIPMENT_DB_PATH'] = str(workdir / 'db.sqlite3')
+        env.pop('EQUIPMENT_ASYNC_VIEWS', None)
+        subprocess.run([sys.executable, 'manage.py', 'migrate', '--verbosity', '0'],
+                       cwd=BACKEND_DIR, env=env, check=True)
+
+        port = free_port()
+        log_path = workdir / 'server.log'
+        with open(log_path, 'w') as log:
+            server = subprocess.Popen(
+                server_command('wsgi', port, args.workers, args.threads) + ['--timeout', '300'],
+                cwd=BACKEND_DIR, env=env, stdout=log, stderr=subprocess.STDOUT,
+            )
+            try:
+                wait_for_port(port, server)
+                base_url = f'http://127.0.0.1:{port}'
+                recorder = Recorder()
+                done = threading.Event()
+                counter = itertools.count()
+                latest = [1]
+                timed_request(recorder, 'upload', 'POST', base_url + '/api/upload/',
+                              files={'file': ('equipment.csv', csv.read_bytes())})
+
+                started = time.perf_counter()
+                uploaders = [
+                    threading.Thread(target=uploader, args=(base_url, csv, args.uploads, counter, recorder, latest))
+                    for _ in range(args.uploaders)
+                ]
+                readers = [
+                    threading.Thread(target=reader, args=(base_url, done, recorder, latest))
+                    for _ in range(args.readers)
+                ]
+                for thread in uploaders + readers:
+                    thread.start()
+                for thread in uploaders:
+                    thread.join()
+                done.set()
+                for thread in readers:
+                    thread.join()
+                elapsed = time.perf_counter() - started
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+        server_log = log_path.read_text()
+        locked = server_log.count('database is locked')
+
+    print(f"{'endpoint':<32} {'requests':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}  status codes")
+    results = {'meta': vars(args), 'elapsed_s': round(elapsed, 2), 'locked_in_log': locked, 'endpoints': {}}
+    for endpoint, counts in sorted(recorder.statuses.items()):
+        latencies = recorder.latencies.get(endpoint, [0])
+        results['endpoints'][endpoint] = {
+            'status_codes': counts,
+            'latency_ms': {
+                'p50': round(float(np.percentile(latencies, 50)) * 1000, 2),
+                'p95': round(float(np.percentile(latencies, 95)) * 1000, 2),
+                'max': round(max(latencies) * 1000, 2),
+            },
+        }
+        latency = results['endpoints'][endpoint]['latency_ms']
+        print(f"{endpoint:<32} {sum(counts.values()):>9} {latency['p50']:>9.1f} {latency['p95']:>9.1f} "
+              f"{latency['max']:>9.1f}  {counts}")
+    print(f"\n{elapsed:.1f}s, 'database is locked' in server log: {locked}")
+
+    if args.output:
+        with open(args.output, 'w') as out:
+            json.dump(results, out, indent=2)
+    failed = recorder.failures() + locked
+    if failed:
+        print(server_log[-5000:])
+        print(f"FAILED: {failed} errors")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+"""
+Synthetic equipment CSVs for benchmarks.
+
+Files are written in blocks with numpy so generating ten million rows takes
+seconds rather than minutes. The same ``seed`` always gives the same file.
+
+    python -m benchmarks.synthetic out.csv --rows 1000000 --types 50
+"""
+import argparse
+
+import numpy as np
+
+COLUMNS = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+TYPES = ['Pump', 'Compressor', 'Valve', 'HeatExchanger', 'Reactor', 'Condenser']
+
+BLOCK_SIZE = 100000
+
+
+def type_names(count):
+    """
+    ``count`` distinct type names: the usual ones first, then numbered ones.
+    """
+    names = TYPES[:count]
+    names += [f'Type{i}' for i in range(len(names), count)]
+    return names
+
+
+def write_csv(path, rows, types=len(TYPES), seed=0):
+    rng = np.random.default_rng(seed)
+    names = np.array(type_names(types), dtype=object)
+    # Each type gets its own operating point so per-type statistics differ.
+    centers = rng.uniform(0.5, 1.5, (len(names), 3)) * [120, 6, 110]
+    with open(path, 'w', newline='') as out:
+        out.write(','.join(COLUMNS) + '\n')
+        for start in range(0, rows, BLOCK_SIZE):
+            count = min(BLOCK_SIZE, rows - start)
+            kinds = rng.integers(0, len(names), count)
+            values = rng.normal(centers[kinds], centers[kinds] * 0.1)
+            flowrate = values[:, 0].round(2).tolist()
+            pressure = values[:, 1].round(2).tolist()
+            temperature = values[:, 2].round(1).tolist()
+            out.writelines(
+                f'{kind}-{start + i},{kind},{f},{p},{t}\n'
+                for i, (kind, f, p, t) in enumerate(zip(names[kinds], flowrate, pressure, temperature))
+            )
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Write a synthetic equipment CSV.')
+    parser.add_argument('path')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--types', type=int, default=len(TYPES), help='number of distinct equipment types')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    write_csv(args.path, args.rows, args.types, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,9 @@
+import os
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Route the read endpoints to their async views, see equipment.async_views.
+os.environ.setdefault('EQUIPMENT_ASYNC_VIEWS', '1')
+
+application = ASGIStaticFilesHandler(get_asgi_application())
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -21,6 +22,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'equipment.middleware.ServerTimingMiddleware',
+    'equipment.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -32,6 +35,14 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# config.asgi turns this on: the read endpoints are then served by the async
+# views in equipment.async_views, and WhiteNoise, which is sync-only and
+# would put every request back on a thread, is replaced by the static files
+# handler wrapped around the ASGI application.
+EQUIPMENT_ASYNC_VIEWS = os.environ.get('EQUIPMENT_ASYNC_VIEWS') == '1'
+if EQUIPMENT_ASYNC_VIEWS:
+    MIDDLEWARE.remove('whitenoise.middleware.WhiteNoiseMiddleware')
+
 ROOT_URLCONF = 'config.urls'
 
 TEMPLATES = [
@@ -51,14 +62,42 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
+
+EQUIPMENT_DB_PATH = Path(os.environ.get('EQUIPMENT_DB_PATH', BASE_DIR / 'db.sqlite3')).resolve()
+# Seconds a connection waits for another process's write lock before failing
+# with "database is locked".
+EQUIPMENT_DB_BUSY_TIMEOUT = 30
 
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'NAME': EQUIPMENT_DB_PATH,
+        # WAL lets readers keep going during an ingest; NORMAL only syncs at
+        # checkpoints, which is still crash-safe under WAL. IMMEDIATE takes the
+        # write lock at BEGIN, where SQLite honours the busy timeout, instead
+        # of failing when a read transaction later tries to write.
+        'OPTIONS': {
+            'init_command': 'PRAGMA journal_mode=WAL; PRAGMA synchronous=NORMAL;',
+            'timeout': EQUIPMENT_DB_BUSY_TIMEOUT,
+            'transaction_mode': 'IMMEDIATE',
+        },
+    },
+    # The same file opened read-only, for the reads of GET requests
+    # (equipment.routers).
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': EQUIPMENT_DB_PATH.as_uri() + '?mode=ro',
+        'OPTIONS': {
+            'uri': True,
+            'timeout': EQUIPMENT_DB_BUSY_TIMEOUT,
+        },
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['equipment.routers.ReadReplicaRouter']
+
 AUTH_PASSWORD_VALIDATORS = []
 
 LANGUAGE_CODE = 'en-us'
@@ -69,10 +108,24 @@ USE_TZ = True
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Shared by all worker processes: data version, cached responses, job progress.
+    'equipment': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 CORS_ALLOW_ALL_ORIGINS = True
+CORS_EXPOSE_HEADERS = ['Link', 'ETag', 'X-Cache', 'X-Readings-Layout', 'X-Readings-Rows', 'Server-Timing']
 
 
 REST_FRAMEWORK = {
@@ -84,3 +137,108 @@ REST_FRAMEWORK = {
          'rest_framework.permissions.AllowAny',
     ],
 }
+
+
+# Upload ingestion: rows parsed per CSV chunk and rows per INSERT batch.
+EQUIPMENT_INGEST_CHUNK_SIZE = 50000
+EQUIPMENT_INGEST_BATCH_SIZE = 5000
+
+# SQLite bulk-load path: executemany inserts instead of bulk_create, a larger
+# page cache during the load, and secondary indexes dropped and rebuilt for
+# uploads of at least DEFER_INDEXES_MIN_BYTES (None to never defer).
+EQUIPMENT_BULK_INGEST = {
+    'ENABLED': True,
+    'CACHE_SIZE_KB': 200000,
+    'DEFER_INDEXES_MIN_BYTES': 256 * 1024 * 1024,
+}
+
+# Where new uploads store their readings: 'database' (Equipment rows) or
+# 'columnar' (memory-mapped .npy column files under EQUIPMENT_COLUMNAR_DIR).
+EQUIPMENT_STORAGE = 'database'
+EQUIPMENT_COLUMNAR_DIR = BASE_DIR / 'columnar'
+
+# Read endpoint response cache (equipment.caching).
+EQUIPMENT_CACHE_ALIAS = 'equipment'
+EQUIPMENT_CACHE_TIMEOUT = 60 * 60
+
+# PDF reports (equipment.reports): rendered once per dataset and kept on disk.
+EQUIPMENT_REPORT_DIR = BASE_DIR / 'reports'
+EQUIPMENT_REPORT_PRERENDER = True       # render the summary report right after ingest
+# reportlab keeps every page of a document in memory until it is saved, so the
+# ?detail=full readings table is capped: about 20 MB at 50,000 rows (~880
+# pages). /api/datasets/<id>/export/ streams every reading.
+EQUIPMENT_REPORT_MAX_ROWS = 50000
+
+# /api/datasets/<id>/readings/ point budget.
+EQUIPMENT_READINGS_DEFAULT_POINTS = 500
+EQUIPMENT_READINGS_MAX_POINTS = 10000
+
+# Rows fetched per database round trip by /api/datasets/<id>/export/.
+EQUIPMENT_EXPORT_CHUNK_SIZE = 5000
+
+# Per-unit rows returned by one page of /api/datasets/compare/.
+EQUIPMENT_COMPARE_PAGE_SIZE = 100
+EQUIPMENT_COMPARE_MAX_PAGE_SIZE = 1000
+
+# Operating-envelope rules checked after every upload, see equipment.anomalies.
+# Each rule covers one FIELD, optionally one equipment TYPE, and flags
+# readings below MIN, above MAX or more than Z standard deviations from the
+# mean of their type in the dataset.
+EQUIPMENT_ANOMALY_RULES = [
+    {'NAME': 'flowrate-zscore', 'FIELD': 'flowrate', 'Z': 4.0},
+    {'NAME': 'pressure-zscore', 'FIELD': 'pressure', 'Z': 4.0},
+    {'NAME': 'temperature-zscore', 'FIELD': 'temperature', 'Z': 4.0},
+]
+
+# /api/datasets/<id>/anomalies/ cursor pagination (?after=<id>&limit=N).
+EQUIPMENT_ANOMALY_PAGE_SIZE = 100
+EQUIPMENT_ANOMALY_MAX_PAGE_SIZE = 1000
+
+# Dataset retention, see equipment.retention. Any limit may be None.
+EQUIPMENT_RETENTION = {
+    'KEEP_LAST': 5,
+    'MAX_AGE': None,            # e.g. timedelta(days=30)
+    'MAX_TOTAL_ROWS': None,
+    'BATCH_SIZE': 10000,        # rows per DELETE batch, datasets per pass
+    'MODE': 'inline',           # 'inline', 'background' or 'off'
+}
+
+# Uploaded files are hashed while the request body is read, so repeated
+# uploads resolve to the existing dataset without being parsed.
+FILE_UPLOAD_HANDLERS = [
+    'equipment.uploads.HashingMemoryFileUploadHandler',
+    'equipment.uploads.HashingTemporaryFileUploadHandler',
+]
+
+# Background ingestion (/api/upload/?async=1): staged uploads and worker threads.
+EQUIPMENT_STAGING_DIR = BASE_DIR / 'staging'
+EQUIPMENT_INGEST_WORKERS = 2
+
+# Resumable chunked uploads (/api/uploads/), see equipment.uploads. Ingestion
+# is queued once an upload is completed; open uploads without a new part for
+# EQUIPMENT_UPLOAD_STALL_TIMEOUT seconds are discarded.
+EQUIPMENT_UPLOAD_PART_SIZE = 8 * 1024 * 1024
+EQUIPMENT_UPLOAD_MAX_PART_SIZE = 64 * 1024 * 1024
+EQUIPMENT_UPLOAD_STALL_TIMEOUT = 60 * 60
+
+# /api/events/ server-sent events, see equipment.events: how often each
+# process checks for new events, the keep-alive comment interval (seconds)
+# and how many events are kept for clients resuming with Last-Event-ID.
+EQUIPMENT_EVENTS = {
+    'POLL_INTERVAL': 1.0,
+    'HEARTBEAT': 15,
+    'KEEP': 1000,
+}
+
+# Retries of short write transactions that find the database locked (see
+# equipment.sqlite), and the Retry-After of 503 responses when a request
+# gives up.
+EQUIPMENT_DB_RETRY = {
+    'ATTEMPTS': 5,
+    'DELAY': 0.1,
+    'RETRY_AFTER': 2,
+}
+
+# /api/history/ cursor pagination (?before=<uploaded_at>&before_id=<id>&limit=N).
+EQUIPMENT_HISTORY_PAGE_SIZE = 50
+EQUIPMENT_HISTORY_MAX_PAGE_SIZE = 500
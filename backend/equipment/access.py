@@ -0,0 +1,40 @@
+"""
+DRF authentication and permission checks for the endpoints that are plain
+Django views: the async read views and the event stream.
+"""
+from django.http import HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+
+def json_response(data, status_code=status.HTTP_200_OK):
+    # Rendered like DRF's JSONRenderer so both routes return the same bytes.
+    return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status_code)
+
+
+def check_access(request):
+    """
+    Authenticate ``request`` and check the default permissions as a DRF view
+    would. Returns the error response, or ``None`` if access is allowed.
+    """
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        drf_request.user
+        for permission in api_settings.DEFAULT_PERMISSION_CLASSES:
+            if not permission().has_permission(drf_request, None):
+                if drf_request.authenticators and not drf_request.successful_authenticator:
+                    raise exceptions.NotAuthenticated()
+                raise exceptions.PermissionDenied()
+    except (exceptions.AuthenticationFailed, exceptions.NotAuthenticated) as e:
+        header = drf_request.authenticators[0].authenticate_header(drf_request) if drf_request.authenticators else None
+        response = json_response(
+            {"detail": e.detail}, status_code=status.HTTP_401_UNAUTHORIZED if header else status.HTTP_403_FORBIDDEN,
+        )
+        if header:
+            response['WWW-Authenticate'] = header
+        return response
+    except exceptions.PermissionDenied as e:
+        return json_response({"detail": e.detail}, status_code=status.HTTP_403_FORBIDDEN)
+    return None
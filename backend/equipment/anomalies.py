@@ -0,0 +1,279 @@
+"""
+Operating-envelope checks over a dataset's readings.
+
+Rules come from ``EQUIPMENT_ANOMALY_RULES``. Each one targets a numeric field,
+optionally a single equipment type, and flags readings below ``MIN``, above
+``MAX`` or more than ``Z`` standard deviations from the mean of their type
+within the dataset. Per-type means and deviations come from the statistics
+sketches saved with the dataset's summary, so a scan is one pass over the
+readings in chunks of ``BATCH_SIZE`` rows, evaluating every rule on each chunk
+as array comparisons. Memory depends on the chunk size and the number of
+flagged rows, not on the size of the dataset. Equipment names are only
+fetched for the flagged rows.
+"""
+import itertools
+
+import numpy as np
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+from . import stats
+from .caching import bump_data_version
+from .columnar import ColumnarDataset
+from .metrics import timed
+from .models import Anomaly, Dataset, DatasetSummary, Equipment, EquipmentType
+from .summaries import NUMERIC_FIELDS, scan_stats
+
+BATCH_SIZE = 5000
+NAME_BATCH_SIZE = 500
+
+
+class Rule:
+    def __init__(self, name, field, type=None, min=None, max=None, z=None):
+        self.name = name
+        self.field = field
+        self.type = type
+        self.min = min
+        self.max = max
+        self.z = z
+
+    @classmethod
+    def from_setting(cls, rule):
+        field = rule.get('FIELD')
+        if field not in NUMERIC_FIELDS:
+            raise ImproperlyConfigured(f"Anomaly rule {rule!r}: FIELD must be one of {list(NUMERIC_FIELDS)}")
+        if all(rule.get(key) is None for key in ('MIN', 'MAX', 'Z')):
+            raise ImproperlyConfigured(f"Anomaly rule {rule!r} needs at least one of MIN, MAX or Z")
+        return cls(
+            name=rule.get('NAME') or f'{field}-envelope',
+            field=field,
+            type=rule.get('TYPE'),
+            min=rule.get('MIN'),
+            max=rule.get('MAX'),
+            z=rule.get('Z'),
+        )
+
+
+def get_rules():
+    return [Rule.from_setting(rule) for rule in getattr(settings, 'EQUIPMENT_ANOMALY_RULES', [])]
+
+
+class Chunk:
+    """
+    Consecutive readings starting at row ``start``: per-row type codes, float64
+    arrays for the rule fields and, for database storage, the equipment ids.
+    """
+    def __init__(self, start, type_codes, columns, ids=None):
+        self.start = start
+        self.type_codes = type_codes
+        self.columns = columns
+        self.ids = ids
+
+
+class Readings:
+    """
+    The columns of one dataset that the rules look at, read ``chunk_size`` rows
+    at a time. Type codes index ``type_names``, which grows as new types are
+    seen.
+    """
+    def __init__(self, dataset, fields, chunk_size=BATCH_SIZE):
+        self.dataset = dataset
+        self.fields = fields
+        self.chunk_size = chunk_size
+        if dataset.storage == Dataset.COLUMNAR:
+            self.store = ColumnarDataset(dataset.id)
+            self.type_names = list(self.store.dictionary('type'))
+        else:
+            self.type_names = []
+            self._codes = {}
+
+    def chunks(self):
+        if self.dataset.storage == Dataset.COLUMNAR:
+            types = self.store.column('type')
+            columns = {field: self.store.column(field) for field in self.fields}
+            for start in range(0, len(types), self.chunk_size):
+                stop = start + self.chunk_size
+                yield Chunk(
+                    start,
+                    np.asarray(types[start:stop], dtype=np.int64),
+                    {field: np.asarray(values[start:stop], dtype=np.float64) for field, values in columns.items()},
+                )
+            return
+
+        rows = (
+            Equipment.objects.filter(dataset=self.dataset)
+            .order_by('id')
+            .values_list('id', 'type_id', *self.fields)
+            .iterator(chunk_size=self.chunk_size)
+        )
+        dtype = [('id', np.int64), ('type_id', np.int64)] + [(field, np.float64) for field in self.fields]
+        start = 0
+        while True:
+            records = np.fromiter(itertools.islice(rows, self.chunk_size), dtype=dtype)
+            if not len(records):
+                return
+            yield Chunk(
+                start,
+                self.type_codes(records['type_id']),
+                {field: records[field] for field in self.fields},
+                records['id'],
+            )
+            start += len(records)
+
+    def type_codes(self, type_ids):
+        """
+        Codes into ``type_names`` for an array of ``EquipmentType`` ids.
+        """
+        unique, inverse = np.unique(type_ids, return_inverse=True)
+        unseen = [type_id for type_id in unique.tolist() if type_id not in self._codes]
+        if unseen:
+            names = dict(EquipmentType.objects.filter(id__in=unseen).values_list('id', 'name'))
+            for type_id in unseen:
+                self._codes[type_id] = len(self.type_names)
+                self.type_names.append(names[type_id])
+        codes = np.array([self._codes[type_id] for type_id in unique.tolist()], dtype=np.int64)
+        return codes[inverse]
+
+    def names(self, rows, ids):
+        """
+        Equipment names for the given row positions (columnar storage) or
+        equipment ids (database storage).
+        """
+        if self.dataset.storage == Dataset.COLUMNAR:
+            dictionary = np.array(self.store.dictionary('name'), dtype=object)
+            return dictionary[self.store.column('name')[rows]].tolist()
+
+        ids = ids.tolist()
+        names = {}
+        for start in range(0, len(ids), NAME_BATCH_SIZE):
+            batch = ids[start:start + NAME_BATCH_SIZE]
+            names.update(Equipment.objects.filter(id__in=batch).values_list('id', 'name'))
+        return [names[equipment_id] for equipment_id in ids]
+
+
+def type_moments(dataset, fields):
+    """
+    ``{type: {field: (mean, sample std)}}`` from the sketches in the dataset's
+    summary, or from an extra pass over the readings if it has none. The
+    deviation is NaN for types with a single reading.
+    """
+    try:
+        sketches = dataset.summary.stats
+    except DatasetSummary.DoesNotExist:
+        sketches = None
+    moments = {}
+    for eq_type, by_field in (sketches or scan_stats(dataset)).items():
+        moments[eq_type] = {}
+        for field in fields:
+            sketch = stats.Sketch.from_dict(by_field[field])
+            moments[eq_type][field] = (sketch.mean, sketch.std if sketch.count > 1 else np.nan)
+    return moments
+
+
+def moment_arrays(moments, type_names, field):
+    """
+    Means and deviations of ``field`` indexed by type code.
+    """
+    pairs = [moments.get(name, {}).get(field, (np.nan, np.nan)) for name in type_names]
+    means, stds = zip(*pairs) if pairs else ((), ())
+    return np.array(means, dtype=np.float64), np.array(stds, dtype=np.float64)
+
+
+def evaluate(rule, chunk, type_names, moments):
+    """
+    ``(kind, rows, threshold, scores)`` for every check of ``rule`` that
+    flagged something in ``chunk``; ``rows`` are positions within the chunk.
+    """
+    values = chunk.columns[rule.field]
+    if rule.type is None:
+        selected = None
+    elif rule.type in type_names:
+        selected = chunk.type_codes == type_names.index(rule.type)
+    else:
+        return []
+
+    def flagged(mask):
+        return np.flatnonzero(mask if selected is None else mask & selected)
+
+    results = []
+    if rule.min is not None:
+        results.append((Anomaly.MIN, flagged(values < rule.min), rule.min, None))
+    if rule.max is not None:
+        results.append((Anomaly.MAX, flagged(values > rule.max), rule.max, None))
+    if rule.z is not None:
+        means, stds = moment_arrays(moments, type_names, rule.field)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            scores = (values - means[chunk.type_codes]) / stds[chunk.type_codes]
+        rows = flagged(np.abs(scores) > rule.z)
+        results.append((Anomaly.ZSCORE, rows, rule.z, scores[rows]))
+    return [result for result in results if len(result[1])]
+
+
+def scan_dataset(dataset, rules=None):
+    """
+    Replace the stored anomalies of ``dataset`` with a fresh scan and return
+    how many were found.
+    """
+    rules = get_rules() if rules is None else rules
+    if not rules:
+        return 0
+
+    kinds = [Anomaly.MIN, Anomaly.MAX, Anomaly.ZSCORE]
+    with timed('anomaly_scan'):
+        readings = Readings(dataset, sorted({rule.field for rule in rules}))
+        moments = type_moments(dataset, sorted({rule.field for rule in rules if rule.z is not None}))
+        # Flagged readings by rule and kind, one entry per chunk:
+        # (rows, type codes, values, scores, ids).
+        flagged = {(index, kind): [] for index in range(len(rules)) for kind in kinds}
+        for chunk in readings.chunks():
+            for index, rule in enumerate(rules):
+                for kind, rows, threshold, scores in evaluate(rule, chunk, readings.type_names, moments):
+                    flagged[index, kind].append((
+                        chunk.start + rows,
+                        chunk.type_codes[rows],
+                        chunk.columns[rule.field][rows],
+                        scores,
+                        chunk.ids[rows] if chunk.ids is not None else None,
+                    ))
+
+    with timed('anomaly_store'):
+        pieces = [piece for entries in flagged.values() for piece in entries]
+        if pieces:
+            rows, first = np.unique(np.concatenate([piece[0] for piece in pieces]), return_index=True)
+            ids = np.concatenate([piece[4] for piece in pieces])[first] if pieces[0][4] is not None else None
+            names = dict(zip(rows.tolist(), readings.names(rows, ids)))
+        else:
+            names = {}
+        type_ids = EquipmentType.objects.intern(readings.type_names)
+        code_type_ids = np.array([type_ids[name] for name in readings.type_names], dtype=np.int64)
+
+        anomalies = []
+        for (index, kind), entries in flagged.items():
+            rule = rules[index]
+            threshold = {Anomaly.MIN: rule.min, Anomaly.MAX: rule.max, Anomaly.ZSCORE: rule.z}[kind]
+            for rows, codes, values, scores, _ in entries:
+                row_scores = scores.tolist() if scores is not None else [None] * len(rows)
+                anomalies.extend(
+                    Anomaly(
+                        dataset_id=dataset.id,
+                        row=row,
+                        name=names[row],
+                        type_id=type_id,
+                        field=rule.field,
+                        rule=rule.name,
+                        kind=kind,
+                        value=value,
+                        threshold=threshold,
+                        score=score,
+                    )
+                    for row, type_id, value, score in zip(
+                        rows.tolist(), code_type_ids[codes].tolist(), values.tolist(), row_scores,
+                    )
+                )
+
+        with transaction.atomic():
+            Anomaly.objects.filter(dataset=dataset).delete()
+            Anomaly.objects.bulk_create(anomalies, batch_size=BATCH_SIZE)
+    bump_data_version()
+    return len(anomalies)
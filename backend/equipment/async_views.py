@@ -0,0 +1,136 @@
+"""
+Async versions of the read endpoints, routed instead of the DRF views when
+the app is served over ASGI (``config.asgi`` sets ``EQUIPMENT_ASYNC_VIEWS``).
+
+They take the same parameters, share the response cache with the sync views
+and return the same JSON. Queries go through Django's async ORM; summary
+building, downsampling and PDF rendering run through ``sync_to_async``, which
+under ASGI gives each request its own thread, so a slow report never blocks
+the event loop and a cache hit never needs a thread at all. Uploads stay on
+the DRF views, which Django's ASGI handler already runs off the loop.
+
+Responses are plain JSON: there is no browsable API on these routes. The
+DRF authenticators and permissions still run before each view, so bad
+credentials get the same 401 as on the DRF views.
+"""
+import functools
+import os
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.http import StreamingHttpResponse
+from django.utils.http import content_disposition_header
+from django.views.decorators.http import require_GET
+from rest_framework import status
+
+from . import reports
+from .access import check_access, json_response
+from .caching import acached_response
+from .models import Dataset
+from .serializers import DatasetSummarySerializer
+from .summaries import get_history_data, get_summary_data
+from .views import HistoryAPI, PDFReportAPI, ReadingsAPI
+
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+def not_found():
+    return json_response({"detail": "No Dataset matches the given query."}, status_code=status.HTTP_404_NOT_FOUND)
+
+
+def authenticated(view):
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        denied = await sync_to_async(check_access)(request)
+        if denied is not None:
+            return denied
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+async def read_file(path):
+    with open(path, 'rb') as f:
+        while chunk := await sync_to_async(f.read, thread_sensitive=False)(FILE_CHUNK_SIZE):
+            yield chunk
+
+
+@require_GET
+@authenticated
+async def summary(request):
+    async def build():
+        latest = await Dataset.objects.select_related('summary').afirst()
+        if not latest:
+            return json_response({"message": "No data available"})
+        data = await sync_to_async(get_summary_data)(latest, with_stats=True)
+        return json_response(DatasetSummarySerializer(data).data)
+
+    return await acached_response(request, 'summary', build)
+
+
+@require_GET
+@authenticated
+async def history(request):
+    async def build():
+        # The sketches are only needed by the rollup.
+        datasets = Dataset.objects.select_related('summary').defer('summary__stats')
+        try:
+            datasets, limit = HistoryAPI.page_queryset(request.GET, datasets)
+        except ValueError as e:
+            return json_response({"error": str(e)}, status_code=status.HTTP_400_BAD_REQUEST)
+        page = [dataset async for dataset in datasets]
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        data = await sync_to_async(get_history_data)(page)
+        response = json_response(DatasetSummarySerializer(data, many=True).data)
+        if has_more:
+            response['Link'] = HistoryAPI.next_link(request, page, limit)
+        return response
+
+    params = urlencode(sorted(request.GET.items()))
+    return await acached_response(request, 'history', build, params)
+
+
+@require_GET
+@authenticated
+async def report_pdf(request):
+    try:
+        kind, dataset_id = PDFReportAPI.parse_params(request.GET)
+    except ValueError as e:
+        return json_response({"error": str(e)}, status_code=status.HTTP_400_BAD_REQUEST)
+
+    async def build():
+        dataset = await PDFReportAPI.get_queryset(dataset_id).afirst()
+        if not dataset:
+            return json_response({"error": "No data available"}, status_code=status.HTTP_404_NOT_FOUND)
+
+        path = await sync_to_async(reports.get_report)(dataset, kind)
+        response = StreamingHttpResponse(read_file(path), content_type='application/pdf')
+        response['Content-Length'] = str(os.path.getsize(path))
+        response['Content-Disposition'] = content_disposition_header(False, PDFReportAPI.filename(dataset, kind))
+        return response
+
+    params = urlencode({'kind': kind, 'dataset': dataset_id or ''})
+    return await acached_response(request, 'report_pdf', build, params)
+
+
+@require_GET
+@authenticated
+async def readings(request, dataset_id):
+    try:
+        options = ReadingsAPI.parse_params(request.GET)
+    except ValueError as e:
+        return json_response({"error": str(e)}, status_code=status.HTTP_400_BAD_REQUEST)
+
+    async def build():
+        dataset = await Dataset.objects.filter(id=dataset_id).afirst()
+        if not dataset:
+            return not_found()
+        meta, series = await sync_to_async(ReadingsAPI.downsample_series)(
+            dataset, options['points'], options['fields'], options['method'], options['type_name'],
+        )
+        if options['encoding'] == 'binary':
+            return ReadingsAPI.binary_response(meta, series)
+        return json_response(ReadingsAPI.json_data(meta, series))
+
+    return await acached_response(request, 'readings', build, ReadingsAPI.cache_params(dataset_id, options))
@@ -0,0 +1,175 @@
+"""
+Response caching for the read endpoints.
+
+Cached responses are keyed on a global data version that changes whenever an
+upload commits or datasets are pruned, so entries never need to be deleted
+one by one: bumping the version makes every older entry unreachable and the
+cache backend ages them out. Each response carries an ``ETag`` derived from
+the same version, and a matching ``If-None-Match`` is answered with ``304``
+before any query or rendering work. Streaming responses get the ETag but are
+not stored.
+
+The version is a random token rather than a counter so that concurrent
+bumps from several processes can never collapse into the same value.
+"""
+import hashlib
+import threading
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.cache import parse_etags
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+VERSION_KEY = 'equipment:data-version'
+CACHED_HEADERS = ['Link', 'Content-Disposition', 'X-Readings-Layout', 'X-Readings-Rows']
+
+
+def get_cache():
+    return caches[settings.EQUIPMENT_CACHE_ALIAS]
+
+
+def get_data_version():
+    cache = get_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, uuid.uuid4().hex[:16], None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_data_version():
+    """
+    Invalidate every cached response. Call after the change has committed.
+    """
+    get_cache().set(VERSION_KEY, uuid.uuid4().hex[:16], None)
+
+
+class CacheStats:
+    """
+    Per-process hit/miss counters, by endpoint.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {}
+
+    def record(self, name, outcome):
+        with self._lock:
+            counts = self._counts.setdefault(name, {'hit': 0, 'miss': 0, 'not_modified': 0})
+            counts[outcome] += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {name: dict(counts) for name, counts in self._counts.items()}
+
+
+stats = CacheStats()
+
+
+def _make_etag(name, version, params):
+    tag = f'{name}-{version}'
+    if params:
+        tag += '-' + hashlib.sha1(params.encode()).hexdigest()[:12]
+    return f'"{tag}"'
+
+
+def _is_not_modified(request, etag):
+    return etag in parse_etags(request.headers.get('If-None-Match', ''))
+
+
+def _cache_entry(response):
+    """
+    What to store for ``response``, or ``None`` if it is not cacheable.
+    """
+    # Streamed responses (files on disk) are already cheap to serve again.
+    if response.status_code != status.HTTP_200_OK or response.streaming:
+        return None
+    headers = {header: response[header] for header in CACHED_HEADERS if response.has_header(header)}
+    if isinstance(response, Response):
+        return ('data', response.data, headers)
+    return ('content', response.content, response['Content-Type'], headers)
+
+
+def cached_response(request, name, build, params=''):
+    """
+    Serve ``build()`` through the response cache. ``params`` must capture
+    everything besides the data version that the response depends on.
+    """
+    version = get_data_version()
+    etag = _make_etag(name, version, params)
+
+    if _is_not_modified(request, etag):
+        stats.record(name, 'not_modified')
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+    cache = get_cache()
+    key = f'equipment:response:{name}:{version}:{params}'
+    entry = cache.get(key)
+    if entry is None:
+        stats.record(name, 'miss')
+        response = build()
+        entry = _cache_entry(response)
+        if entry is not None:
+            cache.set(key, entry, settings.EQUIPMENT_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+    else:
+        stats.record(name, 'hit')
+        if entry[0] == 'data':
+            response = Response(entry[1], headers=entry[2])
+        else:
+            response = HttpResponse(entry[1], content_type=entry[2], headers=entry[3])
+        response['X-Cache'] = 'HIT'
+
+    response['ETag'] = etag
+    return response
+
+
+def _lookup(name, params, etags):
+    """
+    ``(version, etag, entry)``; ``entry`` is ``None`` on a miss or when the
+    client already has the current version.
+    """
+    version = get_data_version()
+    etag = _make_etag(name, version, params)
+    if etag in etags:
+        return version, etag, None
+    return version, etag, get_cache().get(f'equipment:response:{name}:{version}:{params}')
+
+
+async def acached_response(request, name, build, params=''):
+    """
+    ``cached_response`` for async views: ``build`` is a coroutine function
+    returning a plain Django response. Entries are shared with the sync
+    views; DRF data stored by them is rendered as JSON here.
+    """
+    # One thread hop for both cache reads.
+    version, etag, entry = await sync_to_async(_lookup, thread_sensitive=False)(
+        name, params, parse_etags(request.headers.get('If-None-Match', '')),
+    )
+    if _is_not_modified(request, etag):
+        stats.record(name, 'not_modified')
+        return HttpResponse(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+    if entry is None:
+        stats.record(name, 'miss')
+        response = await build()
+        entry = _cache_entry(response)
+        if entry is not None:
+            key = f'equipment:response:{name}:{version}:{params}'
+            await get_cache().aset(key, entry, settings.EQUIPMENT_CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+    else:
+        stats.record(name, 'hit')
+        if entry[0] == 'data':
+            response = HttpResponse(JSONRenderer().render(entry[1]), content_type='application/json',
+                                    headers=entry[2])
+        else:
+            response = HttpResponse(entry[1], content_type=entry[2], headers=entry[3])
+        response['X-Cache'] = 'HIT'
+
+    response['ETag'] = etag
+    return response
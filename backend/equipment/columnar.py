@@ -0,0 +1,143 @@
+"""
+Columnar on-disk storage for equipment readings.
+
+Each dataset stored this way gets a directory under
+``EQUIPMENT_COLUMNAR_DIR`` holding one ``.npy`` file per column:
+
+* ``flowrate.npy``, ``pressure.npy``, ``temperature.npy`` -- float64 readings
+* ``type.npy``, ``name.npy`` -- int32 codes into the dictionaries kept in
+  ``meta.json``
+
+Columns are appended chunk by chunk while the upload streams in and are read
+back as read-only memory maps, so reductions run in NumPy without loading the
+dataset into memory.
+"""
+import json
+import shutil
+import struct
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+
+from .metrics import timed
+
+NUMERIC_COLUMNS = {
+    'flowrate': 'Flowrate',
+    'pressure': 'Pressure',
+    'temperature': 'Temperature',
+}
+CODE_COLUMNS = {
+    'type': 'Type',
+    'name': 'Equipment Name',
+}
+CODE_DTYPE = np.int32
+
+# Fixed .npy header size, so the row count can be filled in after streaming.
+NPY_HEADER_LEN = 128
+
+
+def dataset_dir(dataset_id):
+    return Path(settings.EQUIPMENT_COLUMNAR_DIR) / str(dataset_id)
+
+
+def _npy_header(dtype, rows):
+    header = repr({'descr': np.dtype(dtype).str, 'fortran_order': False, 'shape': (rows,)})
+    header = header.ljust(NPY_HEADER_LEN - 11) + '\n'
+    return b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1')
+
+
+class ColumnarWriter:
+    """
+    Streams a dataset's columns to ``.npy`` files in a temporary directory
+    that is moved into place by ``close()``. ``abort()`` removes the files,
+    also after ``close()`` if the transaction storing the dataset fails.
+    """
+    def __init__(self, dataset_id):
+        self.path = dataset_dir(dataset_id)
+        self.tmp_path = self.path.with_name(f'{self.path.name}.tmp')
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        self.tmp_path.mkdir(parents=True)
+        self.rows = 0
+        self.dictionaries = {column: {} for column in CODE_COLUMNS}
+        self.files = {}
+        for column in NUMERIC_COLUMNS:
+            self.files[column] = self._open(column, np.float64)
+        for column in CODE_COLUMNS:
+            self.files[column] = self._open(column, CODE_DTYPE)
+
+    def _open(self, column, dtype):
+        f = open(self.tmp_path / f'{column}.npy', 'wb')
+        f.write(_npy_header(dtype, 0))
+        return f
+
+    def _encode(self, column, values):
+        mapping = self.dictionaries[column]
+        for value in values.unique():
+            if value not in mapping:
+                mapping[value] = len(mapping)
+        return values.map(mapping).to_numpy(dtype=CODE_DTYPE)
+
+    def append(self, chunk):
+        with timed('insert'):
+            for column, source in NUMERIC_COLUMNS.items():
+                chunk[source].to_numpy(dtype=np.float64).tofile(self.files[column])
+            for column, source in CODE_COLUMNS.items():
+                self._encode(column, chunk[source]).tofile(self.files[column])
+        self.rows += len(chunk)
+
+    def close(self):
+        for column, f in self.files.items():
+            dtype = np.float64 if column in NUMERIC_COLUMNS else CODE_DTYPE
+            f.seek(0)
+            f.write(_npy_header(dtype, self.rows))
+            f.close()
+        meta = {'rows': self.rows}
+        for column, mapping in self.dictionaries.items():
+            meta[f'{column}_values'] = list(mapping)
+        with open(self.tmp_path / 'meta.json', 'w') as f:
+            json.dump(meta, f)
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.tmp_path.rename(self.path)
+
+    def abort(self):
+        for f in self.files.values():
+            f.close()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class ColumnarDataset:
+    """
+    Read-only, memory-mapped view of a dataset written by ``ColumnarWriter``.
+    """
+    def __init__(self, dataset_id):
+        self.path = dataset_dir(dataset_id)
+        with open(self.path / 'meta.json') as f:
+            self.meta = json.load(f)
+
+    def __len__(self):
+        return self.meta['rows']
+
+    def column(self, column):
+        if len(self) == 0:
+            dtype = np.float64 if column in NUMERIC_COLUMNS else CODE_DTYPE
+            return np.empty(0, dtype=dtype)
+        return np.load(self.path / f'{column}.npy', mmap_mode='r')
+
+    def dictionary(self, column):
+        return self.meta[f'{column}_values']
+
+    def summarize(self):
+        """
+        Count, per-column sums and per-type counts as NumPy reductions.
+        """
+        sums = {column: float(self.column(column).sum()) for column in NUMERIC_COLUMNS}
+        types = self.dictionary('type')
+        counts = np.bincount(self.column('type'), minlength=len(types))
+        type_counts = {eq_type: int(count) for eq_type, count in zip(types, counts) if count}
+        return len(self), sums, type_counts
+
+
+def delete_dataset(dataset_id):
+    shutil.rmtree(dataset_dir(dataset_id), ignore_errors=True)
@@ -0,0 +1,146 @@
+"""
+Row-level comparison of two datasets.
+
+Both datasets are loaded as DataFrames and joined on equipment name with one
+``merge`` (a hash join on factorized names); deltas, added and removed units
+and per-type drift are then computed column-wise. Names that occur more than
+once in a dataset keep their last reading, so the join stays one-to-one.
+"""
+import numpy as np
+import pandas as pd
+
+from .metrics import timed
+from .readings import load_frame
+from .summaries import NUMERIC_FIELDS
+
+ORDERINGS = ['name', *NUMERIC_FIELDS]
+
+
+def _records(frame):
+    """
+    JSON-ready records: NaN becomes ``None`` and NumPy scalars plain Python.
+    """
+    return frame.astype(object).where(frame.notna(), None).to_dict('records')
+
+
+def _dataset_info(dataset, frame, duplicates):
+    return {
+        'id': dataset.id,
+        'uploaded_at': dataset.uploaded_at,
+        'total_equipment': len(frame) + duplicates,
+        'duplicate_names': duplicates,
+    }
+
+
+def _drift(common):
+    """
+    Per-type statistics of the deltas of units present in both datasets,
+    grouped by their type in the newer dataset.
+    """
+    deltas = common[['type_b']].copy()
+    for field in NUMERIC_FIELDS:
+        deltas[field] = common[f'{field}_delta']
+        deltas[f'{field}_abs'] = common[f'{field}_delta'].abs()
+    grouped = deltas.groupby('type_b', observed=True)
+    aggregated = grouped.agg(
+        **{f'{field}_mean_delta': (field, 'mean') for field in NUMERIC_FIELDS},
+        **{f'{field}_std_delta': (field, 'std') for field in NUMERIC_FIELDS},
+        **{f'{field}_mean_abs_delta': (f'{field}_abs', 'mean') for field in NUMERIC_FIELDS},
+        **{f'{field}_max_abs_delta': (f'{field}_abs', 'max') for field in NUMERIC_FIELDS},
+    )
+    drift = {}
+    for eq_type, row in aggregated.iterrows():
+        drift[eq_type] = {
+            field: {
+                stat: (None if pd.isna(row[f'{field}_{stat}']) else float(row[f'{field}_{stat}']))
+                for stat in ('mean_delta', 'std_delta', 'mean_abs_delta', 'max_abs_delta')
+            }
+            for field in NUMERIC_FIELDS
+        }
+    return drift
+
+
+def compare_datasets(dataset_a, dataset_b, limit=100, offset=0, order='flowrate', changed_only=True):
+    """
+    Differences going from ``dataset_a`` to ``dataset_b``. Per-unit rows are
+    sorted by the absolute delta of ``order`` (or by name) and paged with
+    ``limit`` and ``offset``; counts and per-type figures always cover the
+    whole datasets.
+    """
+    with timed('compare_load'):
+        frames = []
+        duplicates = []
+        for dataset in (dataset_a, dataset_b):
+            frame = load_frame(dataset)
+            unique = frame.drop_duplicates('name', keep='last')
+            duplicates.append(len(frame) - len(unique))
+            frames.append(unique)
+        a, b = frames
+
+    with timed('compare_join'):
+        # Join on integer codes of the names; hashing the strings once is
+        # much cheaper than merging on them directly.
+        codes, names = pd.factorize(pd.concat([a['name'], b['name']], ignore_index=True))
+        a = a.drop(columns='name').assign(key=codes[:len(a)])
+        b = b.drop(columns='name').assign(key=codes[len(a):])
+        merged = a.merge(b, on='key', how='outer', suffixes=('_a', '_b'), indicator=True, sort=False)
+        merged.insert(0, 'name', names[merged['key'].to_numpy()])
+        side = merged['_merge']
+        common = merged[side == 'both'].copy()
+        removed = merged.loc[side == 'left_only', ['name', 'type_a', *[f'{field}_a' for field in NUMERIC_FIELDS]]]
+        added = merged.loc[side == 'right_only', ['name', 'type_b', *[f'{field}_b' for field in NUMERIC_FIELDS]]]
+
+        changed = common['type_a'].astype(object) != common['type_b'].astype(object)
+        common['type_changed'] = changed
+        for field in NUMERIC_FIELDS:
+            common[f'{field}_delta'] = common[f'{field}_b'] - common[f'{field}_a']
+            changed = changed | (common[f'{field}_delta'] != 0)
+        common['changed'] = changed
+
+    with timed('compare_drift'):
+        counts_a = a['type'].value_counts()
+        counts_b = b['type'].value_counts()
+        removed_by_type = removed['type_a'].value_counts()
+        added_by_type = added['type_b'].value_counts()
+        drift = _drift(common)
+        types = {}
+        for eq_type in sorted(set(counts_a.index.astype(str)) | set(counts_b.index.astype(str))):
+            types[eq_type] = {
+                'count_a': int(counts_a.get(eq_type, 0)),
+                'count_b': int(counts_b.get(eq_type, 0)),
+                'added': int(added_by_type.get(eq_type, 0)),
+                'removed': int(removed_by_type.get(eq_type, 0)),
+                'drift': drift.get(eq_type),
+            }
+
+    rows = common[common['changed']] if changed_only else common
+    if order == 'name':
+        rows = rows.sort_values('name')
+    else:
+        key = rows[f'{order}_delta'].abs().to_numpy()
+        rows = rows.iloc[np.argsort(-key, kind='stable')]
+    columns = ['name', 'type_a', 'type_b', 'type_changed']
+    for field in NUMERIC_FIELDS:
+        columns += [f'{field}_a', f'{field}_b', f'{field}_delta']
+    page = rows[columns].iloc[offset:offset + limit]
+
+    return {
+        'a': _dataset_info(dataset_a, a, duplicates[0]),
+        'b': _dataset_info(dataset_b, b, duplicates[1]),
+        'counts': {
+            'common': len(common),
+            'changed': int(common['changed'].sum()),
+            'type_changed': int(common['type_changed'].sum()),
+            'added': len(added),
+            'removed': len(removed),
+        },
+        'types': types,
+        'order': order,
+        'limit': limit,
+        'offset': offset,
+        'changes': _records(page),
+        'added': _records(added.sort_values('name').head(limit).rename(
+            columns={'type_b': 'type', **{f'{field}_b': field for field in NUMERIC_FIELDS}})),
+        'removed': _records(removed.sort_values('name').head(limit).rename(
+            columns={'type_a': 'type', **{f'{field}_a': field for field in NUMERIC_FIELDS}})),
+    }
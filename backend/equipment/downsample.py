@@ -0,0 +1,68 @@
+"""
+Downsampling of reading series to a fixed point budget for charting.
+
+``bucket_stats`` splits a series into equal-width index buckets and reduces
+each with ``ufunc.reduceat``, so its cost is a handful of vectorized passes
+regardless of the budget. ``lttb`` implements Largest-Triangle-Three-Buckets,
+which keeps the visually significant points of a series; it loops over
+buckets but every bucket is evaluated with array operations.
+"""
+import numpy as np
+
+
+def bucket_edges(length, buckets):
+    return np.linspace(0, length, buckets + 1).astype(np.int64)
+
+
+def bucket_stats(values, buckets):
+    """
+    Per-bucket min, max and mean of ``values``. Returns ``(starts, stats)``
+    where ``starts`` holds the index of the first row in each bucket.
+    """
+    if len(values) <= buckets:
+        starts = np.arange(len(values))
+        return starts, {'min': values, 'max': values, 'mean': values}
+
+    edges = bucket_edges(len(values), buckets)
+    starts = edges[:-1]
+    counts = np.diff(edges)
+    return starts, {
+        'min': np.minimum.reduceat(values, starts),
+        'max': np.maximum.reduceat(values, starts),
+        'mean': np.add.reduceat(values, starts) / counts,
+    }
+
+
+def lttb(values, threshold):
+    """
+    Indices of the ``threshold`` points of ``values`` chosen by LTTB. The
+    first and last points are always kept.
+    """
+    length = len(values)
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    edges = bucket_edges(length - 2, threshold - 2) + 1
+    x = np.arange(length, dtype=np.float64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+
+    previous = 0
+    for i in range(threshold - 2):
+        start, stop = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_start, next_stop = edges[i + 1], edges[i + 2]
+            avg_x = x[next_start:next_stop].mean()
+            avg_y = values[next_start:next_stop].mean()
+        else:
+            avg_x, avg_y = x[-1], values[-1]
+
+        px, py = x[previous], values[previous]
+        areas = np.abs(
+            (px - avg_x) * (values[start:stop] - py)
+            - (px - x[start:stop]) * (avg_y - py)
+        )
+        previous = start + int(areas.argmax())
+        selected[i + 1] = previous
+    return selected
@@ -0,0 +1,221 @@
+"""
+Server-sent events about dataset changes.
+
+Uploads and pruning write an ``Event`` row in the same transaction as the
+change (``dataset_created`` carries the serialized summary, the same payload
+as ``/api/summary/``; ``dataset_pruned`` carries the removed ids) and then bump
+the shared data version. ``/api/events/`` streams those rows to clients as
+``text/event-stream``, so dashboards can update without a round trip.
+
+Each process runs one ``Broadcaster`` thread, and only while at least one
+client is connected. It reads the data version from the shared cache every
+``POLL_INTERVAL`` seconds and queries for new events only when the version
+has changed, so idle dashboards cost one cache read per interval per
+process, not a query per client. Clients that reconnect with
+``Last-Event-ID`` get the events they missed, up to the ``KEEP`` newest.
+
+Under ASGI (``config.asgi``) streams are async generators and hold no
+thread. Under WSGI every connected client occupies a worker thread.
+"""
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+
+from .caching import get_data_version
+from .models import Event
+
+logger = logging.getLogger(__name__)
+
+RETRY_MS = 5000
+
+DEFAULT_OPTIONS = {
+    'POLL_INTERVAL': 1.0,
+    'HEARTBEAT': 15,
+    'KEEP': 1000,
+}
+
+
+def get_options():
+    options = dict(DEFAULT_OPTIONS)
+    options.update(getattr(settings, 'EQUIPMENT_EVENTS', {}))
+    return options
+
+
+def publish(kind, payload):
+    """
+    Record an event. Call inside the transaction that makes the change and
+    bump the data version after it commits.
+    """
+    event = Event.objects.create(kind=kind, payload=payload)
+    Event.objects.filter(id__lte=event.id - get_options()['KEEP']).delete()
+    return event
+
+
+def dataset_created(dataset):
+    from .serializers import DatasetSummarySerializer
+    from .summaries import get_summary_data
+
+    summary = DatasetSummarySerializer(get_summary_data(dataset, with_stats=True)).data
+    return publish(Event.DATASET_CREATED, {'dataset_id': dataset.id, 'summary': summary})
+
+
+def datasets_pruned(dataset_ids):
+    return publish(Event.DATASET_PRUNED, {'dataset_ids': list(dataset_ids)})
+
+
+def events_after(last_id):
+    return list(Event.objects.filter(id__gt=last_id).order_by('id'))
+
+
+def latest_id():
+    return Event.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def format_event(event):
+    return f"id: {event.id}\nevent: {event.kind}\ndata: {json.dumps(event.payload)}\n\n"
+
+
+class Broadcaster:
+    """
+    Polls for new events on behalf of every client in this process and hands
+    each batch to the subscribers' ``deliver`` callbacks.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+
+    def subscribe(self, deliver):
+        with self._lock:
+            self._subscribers.add(deliver)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='equipment-events', daemon=True)
+                self._thread.start()
+
+    def unsubscribe(self, deliver):
+        with self._lock:
+            self._subscribers.discard(deliver)
+
+    def _run(self):
+        interval = get_options()['POLL_INTERVAL']
+        try:
+            # Version first: an event committed after this read bumps it again.
+            version = get_data_version()
+            last_id = latest_id()
+            while True:
+                time.sleep(interval)
+                with self._lock:
+                    if not self._subscribers:
+                        self._thread = None
+                        return
+                try:
+                    current = get_data_version()
+                    if current == version:
+                        continue
+                    new = events_after(last_id)
+                except Exception:
+                    logger.exception("Polling for events failed")
+                    continue
+                version = current
+                if not new:
+                    continue
+                last_id = new[-1].id
+                with self._lock:
+                    subscribers = list(self._subscribers)
+                for deliver in subscribers:
+                    try:
+                        deliver(new)
+                    except Exception:
+                        # A client that went away between polls.
+                        logger.debug("Dropping events for a closed stream", exc_info=True)
+        finally:
+            with self._lock:
+                if self._thread is threading.current_thread():
+                    self._thread = None
+            connection.close()
+
+
+broadcaster = Broadcaster()
+
+
+def _parse_last_id(last_event_id):
+    try:
+        return int(last_event_id)
+    except (TypeError, ValueError):
+        return None
+
+
+def _missed(last_id):
+    try:
+        return events_after(last_id)
+    finally:
+        # Streams are long-lived; do not hold a connection between events.
+        close_old_connections()
+
+
+def stream(last_event_id=None):
+    """
+    Blocking event stream for WSGI servers.
+    """
+    options = get_options()
+    inbox = queue.Queue()
+    broadcaster.subscribe(inbox.put)
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        sent = _parse_last_id(last_event_id)
+        if sent is not None:
+            for event in _missed(sent):
+                yield format_event(event)
+                sent = event.id
+        while True:
+            try:
+                batch = inbox.get(timeout=options['HEARTBEAT'])
+            except queue.Empty:
+                yield ": keep-alive\n\n"
+                continue
+            for event in batch:
+                if sent is None or event.id > sent:
+                    yield format_event(event)
+                    sent = event.id
+    finally:
+        broadcaster.unsubscribe(inbox.put)
+
+
+async def astream(last_event_id=None):
+    """
+    Event stream for ASGI servers; holds no thread while idle.
+    """
+    options = get_options()
+    loop = asyncio.get_running_loop()
+    inbox = asyncio.Queue()
+
+    def deliver(batch):
+        loop.call_soon_threadsafe(inbox.put_nowait, batch)
+
+    broadcaster.subscribe(deliver)
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        sent = _parse_last_id(last_event_id)
+        if sent is not None:
+            for event in await sync_to_async(_missed)(sent):
+                yield format_event(event)
+                sent = event.id
+        while True:
+            try:
+                batch = await asyncio.wait_for(inbox.get(), options['HEARTBEAT'])
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            for event in batch:
+                if sent is None or event.id > sent:
+                    yield format_event(event)
+                    sent = event.id
+    finally:
+        broadcaster.unsubscribe(deliver)
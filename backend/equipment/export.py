@@ -0,0 +1,113 @@
+"""
+Streaming export of a dataset's readings.
+
+Rows are pulled from storage in chunks (``values_list(...).iterator()`` for
+database datasets, slices of the memory-mapped columns otherwise) and
+encoded chunk by chunk, so memory use does not grow with the dataset.
+Parquet output needs the optional ``pyarrow`` package.
+"""
+import csv
+import io
+import json
+
+from .ingest import REQUIRED_COLUMNS
+from .readings import READING_FIELDS, iter_reading_chunks
+
+FORMATS = {
+    'csv': ('text/csv', 'csv'),
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'parquet': ('application/vnd.apache.parquet', 'parquet'),
+}
+
+
+class ExportError(ValueError):
+    """
+    Raised when an export format cannot be produced.
+    """
+
+
+def iter_csv(dataset, chunk_size):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(REQUIRED_COLUMNS)
+    for chunk in iter_reading_chunks(dataset, chunk_size):
+        writer.writerows(chunk)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+
+def iter_ndjson(dataset, chunk_size):
+    for chunk in iter_reading_chunks(dataset, chunk_size):
+        yield ''.join(
+            json.dumps(dict(zip(READING_FIELDS, row))) + '\n' for row in chunk
+        ).encode()
+
+
+class _Drain(io.RawIOBase):
+    """
+    Write-only sink that hands written bytes back to the generator.
+    """
+    def __init__(self):
+        self.parts = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def take(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def iter_parquet(dataset, chunk_size):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('name', pa.string()),
+        ('type', pa.string()),
+        ('flowrate', pa.float64()),
+        ('pressure', pa.float64()),
+        ('temperature', pa.float64()),
+    ])
+    sink = _Drain()
+    with pq.ParquetWriter(sink, schema, compression='zstd') as writer:
+        for chunk in iter_reading_chunks(dataset, chunk_size):
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+                schema=schema,
+            ))
+            data = sink.take()
+            if data:
+                yield data
+    yield sink.take()
+
+
+def export_stream(dataset, fmt, chunk_size):
+    """
+    Byte chunks of ``dataset`` encoded as ``fmt``.
+    """
+    if fmt == 'csv':
+        return iter_csv(dataset, chunk_size)
+    if fmt == 'ndjson':
+        return iter_ndjson(dataset, chunk_size)
+    if fmt == 'parquet':
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportError("Parquet export requires the pyarrow package")
+        return iter_parquet(dataset, chunk_size)
+    raise ExportError(f"Unknown format {fmt!r}. Choose from {list(FORMATS)}")
@@ -0,0 +1,169 @@
+"""
+Upload formats besides plain CSV.
+
+The format is recognised from the first bytes of the upload, falling back to
+its declared content type:
+
+* gzip- and zstd-compressed CSV are decompressed as a stream and parsed like
+  plain CSV. zstd needs Python 3.14's ``compression.zstd`` or the optional
+  ``zstandard`` package.
+* Parquet and Arrow IPC (file or stream) uploads are read column-wise in
+  record batches with the optional ``pyarrow`` package. Only the required
+  columns are read, and numeric columns arrive as float64 arrays, so there is
+  no CSV round-trip and no string-to-float parsing.
+"""
+import gzip
+import io
+
+CSV = 'csv'
+PARQUET = 'parquet'
+ARROW_FILE = 'arrow_file'
+ARROW_STREAM = 'arrow_stream'
+GZIP = 'gzip'
+ZSTD = 'zstd'
+
+LABELS = {
+    CSV: 'CSV',
+    PARQUET: 'Parquet',
+    ARROW_FILE: 'Arrow IPC',
+    ARROW_STREAM: 'Arrow IPC',
+}
+
+MAGIC = [
+    (b'\x1f\x8b', (CSV, GZIP)),
+    (b'\x28\xb5\x2f\xfd', (CSV, ZSTD)),
+    (b'PAR1', (PARQUET, None)),
+    (b'ARROW1', (ARROW_FILE, None)),
+    (b'\xff\xff\xff\xff', (ARROW_STREAM, None)),
+]
+
+CONTENT_TYPES = {
+    'application/gzip': (CSV, GZIP),
+    'application/x-gzip': (CSV, GZIP),
+    'application/zstd': (CSV, ZSTD),
+    'application/vnd.apache.parquet': (PARQUET, None),
+    'application/x-parquet': (PARQUET, None),
+    'application/vnd.apache.arrow.file': (ARROW_FILE, None),
+    'application/vnd.apache.arrow.stream': (ARROW_STREAM, None),
+}
+
+
+class FormatError(ValueError):
+    """
+    Raised when an upload's format is recognised but cannot be read here.
+    """
+
+
+def detect(file, content_type=None):
+    """
+    ``(format, compression)`` of ``file``, which is left at position 0.
+    """
+    head = file.read(8)
+    file.seek(0)
+    for magic, detected in MAGIC:
+        if head.startswith(magic):
+            return detected
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    return CONTENT_TYPES.get(content_type, (CSV, None))
+
+
+class _Reopening(io.RawIOBase):
+    """
+    Read-only stream over ``opener(source)`` that can rewind to the start by
+    reopening it, for decompressors that only read forwards.
+    """
+    def __init__(self, source, opener):
+        self.source = source
+        self.opener = opener
+        self.reader = opener(source)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        return self.reader.readinto(buffer)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if offset != 0 or whence != io.SEEK_SET:
+            raise io.UnsupportedOperation("Compressed uploads can only be rewound to the start")
+        self.source.seek(0)
+        self.reader = self.opener(self.source)
+        return 0
+
+
+def decompress(file, compression):
+    """
+    A seekable-to-start binary stream of the decompressed content of ``file``.
+    """
+    if compression == GZIP:
+        return gzip.GzipFile(fileobj=file, mode='rb')
+    try:
+        from compression import zstd
+    except ImportError:
+        pass
+    else:
+        return zstd.ZstdFile(file)
+    try:
+        import zstandard
+    except ImportError:
+        raise FormatError("zstd-compressed uploads require Python 3.14 or the zstandard package")
+    return io.BufferedReader(_Reopening(
+        file, lambda source: zstandard.ZstdDecompressor().stream_reader(source, read_across_frames=True),
+    ))
+
+
+def read_arrow_schema(file, fmt):
+    """
+    Open ``file`` as ``fmt`` and return ``(column names, record batch reader)``
+    where the reader is called with the selected columns and a batch size.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise FormatError(f"{LABELS[fmt]} uploads require the pyarrow package")
+
+    if fmt == PARQUET:
+        parquet = pq.ParquetFile(file)
+
+        def batches(columns, batch_size):
+            return parquet.iter_batches(batch_size=batch_size, columns=columns)
+        return parquet.schema_arrow.names, batches
+
+    if fmt == ARROW_FILE:
+        reader = pa.ipc.open_file(file)
+        stream = (reader.get_batch(i) for i in range(reader.num_record_batches))
+    else:
+        reader = pa.ipc.open_stream(file)
+        stream = iter(reader)
+
+    def batches(columns, batch_size):
+        for batch in stream:
+            batch = batch.select(columns)
+            for start in range(0, batch.num_rows, batch_size):
+                yield batch.slice(start, batch_size)
+    return reader.schema.names, batches
+
+
+def arrow_frames(batches, dtypes):
+    """
+    DataFrames from record ``batches`` with every column cast to its entry in
+    ``dtypes`` (``'float64'`` or ``str``).
+    """
+    import pyarrow as pa
+
+    targets = {raw: pa.float64() if dtype == 'float64' else pa.string() for raw, dtype in dtypes.items()}
+    for batch in batches:
+        arrays = []
+        for raw, target in targets.items():
+            column = batch.column(raw)
+            if pa.types.is_dictionary(column.type):
+                column = column.dictionary_decode()
+            try:
+                arrays.append(column.cast(target))
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                raise ValueError(f"column {raw!r}: {e}") from e
+        yield pa.RecordBatch.from_arrays(arrays, names=list(targets)).to_pandas()
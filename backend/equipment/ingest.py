@@ -0,0 +1,336 @@
+"""
+Streaming CSV ingestion for equipment uploads.
+
+The upload is parsed in fixed-size chunks with explicit dtypes, each chunk is
+converted column-wise and written with a bounded ``bulk_create`` batch size,
+so peak memory depends on the chunk size rather than on the file size.
+Compressed CSV, Parquet and Arrow IPC uploads are recognised by
+``equipment.formats`` and produce the same chunks.
+"""
+import time
+
+import pandas as pd
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .columnar import ColumnarWriter
+from .metrics import timed
+from .models import Dataset, Equipment, EquipmentType
+from . import anomalies, background, events, formats, metrics, reports, retention, sqlite
+from .caching import bump_data_version
+from .summaries import SummaryAccumulator
+
+REQUIRED_COLUMNS = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
+
+COLUMN_DTYPES = {
+    'Equipment Name': str,
+    'Type': str,
+    'Flowrate': 'float64',
+    'Pressure': 'float64',
+    'Temperature': 'float64',
+}
+
+DEFAULT_CHUNK_SIZE = 50000
+DEFAULT_BATCH_SIZE = 5000
+
+
+class IngestError(ValueError):
+    """
+    Raised when an upload cannot be ingested because of its content.
+    """
+
+
+class IngestResult:
+    """
+    Outcome of a single ingestion run.
+    """
+    def __init__(self, dataset, rows, seconds, dedup=False):
+        self.dataset = dataset
+        self.rows = rows
+        self.seconds = seconds
+        # True when the upload matched an existing dataset, which is returned
+        # instead of storing a copy.
+        self.dedup = dedup
+        self.pruned = None
+        self.anomalies = None
+
+    @property
+    def rows_per_sec(self):
+        if self.seconds <= 0:
+            return float(self.rows)
+        return self.rows / self.seconds
+
+    def as_dict(self):
+        data = {
+            'dataset_id': self.dataset.id,
+            'rows': self.rows,
+            'seconds': round(self.seconds, 3),
+            'rows_per_sec': round(self.rows_per_sec, 1),
+        }
+        if self.dedup:
+            data['dedup'] = True
+        if self.anomalies is not None:
+            data['anomalies'] = self.anomalies
+        if self.pruned:
+            data['pruned'] = self.pruned.as_dict()
+        return data
+
+
+class DuplicateUpload(Exception):
+    """
+    Rolls back an ingest whose content turned out to be stored already.
+    """
+    def __init__(self, dataset):
+        super().__init__(dataset)
+        self.dataset = dataset
+
+
+def find_duplicate(sha256, exclude=None):
+    """
+    The newest dataset uploaded with content digest ``sha256``, if any.
+    """
+    if not sha256:
+        return None
+    datasets = Dataset.objects.filter(content_sha256=sha256)
+    if exclude is not None:
+        datasets = datasets.exclude(id=exclude.id)
+    return datasets.first()
+
+
+def duplicate_result(dataset, started):
+    rows = dataset.summary.total_equipment if hasattr(dataset, 'summary') else 0
+    return IngestResult(dataset, rows, time.perf_counter() - started, dedup=True)
+
+
+def map_columns(labels):
+    """
+    Map raw column labels (which may carry stray whitespace) onto the
+    required column names.
+    """
+    found = {str(col).strip(): col for col in labels}
+    missing_cols = [col for col in REQUIRED_COLUMNS if col not in found]
+    if missing_cols:
+        raise IngestError(f"Missing columns: {missing_cols}. Found: {list(found)}")
+    return {found[col]: col for col in REQUIRED_COLUMNS}
+
+
+def resolve_columns(file):
+    """
+    Read only the header row of a CSV and map its columns.
+    """
+    try:
+        header = pd.read_csv(file, nrows=0)
+    except pd.errors.EmptyDataError:
+        raise IngestError("Uploaded file is empty")
+    except UnicodeDecodeError as e:
+        raise IngestError(f"Uploaded file is not UTF-8 encoded: {e}") from e
+    except pd.errors.ParserError as e:
+        raise IngestError(f"Could not parse CSV: {e}") from e
+    file.seek(0)
+    return map_columns(header.columns)
+
+
+def iter_chunks(file, chunk_size=None, content_type=None):
+    """
+    Return an iterator of DataFrames of at most ``chunk_size`` rows with
+    canonical column names. The header is validated before this returns.
+    """
+    chunk_size = chunk_size or getattr(settings, 'EQUIPMENT_INGEST_CHUNK_SIZE', DEFAULT_CHUNK_SIZE)
+    fmt, compression = formats.detect(file, content_type)
+    try:
+        if compression:
+            file = formats.decompress(file, compression)
+        if fmt != formats.CSV:
+            return _arrow_chunks(file, fmt, chunk_size)
+        columns = resolve_columns(file)
+    except formats.FormatError as e:
+        raise IngestError(str(e)) from e
+    except (OSError, EOFError) as e:
+        raise IngestError(f"Could not decompress upload: {e}") from e
+    reader = pd.read_csv(
+        file,
+        usecols=list(columns),
+        dtype={raw: COLUMN_DTYPES[name] for raw, name in columns.items()},
+        chunksize=chunk_size,
+    )
+    return _checked_chunks(reader, columns)
+
+
+def _arrow_chunks(file, fmt, chunk_size):
+    try:
+        labels, batches = formats.read_arrow_schema(file, fmt)
+    except formats.FormatError:
+        raise
+    except (ValueError, OSError) as e:
+        raise IngestError(f"Could not parse {formats.LABELS[fmt]}: {e}") from e
+    columns = map_columns(labels)
+    frames = formats.arrow_frames(
+        batches(list(columns), chunk_size),
+        {raw: COLUMN_DTYPES[name] for raw, name in columns.items()},
+    )
+    return _checked_chunks(frames, columns, fmt)
+
+
+def _checked_chunks(reader, columns, fmt=formats.CSV):
+    rows_seen = 0
+    reader = iter(reader)
+    try:
+        while True:
+            with timed(f'read_{fmt}'):
+                chunk = next(reader, None)
+                if chunk is None:
+                    return
+                chunk = chunk.rename(columns=columns)
+                missing = chunk[REQUIRED_COLUMNS].isna().any(axis=1).to_numpy()
+                if missing.any():
+                    row = rows_seen + int(missing.argmax()) + 1
+                    raise IngestError(f"Row {row} has missing values")
+            rows_seen += len(chunk)
+            yield chunk
+    except (ValueError, OSError, EOFError) as e:
+        if isinstance(e, IngestError):
+            raise
+        raise IngestError(f"Could not parse {formats.LABELS[fmt]}: {e}") from e
+
+
+def chunk_to_equipment(chunk, dataset):
+    """
+    Build ``Equipment`` instances from a chunk one column at a time, avoiding
+    the per-row Series that ``iterrows`` allocates. Type names are interned
+    to ``EquipmentType`` ids once per distinct value.
+    """
+    type_ids = EquipmentType.objects.intern(chunk['Type'].unique().tolist())
+    columns = zip(
+        chunk['Equipment Name'].tolist(),
+        chunk['Type'].map(type_ids).tolist(),
+        chunk['Flowrate'].tolist(),
+        chunk['Pressure'].tolist(),
+        chunk['Temperature'].tolist(),
+    )
+    return [
+        Equipment(
+            dataset_id=dataset.id,
+            name=name,
+            type_id=type_id,
+            flowrate=flowrate,
+            pressure=pressure,
+            temperature=temperature,
+            uploaded_at=dataset.uploaded_at,
+        )
+        for name, type_id, flowrate, pressure, temperature in columns
+    ]
+
+
+class OrmSink:
+    """
+    Default ingest sink: ``bulk_create`` with a bounded batch size.
+    """
+    def __init__(self, dataset, batch_size):
+        self.dataset = dataset
+        self.batch_size = batch_size
+
+    def append(self, chunk):
+        with timed('convert'):
+            objects = chunk_to_equipment(chunk, self.dataset)
+        with timed('insert'):
+            Equipment.objects.bulk_create(objects, batch_size=self.batch_size)
+
+    def close(self):
+        pass
+
+    def abort(self):
+        pass
+
+
+def open_sink(dataset, file, batch_size):
+    """
+    Pick where a dataset's readings are written: column files, the SQLite
+    bulk-load path or plain ``bulk_create``.
+    """
+    if dataset.storage == Dataset.COLUMNAR:
+        return ColumnarWriter(dataset.id)
+    if sqlite.bulk_enabled(connection):
+        return sqlite.BulkInsertSink(connection, dataset, sqlite.source_size(file))
+    return OrmSink(dataset, batch_size)
+
+
+def ingest_csv(file, chunk_size=None, batch_size=None, progress=None, content_type=None, sha256=None):
+    """
+    Parse ``file`` and store it as a new ``Dataset`` inside one transaction,
+    together with its ``DatasetSummary``. With ``EQUIPMENT_STORAGE =
+    'columnar'`` the readings go to ``.npy`` column files instead of
+    ``Equipment`` rows.
+
+    ``progress``, if given, is called after every chunk with the number of
+    rows written so far and the elapsed seconds. ``content_type`` helps
+    recognise uploads that are not plain CSV; see ``equipment.formats``.
+
+    ``sha256`` (or a ``sha256`` attribute of ``file``, read once the file has
+    been consumed) is stored on the dataset. If another dataset with the same
+    digest was committed in the meantime, the ingest is rolled back and that
+    dataset is returned as a dedup hit.
+    """
+    batch_size = batch_size or getattr(settings, 'EQUIPMENT_INGEST_BATCH_SIZE', DEFAULT_BATCH_SIZE)
+    started = time.perf_counter()
+    storage = getattr(settings, 'EQUIPMENT_STORAGE', Dataset.DATABASE)
+    summary = SummaryAccumulator()
+    chunks = iter_chunks(file, chunk_size, content_type)
+    sink = None
+    try:
+        with transaction.atomic():
+            dataset = Dataset.objects.create(uploaded_at=timezone.now(), storage=storage)
+            sink = open_sink(dataset, file, batch_size)
+            for chunk in chunks:
+                sink.append(chunk)
+                with timed('summary'):
+                    summary.update(chunk)
+                if progress:
+                    progress(summary.total, time.perf_counter() - started)
+            if not summary.total:
+                raise IngestError("Uploaded file has no data rows")
+            dataset.content_sha256 = sha256 or getattr(file, 'sha256', None) or ''
+            duplicate = find_duplicate(dataset.content_sha256, exclude=dataset)
+            if duplicate:
+                raise DuplicateUpload(duplicate)
+            with timed('finalize'):
+                sink.close()
+            if dataset.content_sha256:
+                dataset.save(update_fields=['content_sha256'])
+            with timed('summary'):
+                summary.save(dataset)
+            events.dataset_created(dataset)
+    except BaseException as e:
+        # The transaction has rolled back; the sink removes whatever it wrote
+        # outside the database, even after close().
+        if sink is not None:
+            sink.abort()
+        if isinstance(e, DuplicateUpload):
+            return duplicate_result(e.dataset, started)
+        raise
+    bump_data_version()
+    metrics.rows_ingested.inc(summary.total)
+    return IngestResult(dataset, summary.total, time.perf_counter() - started)
+
+
+def process_upload(file, progress=None, sha256=None):
+    """
+    Full upload pipeline shared by the synchronous and background paths. An
+    upload whose digest is already known resolves to the existing dataset
+    without being parsed.
+    """
+    started = time.perf_counter()
+    sha256 = sha256 or getattr(file, 'sha256', None)
+    duplicate = find_duplicate(sha256)
+    if duplicate:
+        return duplicate_result(duplicate, started)
+
+    result = ingest_csv(file, progress=progress, content_type=getattr(file, 'content_type', None), sha256=sha256)
+    if result.dedup:
+        return result
+    result.anomalies = anomalies.scan_dataset(result.dataset)
+    with timed('retention'):
+        result.pruned = retention.apply_after_upload(result.dataset)
+    if settings.EQUIPMENT_REPORT_PRERENDER:
+        background.submit(reports.render_report, result.dataset)
+    return result
@@ -0,0 +1,171 @@
+"""
+Background ingestion jobs.
+
+Uploads accepted with ``?async=1`` are staged to ``EQUIPMENT_STAGING_DIR`` and
+ingested by a local thread pool, so a large upload does not hold a request
+thread. Chunked uploads (see ``equipment.uploads``) are queued the same way
+once they are completed, with their directory of parts as the source. The
+ingest runs inside one transaction, so while a job is queued or running its
+status lives in the shared equipment cache; the ``IngestJob`` row is
+authoritative once the job has finished.
+"""
+import logging
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import background, metrics, uploads
+from .caching import get_cache
+from .ingest import IngestError, process_upload
+from .models import IngestJob
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_TIMEOUT = 60 * 60 * 24
+
+
+def progress_key(job_id):
+    return f'equipment:ingest-job:{job_id}'
+
+
+def publish_status(job, **progress):
+    get_cache().set(progress_key(job.id), {
+        'id': str(job.id),
+        'status': job.status,
+        'rows_processed': progress.get('rows_processed', 0),
+        'rows_per_sec': round(progress.get('rows_per_sec', 0.0), 1),
+        'dataset_id': None,
+        'error': None,
+        'created_at': job.created_at,
+        'started_at': job.started_at,
+        'finished_at': None,
+    }, PROGRESS_TIMEOUT)
+
+
+def live_status(job_id):
+    """
+    Status of a queued or running job, or ``None`` once it has finished.
+    """
+    return get_cache().get(progress_key(job_id))
+
+
+def stage_upload(file, job_id):
+    """
+    Copy an uploaded file to the staging directory chunk by chunk.
+    """
+    staging_dir = Path(settings.EQUIPMENT_STAGING_DIR)
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    path = staging_dir / f'{job_id}.upload'
+    with open(path, 'wb') as out:
+        for chunk in file.chunks():
+            out.write(chunk)
+    return path
+
+
+def submit_upload(file):
+    """
+    Stage ``file`` and queue it for ingestion. Returns the ``IngestJob``.
+    """
+    job = IngestJob(status=IngestJob.QUEUED, content_sha256=getattr(file, 'sha256', None) or '')
+    job.source_path = str(stage_upload(file, job.id))
+    job.save()
+    publish_status(job)
+    background.submit(run_job, job.id)
+    return job
+
+
+def start_parts(filename='', size=None, sha256=''):
+    """
+    Start a chunked upload. Returns its ``IngestJob``, whose id is the upload
+    id; the job stays queued until ``complete_parts``.
+    """
+    expire_stalled_uploads()
+    job = IngestJob(status=IngestJob.QUEUED, content_sha256=sha256)
+    uploads.create_upload(job.id, filename, size, sha256)
+    job.source_path = str(uploads.upload_dir(job.id))
+    job.save()
+    publish_status(job)
+    return job
+
+
+def complete_parts(upload_id, parts):
+    """
+    Complete a chunked upload and queue its ingestion. Returns the SHA-256 of
+    the whole file; completing the same upload again queues nothing.
+    """
+    try:
+        sha256, completed = uploads.complete_upload(upload_id, parts)
+    except uploads.UploadError as e:
+        if uploads.upload_state(upload_id) == 'aborted':
+            abort_parts(upload_id, str(e))
+        raise
+    if completed:
+        background.submit(run_job, upload_id)
+    return sha256
+
+
+def abort_parts(upload_id, error="Upload was aborted"):
+    """
+    Abort an open chunked upload, fail its job and delete its parts.
+    """
+    uploads.abort_upload(upload_id)
+    job = IngestJob.objects.filter(id=upload_id, status=IngestJob.QUEUED).first()
+    if job is None:
+        uploads.delete_upload(uploads.upload_dir(upload_id))
+        return
+    job.status = IngestJob.FAILED
+    job.error = error
+    job.finished_at = timezone.now()
+    job.save()
+    get_cache().delete(progress_key(upload_id))
+    remove_source(job.source_path)
+
+
+def expire_stalled_uploads():
+    timeout = settings.EQUIPMENT_UPLOAD_STALL_TIMEOUT
+    for upload_id in uploads.stalled_uploads(timeout):
+        logger.info("Discarding chunked upload %s, no part received for %ss", upload_id, timeout)
+        abort_parts(upload_id, f"Upload stalled: no part received for {timeout} seconds")
+
+
+def open_source(path):
+    if Path(path).is_dir():
+        return uploads.open_upload(path)
+    return open(path, 'rb')
+
+
+def remove_source(path):
+    if Path(path).is_dir():
+        uploads.delete_upload(path)
+    else:
+        Path(path).unlink(missing_ok=True)
+
+
+def run_job(job_id):
+    job = IngestJob.objects.get(id=job_id)
+    job.status = IngestJob.RUNNING
+    job.started_at = timezone.now()
+    job.save(update_fields=['status', 'started_at'])
+    publish_status(job)
+
+    def report(rows, seconds):
+        publish_status(job, rows_processed=rows, rows_per_sec=rows / seconds if seconds > 0 else 0.0)
+
+    try:
+        with metrics.scope('ingest_job'), open_source(job.source_path) as source:
+            result = process_upload(source, progress=report, sha256=job.content_sha256 or None)
+    except Exception as e:
+        if not isinstance(e, IngestError):
+            logger.exception("Ingest job %s failed", job_id)
+        job.status = IngestJob.FAILED
+        job.error = str(e)
+    else:
+        job.status = IngestJob.SUCCEEDED
+        job.dataset = result.dataset
+        job.rows_processed = result.rows
+        job.rows_per_sec = round(result.rows_per_sec, 1)
+    job.finished_at = timezone.now()
+    job.save()
+    get_cache().delete(progress_key(job_id))
+    remove_source(job.source_path)
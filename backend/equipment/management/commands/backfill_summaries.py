@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from equipment.models import Dataset
+from equipment.summaries import build_summary
+
+
+class Command(BaseCommand):
+    help = "Build DatasetSummary rows for datasets that were ingested without one or without statistics sketches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rebuild', action='store_true',
+            help="Recompute summaries for every dataset, not just the missing ones.",
+        )
+
+    def handle(self, *args, **options):
+        datasets = Dataset.objects.all()
+        if not options['rebuild']:
+            datasets = datasets.filter(Q(summary__isnull=True) | Q(summary__stats={}))
+
+        built = 0
+        for dataset in datasets.iterator():
+            summary = build_summary(dataset)
+            built += 1
+            self.stdout.write(f"Dataset {dataset.id}: {summary.total_equipment} rows")
+        self.stdout.write(self.style.SUCCESS(f"Built {built} summaries."))
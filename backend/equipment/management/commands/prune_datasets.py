@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from equipment import retention
+
+
+class Command(BaseCommand):
+    help = "Delete datasets outside the retention policy (EQUIPMENT_RETENTION)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--keep-last', type=int, help="Keep only the N newest datasets.")
+        parser.add_argument('--max-age-days', type=float, help="Delete datasets older than this many days.")
+        parser.add_argument('--max-total-rows', type=int, help="Keep the newest datasets that fit in this many rows.")
+        parser.add_argument('--batch-size', type=int, help="Rows per DELETE batch.")
+        parser.add_argument('--dry-run', action='store_true', help="Only list the datasets that would be deleted.")
+
+    def handle(self, *args, **options):
+        max_age = options['max_age_days']
+        policy = retention.get_policy(
+            KEEP_LAST=options['keep_last'],
+            MAX_AGE=timedelta(days=max_age) if max_age is not None else None,
+            MAX_TOTAL_ROWS=options['max_total_rows'],
+            BATCH_SIZE=options['batch_size'],
+        )
+        expired = retention.select_expired(policy)
+        if options['dry_run']:
+            self.stdout.write(f"Would delete {len(expired)} datasets: {expired}")
+            return
+
+        result = retention.delete_datasets(expired, policy['BATCH_SIZE'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {len(result.dataset_ids)} datasets, reclaimed {result.rows} rows."
+        ))
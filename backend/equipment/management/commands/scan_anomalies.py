@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from equipment.anomalies import scan_dataset
+from equipment.models import Dataset
+
+
+class Command(BaseCommand):
+    help = "Re-run the anomaly rules (EQUIPMENT_ANOMALY_RULES) over stored datasets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dataset', type=int, action='append', help="Only scan this dataset id (repeatable).")
+
+    def handle(self, *args, **options):
+        datasets = Dataset.objects.order_by('id')
+        if options['dataset']:
+            datasets = datasets.filter(id__in=options['dataset'])
+
+        for dataset in datasets.iterator():
+            found = scan_dataset(dataset)
+            self.stdout.write(f"Dataset {dataset.id}: {found} anomalies")
+        self.stdout.write(self.style.SUCCESS("Scan complete."))
@@ -0,0 +1,183 @@
+"""
+In-process timing instrumentation and Prometheus metrics.
+
+Code on the hot paths wraps its phases in ``timed('phase')``. Inside a
+``scope`` (one per HTTP request, opened by ``ServerTimingMiddleware``, or one
+per background ingest job) the time of each phase is summed, together with
+the number and duration of database queries. When the scope closes, the
+totals are observed into histograms labelled by endpoint and phase, and the
+middleware reports them in a ``Server-Timing`` header.
+
+Metrics live in this process only, like the cache counters; with several
+workers each one exposes its own series on ``/api/metrics``.
+"""
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+
+from django.db import connections
+
+from .caching import stats as cache_stats
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+
+_current = contextvars.ContextVar('equipment_timings', default=None)
+
+
+class Histogram:
+    def __init__(self, name, help, labels, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, *labels):
+        with self._lock:
+            counts, total = self._series.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._series[labels] = (counts, total + value)
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = sorted((labels, list(counts), total) for labels, (counts, total) in self._series.items())
+        for labels, counts, total in series:
+            base = _labels(self.labels, labels)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{base}le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{base}le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{_braces(base)} {total}')
+            lines.append(f'{self.name}_count{_braces(base)} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, *labels):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = sorted(self._values.items())
+        for labels, value in values:
+            lines.append(f'{self.name}{_braces(_labels(self.labels, labels))} {value}')
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    return ''.join(f'{name}="{_escape(value)}",' for name, value in zip(names, values))
+
+
+def _braces(labels):
+    return '{' + labels.rstrip(',') + '}' if labels else ''
+
+
+request_seconds = Histogram(
+    'equipment_request_duration_seconds', 'Time spent handling a request.', ('endpoint', 'method', 'status'),
+)
+phase_seconds = Histogram(
+    'equipment_phase_duration_seconds', 'Time spent in one phase of a request or job.', ('endpoint', 'phase'),
+)
+query_count = Histogram(
+    'equipment_db_queries', 'Database queries issued per request or job.', ('endpoint',), QUERY_BUCKETS,
+)
+rows_ingested = Counter('equipment_rows_ingested_total', 'Equipment rows written by uploads.')
+
+REGISTRY = [request_seconds, phase_seconds, query_count, rows_ingested]
+
+
+class Timings:
+    """
+    Per-scope phase totals and query counters.
+    """
+    def __init__(self, endpoint=None):
+        self.endpoint = endpoint
+        self.phases = {}
+        self.queries = 0
+        self.query_seconds = 0.0
+
+    def add(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed with ``connection.execute_wrapper``.
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_seconds += time.perf_counter() - started
+
+
+@contextmanager
+def timed(phase):
+    """
+    Add the time spent in the block to ``phase`` of the current scope. A
+    no-op outside of any scope.
+    """
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - started)
+
+
+@contextmanager
+def scope(endpoint=None):
+    """
+    Collect timings for one request or job. ``endpoint`` may also be set on
+    the yielded ``Timings`` before the block ends.
+    """
+    timings = Timings(endpoint)
+    token = _current.set(timings)
+    try:
+        # Every alias: safe requests read through the replica connection.
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(timings))
+            yield timings
+    finally:
+        _current.reset(token)
+        label = timings.endpoint or 'unknown'
+        for phase, seconds in timings.phases.items():
+            phase_seconds.observe(seconds, label, phase)
+        query_count.observe(timings.queries, label)
+
+
+def expose():
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.expose())
+    lines.append('# HELP equipment_cache_requests_total Response cache lookups by outcome.')
+    lines.append('# TYPE equipment_cache_requests_total counter')
+    for name, counts in sorted(cache_stats.snapshot().items()):
+        for outcome, count in sorted(counts.items()):
+            lines.append(f'equipment_cache_requests_total{{endpoint="{_escape(name)}",outcome="{outcome}"}} {count}')
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,94 @@
+"""
+Request middleware for the equipment API.
+"""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from . import metrics
+from .routers import reading_from_replica
+from .sqlite import busy_response, is_locked
+
+
+class ServerTimingMiddleware:
+    """
+    Time every request, report its phases, query count and total duration in
+    a ``Server-Timing`` header and record them in ``equipment.metrics``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with metrics.scope() as timings:
+            response = self.get_response(request)
+            timings.endpoint = self.endpoint(request)
+        return self.finish(request, response, timings, started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        # Queries made through sync_to_async run on other threads' connections
+        # and are not counted here; phases timed with metrics.timed() are.
+        with metrics.scope() as timings:
+            response = await self.get_response(request)
+            timings.endpoint = self.endpoint(request)
+        return self.finish(request, response, timings, started)
+
+    @staticmethod
+    def endpoint(request):
+        match = request.resolver_match
+        return match.url_name if match and match.url_name else 'unmatched'
+
+    def finish(self, request, response, timings, started):
+        total = time.perf_counter() - started
+        entries = [
+            f'{phase};dur={seconds * 1000:.1f}' for phase, seconds in timings.phases.items()
+        ]
+        entries.append(f'db;dur={timings.query_seconds * 1000:.1f};desc="{timings.queries} queries"')
+        entries.append(f'total;dur={total * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(entries)
+        metrics.request_seconds.observe(total, timings.endpoint, request.method, response.status_code)
+        return response
+
+
+class ReplicaMiddleware:
+    """
+    Route the reads of safe requests to the read-only database alias, see
+    ``equipment.routers``.
+    """
+    sync_capable = True
+    async_capable = True
+
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.method not in self.SAFE_METHODS:
+            return self.get_response(request)
+        with reading_from_replica():
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if request.method not in self.SAFE_METHODS:
+            return await self.get_response(request)
+        with reading_from_replica():
+            return await self.get_response(request)
+
+    def process_exception(self, request, exception):
+        # A write that outlasted the busy timeout: tell the client to retry
+        # instead of reporting a server error.
+        if is_locked(exception):
+            return busy_response()
@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DatasetSummary',
+            fields=[
+                ('dataset', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='summary', serialize=False, to='equipment.dataset')),
+                ('total_equipment', models.IntegerField()),
+                ('sum_flowrate', models.FloatField()),
+                ('sum_pressure', models.FloatField()),
+                ('sum_temperature', models.FloatField()),
+                ('avg_flowrate', models.FloatField(null=True)),
+                ('avg_pressure', models.FloatField(null=True)),
+                ('avg_temperature', models.FloatField(null=True)),
+                ('type_distribution', models.JSONField(default=dict)),
+            ],
+        ),
+    ]
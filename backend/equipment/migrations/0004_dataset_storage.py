@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0003_ingestjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dataset',
+            name='storage',
+            field=models.CharField(choices=[('database', 'Database rows'), ('columnar', 'Columnar files')], default='database', max_length=16),
+        ),
+    ]
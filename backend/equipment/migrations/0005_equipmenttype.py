@@ -0,0 +1,61 @@
+# Generated by Django 6.0.2 on 2026-10-18 09:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def intern_types(apps, schema_editor):
+    Equipment = apps.get_model('equipment', 'Equipment')
+    EquipmentType = apps.get_model('equipment', 'EquipmentType')
+    names = Equipment.objects.values_list('type', flat=True).distinct()
+    for name in names:
+        equipment_type = EquipmentType.objects.create(name=name)
+        Equipment.objects.filter(type=name).update(type_ref=equipment_type)
+
+
+def restore_types(apps, schema_editor):
+    Equipment = apps.get_model('equipment', 'Equipment')
+    EquipmentType = apps.get_model('equipment', 'EquipmentType')
+    for equipment_type in EquipmentType.objects.all():
+        Equipment.objects.filter(type_ref=equipment_type).update(type=equipment_type.name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0004_dataset_storage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EquipmentType',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='equipment',
+            name='type_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='equipment.equipmenttype'),
+        ),
+        migrations.RunPython(intern_types, restore_types),
+        migrations.RemoveField(
+            model_name='equipment',
+            name='type',
+        ),
+        migrations.RenameField(
+            model_name='equipment',
+            old_name='type_ref',
+            new_name='type',
+        ),
+        migrations.AlterField(
+            model_name='equipment',
+            name='type',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='equipment', to='equipment.equipmenttype'),
+        ),
+        migrations.AddIndex(
+            model_name='equipment',
+            index=models.Index(fields=['dataset', 'type'], name='equipment_dataset_type_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 6.0.2 on 2026-10-18 09:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('equipment', '0006_datasetsummary_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Anomaly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('row', models.BigIntegerField()),
+                ('name', models.CharField(max_length=255)),
+                ('field', models.CharField(max_length=16)),
+                ('rule', models.CharField(max_length=64)),
+                ('kind', models.CharField(choices=[('min', 'Below minimum'), ('max', 'Above maximum'), ('zscore', 'Z-score outlier')], max_length=8)),
+                ('value', models.FloatField()),
+                ('threshold', models.FloatField()),
+                ('score', models.FloatField(blank=True, null=True)),
+                ('dataset', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='anomalies', to='equipment.dataset')),
+                ('type', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='equipment.equipmenttype')),
+            ],
+            options={
+                'ordering': ['dataset', 'id'],
+                'indexes': [models.Index(fields=['dataset', 'rule'], name='anomaly_dataset_rule_idx'), models.Index(fields=['dataset', 'type'], name='anomaly_dataset_type_idx'), models.Index(fields=['dataset', 'field'], name='anomaly_dataset_field_idx')],
+            },
+        ),
+    ]
@@ -1,11 +1,24 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction
 
 class Dataset(models.Model):
     """
     Represents a specific CSV upload event.
     """
+    DATABASE = 'database'
+    COLUMNAR = 'columnar'
+    STORAGE_CHOICES = [
+        (DATABASE, 'Database rows'),
+        (COLUMNAR, 'Columnar files'),
+    ]
+
     id = models.AutoField(primary_key=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
+    # Where the equipment readings live; see equipment.columnar.
+    storage = models.CharField(max_length=16, choices=STORAGE_CHOICES, default=DATABASE)
+    # SHA-256 of the uploaded bytes; identical uploads resolve to this dataset.
+    content_sha256 = models.CharField(max_length=64, blank=True, db_index=True)
 
     class Meta:
         ordering = ['-uploaded_at']
@@ -13,20 +26,171 @@ class Dataset(models.Model):
     def __str__(self):
         return f"Dataset {self.id} - {self.uploaded_at}"
 
+# name -> id for types that are known to be committed; types are never deleted.
+_type_ids = {}
+
+
+class EquipmentTypeManager(models.Manager):
+    def intern(self, names):
+        """
+        Map type names to ``EquipmentType`` ids, creating missing types. Ids
+        are cached in-process once the creating transaction commits.
+        """
+        ids = {name: _type_ids[name] for name in names if name in _type_ids}
+        missing = [name for name in names if name not in ids]
+        if missing:
+            self.bulk_create([EquipmentType(name=name) for name in missing], ignore_conflicts=True)
+            created = dict(self.filter(name__in=missing).values_list('name', 'id'))
+            ids.update(created)
+            transaction.on_commit(lambda: _type_ids.update(created))
+        return ids
+
+
+class EquipmentType(models.Model):
+    """
+    Interned equipment type name, referenced by integer id from Equipment.
+    """
+    name = models.CharField(max_length=255, unique=True)
+
+    objects = EquipmentTypeManager()
+
+    def __str__(self):
+        return self.name
+
 class Equipment(models.Model):
     """
     Represents a single equipment record from an uploaded CSV.
     """
     dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='equipment')
     name = models.CharField(max_length=255)
-    type = models.CharField(max_length=255)
+    type = models.ForeignKey(EquipmentType, on_delete=models.PROTECT, related_name='equipment')
     flowrate = models.FloatField()
     pressure = models.FloatField()
     temperature = models.FloatField()
     # Redundant field to strictly satisfy user requirement "Equipment model with fields... uploaded_at"
     uploaded_at = models.DateTimeField() 
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['dataset', 'type'], name='equipment_dataset_type_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.uploaded_at and self.dataset:
             self.uploaded_at = self.dataset.uploaded_at
         super().save(*args, **kwargs)
+
+class DatasetSummary(models.Model):
+    """
+    Aggregates for a dataset, computed once when it is ingested so the read
+    endpoints never have to scan its equipment rows.
+    """
+    dataset = models.OneToOneField(Dataset, on_delete=models.CASCADE, primary_key=True, related_name='summary')
+    total_equipment = models.IntegerField()
+    sum_flowrate = models.FloatField()
+    sum_pressure = models.FloatField()
+    sum_temperature = models.FloatField()
+    avg_flowrate = models.FloatField(null=True)
+    avg_pressure = models.FloatField(null=True)
+    avg_temperature = models.FloatField(null=True)
+    type_distribution = models.JSONField(default=dict)
+    # Per-type moment and quantile sketches, see ``equipment.stats``.
+    stats = models.JSONField(default=dict)
+
+    def __str__(self):
+        return f"Summary for dataset {self.dataset_id}"
+
+
+class IngestJob(models.Model):
+    """
+    A background ingestion of an upload that was staged to disk.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    source_path = models.CharField(max_length=1024)
+    content_sha256 = models.CharField(max_length=64, blank=True)
+    rows_processed = models.BigIntegerField(default=0)
+    rows_per_sec = models.FloatField(default=0)
+    dataset = models.ForeignKey(Dataset, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Ingest job {self.id} ({self.status})"
+
+
+class Anomaly(models.Model):
+    """
+    A reading that broke one of the ``EQUIPMENT_ANOMALY_RULES``.
+    """
+    MIN = 'min'
+    MAX = 'max'
+    ZSCORE = 'zscore'
+    KIND_CHOICES = [
+        (MIN, 'Below minimum'),
+        (MAX, 'Above maximum'),
+        (ZSCORE, 'Z-score outlier'),
+    ]
+
+    dataset = models.ForeignKey(Dataset, on_delete=models.CASCADE, related_name='anomalies')
+    # Position of the reading in storage order; columnar datasets have no
+    # equipment rows to point at.
+    row = models.BigIntegerField()
+    name = models.CharField(max_length=255)
+    type = models.ForeignKey(EquipmentType, on_delete=models.PROTECT, related_name='+')
+    field = models.CharField(max_length=16)
+    rule = models.CharField(max_length=64)
+    kind = models.CharField(max_length=8, choices=KIND_CHOICES)
+    value = models.FloatField()
+    threshold = models.FloatField()
+    score = models.FloatField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['dataset', 'id']
+        indexes = [
+            models.Index(fields=['dataset', 'rule'], name='anomaly_dataset_rule_idx'),
+            models.Index(fields=['dataset', 'type'], name='anomaly_dataset_type_idx'),
+            models.Index(fields=['dataset', 'field'], name='anomaly_dataset_field_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.rule} on {self.name} ({self.field}={self.value})"
+
+
+class Event(models.Model):
+    """
+    A dataset change pushed to clients by ``/api/events/``. Written in the
+    same transaction as the change it describes.
+    """
+    DATASET_CREATED = 'dataset_created'
+    DATASET_PRUNED = 'dataset_pruned'
+    KIND_CHOICES = [
+        (DATASET_CREATED, 'Dataset created'),
+        (DATASET_PRUNED, 'Dataset pruned'),
+    ]
+
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"Event {self.id} ({self.kind})"
@@ -0,0 +1,118 @@
+"""
+Storage-independent access to a dataset's equipment readings.
+
+Datasets keep their readings either as ``Equipment`` rows or as columnar
+files (see ``equipment.columnar``); callers go through these helpers so they
+work with both.
+"""
+import numpy as np
+import pandas as pd
+from django.db import transaction
+
+from .columnar import ColumnarDataset
+from .models import Dataset, Equipment, EquipmentType
+
+READING_FIELDS = ['name', 'type', 'flowrate', 'pressure', 'temperature']
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def iter_reading_chunks(dataset, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Yield lists of ``(name, type, flowrate, pressure, temperature)`` tuples in
+    storage order, at most ``chunk_size`` at a time.
+    """
+    if dataset.storage == Dataset.COLUMNAR:
+        yield from _iter_columnar_chunks(ColumnarDataset(dataset.id), chunk_size)
+        return
+
+    rows = (
+        Equipment.objects.filter(dataset=dataset)
+        .order_by('id')
+        .values_list('name', 'type__name', 'flowrate', 'pressure', 'temperature')
+        .iterator(chunk_size=chunk_size)
+    )
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _iter_columnar_chunks(store, chunk_size):
+    names = np.array(store.dictionary('name'), dtype=object)
+    types = np.array(store.dictionary('type'), dtype=object)
+    columns = {column: store.column(column) for column in ('name', 'type', 'flowrate', 'pressure', 'temperature')}
+    for start in range(0, len(store), chunk_size):
+        stop = start + chunk_size
+        yield list(zip(
+            names[columns['name'][start:stop]].tolist(),
+            types[columns['type'][start:stop]].tolist(),
+            columns['flowrate'][start:stop].tolist(),
+            columns['pressure'][start:stop].tolist(),
+            columns['temperature'][start:stop].tolist(),
+        ))
+
+
+def load_columns(dataset, fields, type_name=None):
+    """
+    Numeric ``fields`` of a dataset as float64 arrays in storage order,
+    optionally restricted to one equipment type. Columnar datasets return
+    memory-mapped arrays (or masked copies when filtering).
+    """
+    if dataset.storage == Dataset.COLUMNAR:
+        store = ColumnarDataset(dataset.id)
+        columns = {field: store.column(field) for field in fields}
+        if type_name is None:
+            return columns
+        types = store.dictionary('type')
+        if type_name not in types:
+            return {field: np.empty(0) for field in fields}
+        mask = store.column('type') == types.index(type_name)
+        return {field: values[mask] for field, values in columns.items()}
+
+    rows = Equipment.objects.filter(dataset=dataset).order_by('id')
+    if type_name is not None:
+        rows = rows.filter(type__name=type_name)
+    dtype = [(field, np.float64) for field in fields]
+    # One read transaction, so the count and the rows come from the same
+    # snapshot even if another process prunes the dataset in between.
+    with transaction.atomic(using=rows.db):
+        records = np.fromiter(
+            rows.values_list(*fields).iterator(chunk_size=DEFAULT_CHUNK_SIZE),
+            dtype=dtype,
+            count=rows.count(),
+        )
+    return {field: records[field] for field in fields}
+
+
+def load_frame(dataset):
+    """
+    All readings of a dataset as a DataFrame with ``READING_FIELDS`` columns;
+    ``type`` is a categorical.
+    """
+    if dataset.storage == Dataset.COLUMNAR:
+        store = ColumnarDataset(dataset.id)
+        names = np.array(store.dictionary('name'), dtype=object)
+        data = {
+            'name': names[store.column('name')],
+            'type': pd.Categorical.from_codes(store.column('type'), store.dictionary('type')),
+        }
+        data.update((field, store.column(field)) for field in ('flowrate', 'pressure', 'temperature'))
+        return pd.DataFrame(data)
+
+    # Type ids are mapped to names afterwards rather than joined per row.
+    rows = (
+        Equipment.objects.filter(dataset=dataset)
+        .order_by('id')
+        .values_list('name', 'type_id', 'flowrate', 'pressure', 'temperature')
+        .iterator(chunk_size=DEFAULT_CHUNK_SIZE)
+    )
+    frame = pd.DataFrame.from_records(rows, columns=READING_FIELDS)
+    codes, type_ids = pd.factorize(frame['type'])
+    names = dict(EquipmentType.objects.filter(id__in=type_ids.tolist()).values_list('id', 'name'))
+    frame['type'] = pd.Categorical.from_codes(codes, [names[type_id] for type_id in type_ids])
+    return frame
@@ -0,0 +1,182 @@
+"""
+PDF reports, rendered once per dataset and kept on disk.
+
+Datasets never change after ingestion, so a report file stays valid until
+its dataset is pruned. Two kinds exist:
+
+* ``summary`` -- aggregates and the type distribution
+* ``full`` -- the summary followed by a paginated table of the readings,
+  read from storage in chunks
+
+reportlab keeps every finished page in memory until the document is saved,
+so the memory a ``full`` report needs grows with its page count. The table is
+therefore cut off after ``EQUIPMENT_REPORT_MAX_ROWS`` rows; the export
+endpoint is the way to get every reading of a large dataset.
+
+Files are written under a temporary name and renamed into place, so a
+concurrent request never sees a half-written report.
+"""
+import os
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfgen import canvas
+
+from .metrics import timed
+from .readings import iter_reading_chunks
+from .summaries import get_summary_data
+
+SUMMARY = 'summary'
+FULL = 'full'
+KINDS = (SUMMARY, FULL)
+
+PAGE_TOP = 750
+PAGE_BOTTOM = 60
+
+TABLE_COLUMNS = [
+    ('Equipment Name', 50),
+    ('Type', 230),
+    ('Flowrate', 360),
+    ('Pressure', 440),
+    ('Temperature', 520),
+]
+TABLE_ROW_HEIGHT = 12
+
+
+def report_dir():
+    return Path(settings.EQUIPMENT_REPORT_DIR)
+
+
+def report_path(dataset_id, kind=SUMMARY):
+    return report_dir() / f'dataset_{dataset_id}_{kind}.pdf'
+
+
+class ReportCanvas:
+    """
+    Thin wrapper over a reportlab canvas that starts a new page whenever the
+    next line would run off the bottom of the current one.
+    """
+    def __init__(self, path, title):
+        self.canvas = canvas.Canvas(str(path), pagesize=letter, pageCompression=1)
+        self.canvas.setTitle(title)
+        self.page = 1
+        self.y = PAGE_TOP
+        self.on_new_page = None
+
+    def new_page(self):
+        self.canvas.showPage()
+        self.page += 1
+        self.y = PAGE_TOP
+        if self.on_new_page:
+            self.on_new_page()
+
+    def ensure_space(self, height):
+        if self.y - height < PAGE_BOTTOM:
+            self.new_page()
+
+    def line(self, text, x=100, size=12, bold=False, step=20):
+        self.ensure_space(step)
+        self.canvas.setFont("Helvetica-Bold" if bold else "Helvetica", size)
+        self.canvas.drawString(x, self.y, text)
+        self.y -= step
+
+    def gap(self, height=20):
+        self.y -= height
+
+    def save(self):
+        self.canvas.showPage()
+        self.canvas.save()
+
+
+def _draw_summary(report, dataset, data):
+    report.line("Chemical Equipment Summary Report", size=16, bold=True, step=30)
+    report.line(f"Dataset ID: {dataset.id}")
+    report.line(f"Uploaded At: {dataset.uploaded_at}")
+    report.gap()
+
+    if not data:
+        report.line("Total Equipment: 0")
+        return
+
+    report.line(f"Total Equipment: {data['total_equipment']}")
+    report.line(f"Average Flowrate: {data['avg_flowrate']:.2f}")
+    report.line(f"Average Pressure: {data['avg_pressure']:.2f}")
+    report.line(f"Average Temperature: {data['avg_temperature']:.2f}")
+    report.gap()
+
+    report.line("Type Distribution:", size=14, bold=True, step=25)
+    for dtype, count in data['type_distribution'].items():
+        report.line(f"- {dtype}: {count}", x=120)
+
+
+def _draw_table_header(report):
+    report.ensure_space(TABLE_ROW_HEIGHT * 3)
+    report.canvas.setFont("Helvetica-Bold", 9)
+    for label, x in TABLE_COLUMNS:
+        report.canvas.drawString(x, report.y, label)
+    report.y -= TABLE_ROW_HEIGHT
+    report.canvas.line(TABLE_COLUMNS[0][1], report.y + 8, 580, report.y + 8)
+    report.canvas.setFont("Helvetica", 9)
+
+
+def _draw_readings(report, dataset, max_rows):
+    report.new_page()
+    report.line("Equipment Readings", size=14, bold=True, step=25)
+    report.on_new_page = lambda: _draw_table_header(report)
+    _draw_table_header(report)
+
+    drawn = 0
+    for chunk in iter_reading_chunks(dataset):
+        for name, eq_type, flowrate, pressure, temperature in chunk:
+            if drawn == max_rows:
+                report.on_new_page = None
+                report.gap()
+                report.line(f"... truncated after {max_rows} rows", size=10)
+                return
+            if report.y - TABLE_ROW_HEIGHT < PAGE_BOTTOM:
+                report.new_page()
+            values = [str(name)[:36], str(eq_type)[:24], f"{flowrate:.2f}", f"{pressure:.2f}", f"{temperature:.2f}"]
+            for value, (_, x) in zip(values, TABLE_COLUMNS):
+                report.canvas.drawString(x, report.y, value)
+            report.y -= TABLE_ROW_HEIGHT
+            drawn += 1
+    report.on_new_page = None
+
+
+def render_report(dataset, kind=SUMMARY):
+    """
+    Render the report for ``dataset`` to disk and return its path.
+    """
+    path = report_path(dataset.id, kind)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(f'.{path.name}.{uuid.uuid4().hex}')
+
+    data = get_summary_data(dataset)
+    with timed('pdf_render'):
+        report = ReportCanvas(tmp_path, f"Dataset {dataset.id} report")
+        _draw_summary(report, dataset, data)
+        if kind == FULL:
+            _draw_readings(report, dataset, settings.EQUIPMENT_REPORT_MAX_ROWS)
+        try:
+            report.save()
+            os.replace(tmp_path, path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+    return path
+
+
+def get_report(dataset, kind=SUMMARY):
+    """
+    Path to the report for ``dataset``, rendering it on first use.
+    """
+    path = report_path(dataset.id, kind)
+    if not path.exists():
+        render_report(dataset, kind)
+    return path
+
+
+def delete_reports(dataset_id):
+    for kind in KINDS:
+        report_path(dataset_id, kind).unlink(missing_ok=True)
@@ -0,0 +1,187 @@
+"""
+Dataset retention.
+
+The policy comes from ``EQUIPMENT_RETENTION`` and combines three limits, any
+of which may be ``None``:
+
+* ``KEEP_LAST`` -- number of newest datasets to keep
+* ``MAX_AGE`` -- ``timedelta``; older datasets are dropped
+* ``MAX_TOTAL_ROWS`` -- newest datasets are kept while their row counts fit
+
+The newest dataset is never pruned, and neither is the one whose upload
+triggered the pass, so an upload never reports a dataset that is already gone.
+
+Datasets are removed ``BATCH_SIZE`` at a time. Their equipment rows go with
+set-based ``DELETE`` statements in batches of ``BATCH_SIZE`` rows, each batch
+in its own transaction, instead of going through the ORM collector which
+loads every row into Python. ``MODE`` controls what happens after an upload:
+``'inline'`` prunes in the request, ``'background'`` hands it to the worker
+pool and ``'off'`` leaves it to the ``prune_datasets`` management command.
+Every transaction is retried while another process holds the database lock;
+an inline pass that still cannot get it is handed to the worker pool so that
+the upload does not fail.
+"""
+import logging
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.utils import timezone
+
+from . import background, columnar, events, reports
+from .caching import bump_data_version
+from .models import Anomaly, Dataset, Equipment
+from .sqlite import is_locked, retry_locked
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLICY = {
+    'KEEP_LAST': 5,
+    'MAX_AGE': None,
+    'MAX_TOTAL_ROWS': None,
+    'BATCH_SIZE': 10000,
+    'MODE': 'inline',
+}
+
+# Tables that can hold many rows per dataset and are deleted in batches.
+BULK_MODELS = [Equipment, Anomaly]
+
+
+class PruneResult:
+    """
+    Datasets removed by one pruning pass and the rows reclaimed with them.
+    """
+    def __init__(self, dataset_ids=(), rows=0):
+        self.dataset_ids = list(dataset_ids)
+        self.rows = rows
+
+    def as_dict(self):
+        return {'datasets': self.dataset_ids, 'rows': self.rows}
+
+
+def get_policy(**overrides):
+    policy = dict(DEFAULT_POLICY)
+    policy.update(getattr(settings, 'EQUIPMENT_RETENTION', {}))
+    policy.update({key: value for key, value in overrides.items() if value is not None})
+    return policy
+
+
+def select_expired(policy, keep=()):
+    """
+    Ids of the datasets that fall outside ``policy``, leaving out the newest
+    dataset and the ids in ``keep``.
+    """
+    datasets = Dataset.objects.order_by('-uploaded_at', '-id')
+    keep = set(keep)
+    keep.update(datasets.values_list('id', flat=True)[:1])
+    doomed = set()
+
+    if policy['KEEP_LAST'] is not None:
+        doomed.update(datasets.values_list('id', flat=True)[policy['KEEP_LAST']:])
+
+    if policy['MAX_AGE'] is not None:
+        cutoff = timezone.now() - policy['MAX_AGE']
+        doomed.update(datasets.filter(uploaded_at__lt=cutoff).values_list('id', flat=True))
+
+    if policy['MAX_TOTAL_ROWS'] is not None:
+        kept_rows = 0
+        for dataset_id, rows in datasets.exclude(id__in=doomed).values_list('id', 'summary__total_equipment'):
+            kept_rows += rows or 0
+            if kept_rows > policy['MAX_TOTAL_ROWS']:
+                doomed.add(dataset_id)
+
+    return sorted(doomed - keep)
+
+
+def _delete_in_batches(model, dataset_ids, batch_size):
+    table = connection.ops.quote_name(model._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(dataset_ids))
+    sql = (
+        f"DELETE FROM {table} WHERE id IN "
+        f"(SELECT id FROM {table} WHERE dataset_id IN ({placeholders}) LIMIT %s)"
+    )
+
+    def delete_batch():
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(sql, [*dataset_ids, batch_size])
+            return cursor.rowcount
+
+    deleted = 0
+    while True:
+        count = retry_locked(delete_batch)
+        deleted += count
+        if count < batch_size:
+            return deleted
+
+
+def _delete_datasets(datasets, dataset_ids):
+    with transaction.atomic():
+        datasets.delete()
+        events.datasets_pruned(dataset_ids)
+
+
+def delete_datasets(dataset_ids, batch_size=None):
+    """
+    Remove datasets together with their rows and on-disk files.
+    """
+    dataset_ids = list(dataset_ids)
+    if not dataset_ids:
+        return PruneResult()
+    batch_size = batch_size or get_policy()['BATCH_SIZE']
+
+    rows = 0
+    # Bounded id lists keep every statement under SQLite's variable limit.
+    for start in range(0, len(dataset_ids), batch_size):
+        rows += _delete_dataset_batch(dataset_ids[start:start + batch_size], batch_size)
+    bump_data_version()
+    return PruneResult(dataset_ids, rows)
+
+
+def _delete_dataset_batch(dataset_ids, batch_size):
+    datasets = Dataset.objects.filter(id__in=dataset_ids)
+    columnar_rows = dict(
+        datasets.filter(storage=Dataset.COLUMNAR).values_list('id', 'summary__total_equipment')
+    )
+    rows = sum(count or 0 for count in columnar_rows.values())
+    for model in BULK_MODELS:
+        deleted = _delete_in_batches(model, dataset_ids, batch_size)
+        if model is Equipment:
+            rows += deleted
+
+    # Only small per-dataset rows are left for the collector.
+    retry_locked(_delete_datasets, datasets, dataset_ids)
+    for dataset_id in dataset_ids:
+        reports.delete_reports(dataset_id)
+        if dataset_id in columnar_rows:
+            columnar.delete_dataset(dataset_id)
+    return rows
+
+
+def prune(keep=(), **overrides):
+    policy = get_policy(**overrides)
+    result = delete_datasets(select_expired(policy, keep), policy['BATCH_SIZE'])
+    if result.dataset_ids:
+        logger.info("Pruned %d datasets (%d rows)", len(result.dataset_ids), result.rows)
+    return result
+
+
+def apply_after_upload(dataset):
+    """
+    Run retention according to ``MODE``, never pruning the just uploaded
+    ``dataset``. Returns the ``PruneResult`` when pruning ran inline,
+    otherwise ``None``.
+    """
+    mode = get_policy()['MODE']
+    keep = [dataset.id]
+    if mode == 'inline':
+        try:
+            return prune(keep)
+        except OperationalError as e:
+            if not is_locked(e):
+                raise
+            # The upload has committed; a later pass finishes what this one began.
+            logger.warning("Database locked, pruning in the background instead")
+            background.submit(prune, keep)
+            return None
+    if mode == 'background':
+        background.submit(prune, keep)
+    return None
@@ -0,0 +1,54 @@
+"""
+Database routing between the read-write ``default`` alias and ``replica``.
+
+``replica`` opens the same SQLite file read-only (``mode=ro``). Under WAL
+its reads never wait for a writer, and it cannot take the write lock by
+accident, so a long upload in one worker process does not hold up the
+GET requests of the others.
+
+Reads are only routed there while ``ReplicaMiddleware`` marks the request as
+safe (GET, HEAD, OPTIONS): a write request has to read what it wrote in its
+own transaction, and background jobs keep using ``default``. Writes always
+go to ``default``, including saves of instances that were read from
+``replica``.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+REPLICA = 'replica'
+
+_use_replica = contextvars.ContextVar('equipment_use_replica', default=False)
+
+
+@contextmanager
+def reading_from_replica():
+    """
+    Route the reads inside the block to ``replica``, if it is configured.
+    """
+    token = _use_replica.set(REPLICA in settings.DATABASES)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReadReplicaRouter:
+    ALIASES = {DEFAULT_DB_ALIAS, REPLICA}
+
+    def db_for_read(self, model, **hints):
+        return REPLICA if _use_replica.get() else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases are the same database.
+        if obj1._state.db in self.ALIASES and obj2._state.db in self.ALIASES:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA
@@ -1,7 +1,9 @@
 from rest_framework import serializers
-from .models import Equipment, Dataset
+from .models import Anomaly, Equipment, Dataset, IngestJob
 
 class EquipmentSerializer(serializers.ModelSerializer):
+    type = serializers.CharField(source='type.name', read_only=True)
+
     class Meta:
         model = Equipment
         fields = ['dataset', 'name', 'type', 'flowrate', 'pressure', 'temperature', 'uploaded_at']
@@ -14,3 +16,19 @@ class DatasetSummarySerializer(serializers.Serializer):
     avg_pressure = serializers.FloatField()
     avg_temperature = serializers.FloatField()
     type_distribution = serializers.DictField()
+    stats = serializers.DictField(required=False)
+
+class IngestJobSerializer(serializers.ModelSerializer):
+    dataset_id = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = IngestJob
+        fields = ['id', 'status', 'rows_processed', 'rows_per_sec', 'dataset_id', 'error',
+                  'created_at', 'started_at', 'finished_at']
+
+class AnomalySerializer(serializers.ModelSerializer):
+    type = serializers.CharField(source='type.name', read_only=True)
+
+    class Meta:
+        model = Anomaly
+        fields = ['id', 'row', 'name', 'type', 'field', 'rule', 'kind', 'value', 'threshold', 'score']
@@ -0,0 +1,177 @@
+"""
+SQLite bulk-load path for ingestion.
+
+With ``EQUIPMENT_BULK_INGEST['ENABLED']`` on a SQLite database, ingestion
+bypasses model instances and ``bulk_create`` and feeds each chunk to one
+prepared ``INSERT`` through ``executemany``. For loads of at least
+``DEFER_INDEXES_MIN_BYTES`` the secondary indexes of the equipment table are
+dropped for the duration of the load and rebuilt before the transaction
+commits. SQLite DDL is transactional, and under WAL other connections keep
+reading the previous snapshot, indexes included.
+
+Connection-level PRAGMAs (WAL journal, ``synchronous=NORMAL``) are set for
+every connection through the database ``init_command`` option in settings.
+
+Several worker processes share the database file. Write transactions start
+with ``BEGIN IMMEDIATE`` and wait up to the busy timeout for the write lock;
+short writes that still find the database locked are retried with
+``retry_locked``, and requests that give up are answered with 503 and a
+``Retry-After`` header rather than a server error.
+"""
+import logging
+import os
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.http import JsonResponse
+
+from .metrics import timed
+from .models import Equipment, EquipmentType
+
+DEFAULT_OPTIONS = {
+    'ENABLED': False,
+    'CACHE_SIZE_KB': 200000,
+    'DEFER_INDEXES_MIN_BYTES': 256 * 1024 * 1024,
+}
+
+INSERT_COLUMNS = ['dataset_id', 'name', 'type_id', 'flowrate', 'pressure', 'temperature', 'uploaded_at']
+
+
+DEFAULT_RETRY = {
+    'ATTEMPTS': 5,
+    'DELAY': 0.1,               # seconds before the first retry, doubled after each
+    'RETRY_AFTER': 2,           # Retry-After header of busy responses
+}
+
+logger = logging.getLogger(__name__)
+
+
+def get_options():
+    options = dict(DEFAULT_OPTIONS)
+    options.update(getattr(settings, 'EQUIPMENT_BULK_INGEST', {}))
+    return options
+
+
+def get_retry_options():
+    options = dict(DEFAULT_RETRY)
+    options.update(getattr(settings, 'EQUIPMENT_DB_RETRY', {}))
+    return options
+
+
+def is_locked(exc):
+    """
+    Whether ``exc`` is SQLite giving up on a lock held by another connection.
+    """
+    return isinstance(exc, OperationalError) and 'locked' in str(exc)
+
+
+def retry_locked(func, *args, **kwargs):
+    """
+    Call ``func``, retrying with backoff while the database is locked. Only
+    for work that is safe to repeat and runs in its own transaction: inside
+    an outer atomic block the error is raised immediately, since the
+    transaction it belongs to is already broken.
+    """
+    options = get_retry_options()
+    delay = options['DELAY']
+    for attempt in range(1, options['ATTEMPTS'] + 1):
+        try:
+            return func(*args, **kwargs)
+        except OperationalError as e:
+            if not is_locked(e) or connection.in_atomic_block or attempt == options['ATTEMPTS']:
+                raise
+            logger.warning("Database locked, retrying %s in %.2fs (%d/%d)",
+                           getattr(func, '__name__', func), delay, attempt, options['ATTEMPTS'])
+        time.sleep(delay)
+        delay *= 2
+
+
+def busy_response():
+    """
+    ``503`` for a request that could not get the database in time.
+    """
+    response = JsonResponse({"error": "The database is busy, please retry"}, status=503)
+    response['Retry-After'] = str(get_retry_options()['RETRY_AFTER'])
+    return response
+
+
+def bulk_enabled(connection):
+    return connection.vendor == 'sqlite' and get_options()['ENABLED']
+
+
+def source_size(file):
+    size = getattr(file, 'size', None)
+    if size is None:
+        try:
+            size = os.fstat(file.fileno()).st_size
+        except (AttributeError, OSError, ValueError):
+            return None
+    return size
+
+
+def _secondary_indexes(cursor, table):
+    cursor.execute(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND sql IS NOT NULL",
+        [table],
+    )
+    return cursor.fetchall()
+
+
+class BulkInsertSink:
+    """
+    Ingest sink that writes chunks with ``executemany``. Created inside the
+    ingest transaction; ``close()`` rebuilds any deferred indexes. The page
+    cache is enlarged for the load and restored by ``close()`` or ``abort()``,
+    since the connection outlives the upload.
+    """
+    def __init__(self, connection, dataset, size=None):
+        self.connection = connection
+        self.dataset = dataset
+        self.table = connection.ops.quote_name(Equipment._meta.db_table)
+        columns = ', '.join(connection.ops.quote_name(column) for column in INSERT_COLUMNS)
+        placeholders = ', '.join(['%s'] * len(INSERT_COLUMNS))
+        self.sql = f"INSERT INTO {self.table} ({columns}) VALUES ({placeholders})"
+        self.uploaded_at = connection.ops.adapt_datetimefield_value(dataset.uploaded_at)
+
+        options = get_options()
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA cache_size")
+            self.cache_size = cursor.fetchone()[0]
+            cursor.execute(f"PRAGMA cache_size = -{int(options['CACHE_SIZE_KB'])}")
+            self.deferred = []
+            threshold = options['DEFER_INDEXES_MIN_BYTES']
+            if threshold is not None and size is not None and size >= threshold:
+                self.deferred = _secondary_indexes(cursor, Equipment._meta.db_table)
+                for name, _ in self.deferred:
+                    cursor.execute(f"DROP INDEX {connection.ops.quote_name(name)}")
+
+    def append(self, chunk):
+        with timed('convert'):
+            type_ids = EquipmentType.objects.intern(chunk['Type'].unique().tolist())
+            count = len(chunk)
+            rows = zip(
+                [self.dataset.id] * count,
+                chunk['Equipment Name'].tolist(),
+                chunk['Type'].map(type_ids).tolist(),
+                chunk['Flowrate'].tolist(),
+                chunk['Pressure'].tolist(),
+                chunk['Temperature'].tolist(),
+                [self.uploaded_at] * count,
+            )
+        with timed('insert'), self.connection.cursor() as cursor:
+            cursor.executemany(self.sql, rows)
+
+    def close(self):
+        with self.connection.cursor() as cursor:
+            for _, sql in self.deferred:
+                cursor.execute(sql)
+        self._restore_cache_size()
+
+    def abort(self):
+        # Dropped indexes came back with the rolled back transaction.
+        self._restore_cache_size()
+
+    def _restore_cache_size(self):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
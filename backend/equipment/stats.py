@@ -0,0 +1,187 @@
+"""
+Mergeable streaming statistics for the numeric reading columns.
+
+A ``Sketch`` keeps the count, mean, sum of squared deviations, min and max of
+a series (combined batch by batch with the parallel form of Welford's
+algorithm) together with a t-digest for approximate quantiles. Both halves
+merge exactly the way they update, so sketches built per chunk, per type or
+per dataset can be combined later without going back to the rows.
+
+The t-digest is compressed with the k1 scale function: points are sorted,
+their cumulative weight is mapped through ``k(q) = d / 2pi * asin(2q - 1)``
+and points falling into the same unit interval of ``k`` become one centroid.
+That keeps centroids small in the tails, where p95 and p99 are read, and is
+done entirely with array operations.
+"""
+import numpy as np
+import pandas as pd
+
+DEFAULT_COMPRESSION = 200
+QUANTILES = {'p50': 0.5, 'p95': 0.95, 'p99': 0.99}
+
+
+class Sketch:
+    def __init__(self, compression=DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if not len(values):
+            return
+        mean = float(values.mean())
+        self._combine(len(values), mean, float(np.square(values - mean).sum()), float(values.min()), float(values.max()))
+        self._compress(np.concatenate([self.means, values]), np.concatenate([self.weights, np.ones(len(values))]))
+
+    def merge(self, other):
+        if not other.count:
+            return
+        self._combine(other.count, other.mean, other.m2, other.min, other.max)
+        self._compress(np.concatenate([self.means, other.means]), np.concatenate([self.weights, other.weights]))
+
+    def _combine(self, count, mean, m2, minimum, maximum):
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+        self.min = minimum if self.min is None else min(self.min, minimum)
+        self.max = maximum if self.max is None else max(self.max, maximum)
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        cumulative = np.cumsum(weights)
+        q_left = (cumulative - weights) / cumulative[-1]
+        k = self.compression / (2 * np.pi) * np.arcsin(2 * q_left - 1)
+        buckets = np.floor(k)
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        self.weights = np.add.reduceat(weights, starts)
+        self.means = np.add.reduceat(means * weights, starts) / self.weights
+
+    @property
+    def std(self):
+        return (self.m2 / (self.count - 1)) ** 0.5 if self.count > 1 else 0.0
+
+    def quantile(self, q):
+        if not self.count:
+            return None
+        centers = np.cumsum(self.weights) - self.weights / 2
+        return float(np.interp(
+            q * self.count,
+            np.r_[0.0, centers, float(self.count)],
+            np.r_[self.min, self.means, self.max],
+        ))
+
+    def describe(self):
+        if not self.count:
+            return None
+        data = {
+            'count': self.count,
+            'mean': self.mean,
+            'std': self.std,
+            'min': self.min,
+            'max': self.max,
+        }
+        for name, q in QUANTILES.items():
+            data[name] = self.quantile(q)
+        return data
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'm2': self.m2,
+            'min': self.min,
+            'max': self.max,
+            'means': self.means.tolist(),
+            'weights': self.weights.astype(np.int64).tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data, compression=DEFAULT_COMPRESSION):
+        sketch = cls(compression)
+        sketch.count = data['count']
+        sketch.mean = data['mean']
+        sketch.m2 = data['m2']
+        sketch.min = data['min']
+        sketch.max = data['max']
+        sketch.means = np.asarray(data['means'], dtype=np.float64)
+        sketch.weights = np.asarray(data['weights'], dtype=np.float64)
+        return sketch
+
+
+class StatsAccumulator:
+    """
+    One sketch per equipment type and numeric field. ``fields`` maps field
+    names to the chunk columns they are read from.
+    """
+    def __init__(self, fields):
+        self.fields = fields
+        self.by_type = {}
+
+    def update(self, chunk):
+        codes, types = pd.factorize(chunk['Type'])
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(types) + 1))
+        sketches = [
+            self.by_type.setdefault(eq_type, {field: Sketch() for field in self.fields})
+            for eq_type in types
+        ]
+        for field, column in self.fields.items():
+            values = chunk[column].to_numpy(dtype=np.float64)[order]
+            for i, type_sketches in enumerate(sketches):
+                type_sketches[field].update(values[bounds[i]:bounds[i + 1]])
+
+    def to_dict(self):
+        return {
+            eq_type: {field: sketch.to_dict() for field, sketch in sketches.items()}
+            for eq_type, sketches in sorted(self.by_type.items())
+        }
+
+
+def load(stats):
+    """
+    Sketches from a persisted ``{type: {field: sketch}}`` mapping.
+    """
+    return {
+        eq_type: {field: Sketch.from_dict(data) for field, data in fields.items()}
+        for eq_type, fields in stats.items()
+    }
+
+
+def merge(stats_list):
+    """
+    Merge several ``{type: {field: Sketch}}`` mappings into one.
+    """
+    merged = {}
+    for stats in stats_list:
+        for eq_type, fields in stats.items():
+            target = merged.setdefault(eq_type, {})
+            for field, sketch in fields.items():
+                target.setdefault(field, Sketch()).merge(sketch)
+    return merged
+
+
+def describe(stats):
+    """
+    Public figures for a ``{type: {field: Sketch}}`` mapping: every type on
+    its own and all types combined under ``overall``.
+    """
+    overall = {}
+    for fields in stats.values():
+        for field, sketch in fields.items():
+            overall.setdefault(field, Sketch()).merge(sketch)
+    return {
+        'overall': {field: sketch.describe() for field, sketch in overall.items()},
+        'by_type': {
+            eq_type: {field: sketch.describe() for field, sketch in fields.items()}
+            for eq_type, fields in stats.items()
+        },
+    }
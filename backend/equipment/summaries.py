@@ -0,0 +1,228 @@
+"""
+Per-dataset summary aggregates.
+
+Summaries are accumulated chunk by chunk while a dataset is ingested and
+persisted as a ``DatasetSummary`` row, together with per-type statistics
+sketches (see ``equipment.stats``). Datasets that predate the summary table
+are summarised from their equipment rows on first access or by the
+``backfill_summaries`` management command.
+"""
+import pandas as pd
+from django.db.models import Count, Sum
+
+from . import stats
+from .columnar import ColumnarDataset
+from .metrics import timed
+from .models import Dataset, DatasetSummary, Equipment, EquipmentType
+from .readings import iter_reading_chunks
+
+NUMERIC_FIELDS = {
+    'flowrate': 'Flowrate',
+    'pressure': 'Pressure',
+    'temperature': 'Temperature',
+}
+CHUNK_COLUMNS = ['Equipment Name', 'Type', *NUMERIC_FIELDS.values()]
+
+
+class SummaryAccumulator:
+    """
+    Running count, sums, type counts and statistics sketches over the chunks
+    of one upload.
+    """
+    def __init__(self):
+        self.total = 0
+        self.sums = {field: 0.0 for field in NUMERIC_FIELDS}
+        self.type_counts = {}
+        self.stats = stats.StatsAccumulator(NUMERIC_FIELDS)
+
+    def update(self, chunk):
+        self.total += len(chunk)
+        for field, column in NUMERIC_FIELDS.items():
+            self.sums[field] += float(chunk[column].sum())
+        for eq_type, count in chunk['Type'].value_counts(sort=False).items():
+            self.type_counts[eq_type] = self.type_counts.get(eq_type, 0) + int(count)
+        self.stats.update(chunk)
+
+    def save(self, dataset):
+        return save_summary(dataset, self.total, self.sums, self.type_counts, self.stats.to_dict())
+
+
+def summary_values(total, sums, type_counts, stats=None):
+    values = {
+        'total_equipment': total,
+        'type_distribution': dict(sorted(type_counts.items())),
+        'stats': stats or {},
+    }
+    for field in NUMERIC_FIELDS:
+        values[f'sum_{field}'] = sums[field]
+        values[f'avg_{field}'] = sums[field] / total if total else None
+    return values
+
+
+def save_summary(dataset, total, sums, type_counts, stats=None):
+    values = summary_values(total, sums, type_counts, stats)
+    summary, _ = DatasetSummary.objects.update_or_create(dataset=dataset, defaults=values)
+    dataset.summary = summary
+    return summary
+
+
+def type_names(type_ids):
+    return dict(EquipmentType.objects.filter(id__in=type_ids).values_list('id', 'name'))
+
+
+def scan_stats(dataset):
+    """
+    Statistics sketches for an already stored dataset, in one pass over its
+    readings.
+    """
+    accumulator = stats.StatsAccumulator(NUMERIC_FIELDS)
+    for chunk in iter_reading_chunks(dataset):
+        accumulator.update(pd.DataFrame(chunk, columns=CHUNK_COLUMNS))
+    return accumulator.to_dict()
+
+
+def build_summary(dataset):
+    """
+    Summarise an already stored dataset from its equipment rows, or from its
+    column files for columnar datasets.
+    """
+    if dataset.storage == Dataset.COLUMNAR:
+        return save_summary(dataset, *ColumnarDataset(dataset.id).summarize(), scan_stats(dataset))
+
+    equipment = dataset.equipment.all()
+    aggs = equipment.aggregate(
+        total=Count('id'),
+        **{field: Sum(field) for field in NUMERIC_FIELDS}
+    )
+    counts = dict(equipment.values_list('type_id').annotate(count=Count('id')).order_by())
+    names = type_names(counts)
+    type_counts = {names[type_id]: count for type_id, count in counts.items()}
+    sums = {field: aggs[field] or 0.0 for field in NUMERIC_FIELDS}
+    return save_summary(dataset, aggs['total'], sums, type_counts, scan_stats(dataset))
+
+
+def build_summaries(datasets):
+    """
+    Summarise several stored datasets at once with grouped aggregation over
+    ``dataset_id``; the number of queries does not depend on how many
+    datasets are passed in. Columnar datasets are reduced from their files.
+    Statistics sketches need a scan of every row and are left to
+    ``backfill_summaries``.
+    """
+    by_id = {}
+    summaries = []
+    for dataset in datasets:
+        if dataset.storage == Dataset.COLUMNAR:
+            summaries.append(build_summary(dataset))
+        else:
+            by_id[dataset.id] = dataset
+    if not by_id:
+        return summaries
+
+    rows = Equipment.objects.filter(dataset_id__in=by_id)
+    totals = {
+        item['dataset_id']: item
+        for item in rows.values('dataset_id').annotate(
+            total=Count('id'),
+            **{field: Sum(field) for field in NUMERIC_FIELDS}
+        )
+    }
+    counts = list(rows.values_list('dataset_id', 'type_id').annotate(count=Count('id')).order_by())
+    names = type_names({type_id for _, type_id, _ in counts})
+    type_counts = {dataset_id: {} for dataset_id in by_id}
+    for dataset_id, type_id, count in counts:
+        type_counts[dataset_id][names[type_id]] = count
+
+    new_summaries = []
+    for dataset_id, dataset in by_id.items():
+        aggs = totals.get(dataset_id, {})
+        sums = {field: aggs.get(field) or 0.0 for field in NUMERIC_FIELDS}
+        values = summary_values(aggs.get('total', 0), sums, type_counts[dataset_id])
+        dataset.summary = DatasetSummary(dataset=dataset, **values)
+        new_summaries.append(dataset.summary)
+    DatasetSummary.objects.bulk_create(new_summaries, ignore_conflicts=True)
+    return summaries + new_summaries
+
+
+def summary_to_data(dataset, summary, with_stats=False):
+    if summary.total_equipment == 0:
+        return None
+    data = {
+        'id': dataset.id,
+        'uploaded_at': dataset.uploaded_at,
+        'total_equipment': summary.total_equipment,
+        'avg_flowrate': summary.avg_flowrate,
+        'avg_pressure': summary.avg_pressure,
+        'avg_temperature': summary.avg_temperature,
+        'type_distribution': summary.type_distribution,
+    }
+    if with_stats:
+        data['stats'] = stats.describe(stats.load(summary.stats)) if summary.stats else None
+    return data
+
+
+def get_summary_data(dataset, with_stats=False):
+    if not dataset:
+        return None
+
+    with timed('summary_query'):
+        try:
+            summary = dataset.summary
+        except DatasetSummary.DoesNotExist:
+            summary = build_summary(dataset)
+        return summary_to_data(dataset, summary, with_stats)
+
+
+def get_history_data(datasets):
+    """
+    Summary data for a page of datasets fetched with
+    ``select_related('summary')``. Missing summaries are built in one batch
+    rather than per dataset.
+    """
+    with timed('history_query'):
+        datasets = list(datasets)
+        missing = [dataset for dataset in datasets if not hasattr(dataset, 'summary')]
+        build_summaries(missing)
+
+        history = []
+        for dataset in datasets:
+            data = summary_to_data(dataset, dataset.summary)
+            if data:
+                history.append(data)
+        return history
+
+
+def get_rollup_data(datasets):
+    """
+    Combined statistics for a page of datasets, merged from their stored
+    sketches rather than from the equipment rows. Datasets whose summary has
+    no sketches yet are counted but left out of ``stats``.
+    """
+    with timed('history_rollup'):
+        datasets = list(datasets)
+        missing = [dataset for dataset in datasets if not hasattr(dataset, 'summary')]
+        build_summaries(missing)
+
+        total = 0
+        type_counts = {}
+        sketches = []
+        without_stats = 0
+        for dataset in datasets:
+            summary = dataset.summary
+            total += summary.total_equipment
+            for eq_type, count in summary.type_distribution.items():
+                type_counts[eq_type] = type_counts.get(eq_type, 0) + count
+            if summary.stats:
+                sketches.append(stats.load(summary.stats))
+            elif summary.total_equipment:
+                without_stats += 1
+
+        return {
+            'datasets': len(datasets),
+            'datasets_without_stats': without_stats,
+            'first_uploaded_at': min((dataset.uploaded_at for dataset in datasets), default=None),
+            'last_uploaded_at': max((dataset.uploaded_at for dataset in datasets), default=None),
+            'total_equipment': total,
+            'type_distribution': dict(sorted(type_counts.items())),
+            'stats': stats.describe(stats.merge(sketches)) if sketches else None,
+        }
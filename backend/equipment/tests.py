@@ -0,0 +1,912 @@
+import base64
+import gzip
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+from unittest import mock, skipUnless
+
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncRequestFactory, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import anomalies, async_views, columnar, downsample, jobs, models, reports, retention, stats, uploads, views
+from .caching import bump_data_version
+from .compare import compare_datasets
+from .export import ExportError, export_stream
+from .ingest import IngestError, ingest_csv, process_upload
+from .summaries import get_rollup_data
+from .views import ReadingsAPI
+from .models import Anomaly, Dataset, Equipment, Event, IngestJob
+
+CSV_HEADER = 'Equipment Name,Type,Flowrate,Pressure,Temperature\n'
+
+HAS_PYARROW = importlib.util.find_spec('pyarrow') is not None
+HAS_ZSTANDARD = importlib.util.find_spec('zstandard') is not None
+
+
+def ingest_rows(count, name='Pump'):
+    rows = ''.join(f'{name}-{i},{name},1,2,3\n' for i in range(count))
+    return ingest_csv(io.BytesIO((CSV_HEADER + rows).encode())).dataset
+
+
+def basic_auth(username, password):
+    token = base64.b64encode(f'{username}:{password}'.encode()).decode()
+    return {'Authorization': f'Basic {token}'}
+
+
+class AsyncViewAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user('operator', password='correct-password')
+
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+
+    async def test_bad_credentials_are_rejected(self):
+        views = [
+            (async_views.summary, '/api/summary/', {}),
+            (async_views.history, '/api/history/', {}),
+            (async_views.report_pdf, '/api/report_pdf/', {}),
+            (async_views.readings, '/api/datasets/1/readings/', {'dataset_id': 1}),
+        ]
+        for view, path, kwargs in views:
+            with self.subTest(path=path):
+                request = self.factory.get(path, headers=basic_auth('operator', 'wrong-password'))
+                response = await view(request, **kwargs)
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(response['WWW-Authenticate'], 'Basic realm="api"')
+
+    async def test_valid_credentials_are_accepted(self):
+        request = self.factory.get('/api/summary/', headers=basic_auth('operator', 'correct-password'))
+        response = await async_views.summary(request)
+        self.assertEqual(response.status_code, 200)
+
+
+class EventStreamAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user('operator', password='correct-password')
+
+    def get(self, **headers):
+        request = RequestFactory().get('/api/events/', headers=headers)
+        return views.event_stream(request)
+
+    def test_bad_credentials_are_rejected(self):
+        response = self.get(**basic_auth('operator', 'wrong-password'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Basic realm="api"')
+
+    def test_default_permissions_apply(self):
+        response = self.get()
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        response.close()
+
+        rest_framework = {**settings.REST_FRAMEWORK, 'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated']}
+        with override_settings(REST_FRAMEWORK=rest_framework):
+            self.assertEqual(self.get().status_code, 401)
+            response = self.get(**basic_auth('operator', 'correct-password'))
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            response.close()
+
+
+class UploadEncodingTests(TestCase):
+    def upload(self, content):
+        return self.client.post('/api/upload/', {'file': SimpleUploadedFile('equipment.csv', content)})
+
+    def test_latin1_header_is_rejected(self):
+        content = 'Équipement,Type,Flowrate,Pressure,Temperature\nPump-1,Pump,1,2,3\n'.encode('latin-1')
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('UTF-8', response.json()['error'])
+
+    def test_header_only_upload_is_rejected(self):
+        response = self.upload(CSV_HEADER.encode())
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('no data rows', response.json()['error'])
+        self.assertFalse(Dataset.objects.exists())
+        self.assertFalse(Event.objects.exists())
+
+    def test_latin1_rows_are_rejected(self):
+        rows = ''.join(f'Pump-{i},Pump,1,2,3\n' for i in range(100000))
+        content = (CSV_HEADER + rows + 'Vanne-à-boisseau,Valve,1,2,3\n').encode('latin-1')
+        response = self.upload(content)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('error', response.json())
+
+
+class CommittedTestCase(TransactionTestCase):
+    """
+    For tests whose GET requests read through the replica alias, which only
+    sees committed rows. Tables are flushed between tests, so the in-process
+    cache of equipment type ids is cleared with them.
+    """
+    databases = {'default', 'replica'}
+
+    def _fixture_teardown(self):
+        super()._fixture_teardown()
+        models._type_ids.clear()
+
+
+class HistoryPaginationTests(CommittedTestCase):
+
+    def test_datasets_sharing_a_timestamp_span_pages(self):
+        for i in range(5):
+            ingest_csv(io.BytesIO(f'{CSV_HEADER}Pump-{i},Pump,1,2,3\n'.encode()))
+        Dataset.objects.update(uploaded_at=timezone.now())
+        bump_data_version()
+
+        seen = []
+        url = '/api/history/?limit=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item['id'] for item in response.json())
+            link = response.get('Link')
+            url = link[1:link.index('>')] if link else None
+        self.assertEqual(seen, sorted(Dataset.objects.values_list('id', flat=True), reverse=True))
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class ChunkedUploadTests(TestCase):
+    def setUp(self):
+        staging_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(EQUIPMENT_STAGING_DIR=staging_dir))
+        self.submit = self.enterContext(mock.patch('equipment.background.submit'))
+
+    def start(self, **data):
+        response = self.client.post('/api/uploads/', data)
+        self.assertEqual(response.status_code, 201)
+        return response.json()['upload_id']
+
+    def put_part(self, upload_id, number, data, checksum=None, **extra):
+        return self.client.put(f'/api/uploads/{upload_id}/parts/{number}/', data,
+                               content_type='application/octet-stream',
+                               headers={'X-Content-SHA256': checksum or sha256(data)}, **extra)
+
+    def complete(self, upload_id, parts):
+        return self.client.post(f'/api/uploads/{upload_id}/complete/', {'parts': parts})
+
+    def test_parts_are_ingested_after_completion(self):
+        content = (CSV_HEADER + ''.join(f'Pump-{i},Pump,1,2,3\n' for i in range(10))).encode()
+        upload_id = self.start(sha256=sha256(content))
+        for number, offset in enumerate(range(0, len(content), 100), start=1):
+            self.assertEqual(self.put_part(upload_id, number, content[offset:offset + 100]).status_code, 201)
+        self.submit.assert_not_called()
+
+        response = self.complete(upload_id, number)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['sha256'], sha256(content))
+        self.submit.assert_called_once_with(jobs.run_job, uuid.UUID(upload_id))
+
+        jobs.run_job(upload_id)
+        job = IngestJob.objects.get(id=upload_id)
+        self.assertEqual(job.status, IngestJob.SUCCEEDED)
+        self.assertEqual(job.rows_processed, 10)
+        self.assertEqual(job.dataset.content_sha256, sha256(content))
+        self.assertFalse(uploads.upload_dir(upload_id).exists())
+
+    def test_resent_part_is_idempotent_and_conflicts_are_rejected(self):
+        upload_id = self.start()
+        self.assertEqual(self.put_part(upload_id, 1, b'abc').status_code, 201)
+        self.assertEqual(self.put_part(upload_id, 1, b'abc').status_code, 200)
+        self.assertEqual(self.put_part(upload_id, 1, b'xyz').status_code, 409)
+        self.assertEqual(self.put_part(upload_id, 2, b'xyz', checksum=sha256(b'abc')).status_code, 400)
+        self.assertEqual(list(uploads.received_parts(upload_id)), [1])
+
+    def test_part_without_content_length_is_rejected(self):
+        upload_id = self.start()
+        self.assertEqual(self.put_part(upload_id, 1, b'abc', CONTENT_LENGTH='').status_code, 411)
+        self.assertEqual(self.put_part(upload_id, 1, b'abc', CONTENT_LENGTH='-1').status_code, 400)
+        self.assertEqual(self.put_part(upload_id, 1, b'abc', CONTENT_LENGTH='three').status_code, 400)
+        self.assertEqual(uploads.received_parts(upload_id), {})
+
+    def test_completion_requires_every_part(self):
+        upload_id = self.start()
+        self.put_part(upload_id, 1, b'abc')
+        self.put_part(upload_id, 3, b'ghi')
+        response = self.complete(upload_id, 3)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Missing parts: [2]', response.json()['error'])
+        self.assertEqual(uploads.upload_state(upload_id), 'open')
+        self.submit.assert_not_called()
+
+    def test_repeated_completion_queues_one_ingest(self):
+        upload_id = self.start()
+        self.put_part(upload_id, 1, b'abc')
+        first = self.complete(upload_id, 1)
+        second = self.complete(upload_id, 1)
+        self.assertEqual(second.status_code, 202)
+        self.assertEqual(second.json()['sha256'], first.json()['sha256'])
+        self.assertEqual(self.complete(upload_id, 2).status_code, 400)
+        self.assertEqual(self.client.delete(f'/api/uploads/{upload_id}/').status_code, 409)
+        self.submit.assert_called_once()
+
+    def test_digest_mismatch_fails_the_job(self):
+        upload_id = self.start(sha256=sha256(b'something else'))
+        self.put_part(upload_id, 1, b'abc')
+        response = self.complete(upload_id, 1)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('declared SHA-256', response.json()['error'])
+        job = IngestJob.objects.get(id=upload_id)
+        self.assertEqual(job.status, IngestJob.FAILED)
+        self.assertFalse(uploads.upload_dir(upload_id).exists())
+        self.submit.assert_not_called()
+
+    def test_stalled_uploads_are_discarded(self):
+        stalled_id = self.start()
+        self.put_part(stalled_id, 1, b'abc')
+        active_id = self.start()
+        stale = time.time() - 2 * 60 * 60
+        for path in Path(uploads.upload_dir(stalled_id)).iterdir():
+            os.utime(path, (stale, stale))
+
+        with override_settings(EQUIPMENT_UPLOAD_STALL_TIMEOUT=60 * 60):
+            self.start()
+        job = IngestJob.objects.get(id=stalled_id)
+        self.assertEqual(job.status, IngestJob.FAILED)
+        self.assertIn('stalled', job.error)
+        self.assertFalse(uploads.upload_dir(stalled_id).exists())
+        self.assertEqual(IngestJob.objects.get(id=active_id).status, IngestJob.QUEUED)
+
+
+class ReportTests(TestCase):
+    def setUp(self):
+        report_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(EQUIPMENT_REPORT_DIR=report_dir, EQUIPMENT_REPORT_MAX_ROWS=100))
+        self.dataset = ingest_rows(200)
+
+    def page_count(self, path):
+        return len(re.findall(rb'/Type /Page\b', Path(path).read_bytes()))
+
+    def test_full_report_spans_pages_up_to_the_row_cap(self):
+        path = reports.get_report(self.dataset, reports.FULL)
+        # The summary page, then 100 of the 200 readings at 57 rows a page.
+        self.assertEqual(self.page_count(path), 3)
+        self.assertEqual(self.page_count(reports.get_report(self.dataset, reports.SUMMARY)), 1)
+
+    def test_rendered_report_is_reused(self):
+        path = reports.get_report(self.dataset, reports.FULL)
+        with mock.patch('equipment.reports.render_report') as render:
+            self.assertEqual(reports.get_report(self.dataset, reports.FULL), path)
+        render.assert_not_called()
+
+        reports.delete_reports(self.dataset.id)
+        self.assertFalse(path.exists())
+        self.assertEqual(reports.get_report(self.dataset, reports.FULL), path)
+        self.assertTrue(path.exists())
+
+
+class RetentionTests(TestCase):
+    def setUp(self):
+        # Oldest first, each with one more row than the last.
+        now = timezone.now()
+        self.ids = []
+        for i in range(5):
+            dataset = ingest_rows(i + 1, name=f'Pump{i}')
+            Dataset.objects.filter(id=dataset.id).update(uploaded_at=now - timedelta(days=5 - i))
+            self.ids.append(dataset.id)
+
+    def expired(self, keep=(), **policy):
+        policy = {'KEEP_LAST': None, 'MAX_AGE': None, 'MAX_TOTAL_ROWS': None, **policy}
+        return retention.select_expired(retention.get_policy(**policy), keep)
+
+    def test_keep_last(self):
+        self.assertEqual(self.expired(KEEP_LAST=2), self.ids[:3])
+
+    def test_max_age(self):
+        self.assertEqual(self.expired(MAX_AGE=timedelta(days=2, hours=12)), self.ids[:3])
+
+    def test_max_total_rows(self):
+        # The newest datasets hold 5 + 4 rows; the next one would exceed 10.
+        self.assertEqual(self.expired(MAX_TOTAL_ROWS=10), self.ids[:3])
+
+    def test_newest_and_kept_datasets_are_never_expired(self):
+        self.assertEqual(self.expired(MAX_TOTAL_ROWS=1), self.ids[:4])
+        self.assertEqual(self.expired(MAX_AGE=timedelta(0)), self.ids[:4])
+        self.assertEqual(self.expired(keep=[self.ids[0]], KEEP_LAST=1), self.ids[1:4])
+
+    def test_upload_never_prunes_its_own_dataset(self):
+        Dataset.objects.filter(id=self.ids[-1]).update(uploaded_at=timezone.now() + timedelta(days=1))
+        with override_settings(EQUIPMENT_RETENTION={'KEEP_LAST': 1}):
+            response = self.client.post('/api/upload/', {
+                'file': SimpleUploadedFile('equipment.csv', f'{CSV_HEADER}Valve-1,Valve,1,2,3\n'.encode()),
+            })
+        self.assertEqual(response.status_code, 201)
+        dataset_id = response.json()['dataset_id']
+        self.assertEqual(response.json()['pruned']['datasets'], self.ids[:4])
+        self.assertEqual(set(Dataset.objects.values_list('id', flat=True)), {self.ids[-1], dataset_id})
+
+    def test_delete_datasets_in_batches(self):
+        result = retention.delete_datasets(self.ids[:4], batch_size=3)
+        self.assertEqual(result.dataset_ids, self.ids[:4])
+        self.assertEqual(result.rows, 1 + 2 + 3 + 4)
+        self.assertEqual(list(Dataset.objects.values_list('id', flat=True)), [self.ids[-1]])
+        self.assertEqual(Equipment.objects.count(), 5)
+        pruned = [event.payload['dataset_ids'] for event in Event.objects.filter(kind=Event.DATASET_PRUNED)]
+        self.assertEqual(pruned, [self.ids[:3], self.ids[3:4]])
+
+    def test_prune_datasets_command(self):
+        out = io.StringIO()
+        call_command('prune_datasets', '--keep-last', '2', '--dry-run', stdout=out)
+        self.assertIn(str(self.ids[:3]), out.getvalue())
+        self.assertEqual(Dataset.objects.count(), 5)
+
+        call_command('prune_datasets', '--keep-last', '2', '--batch-size', '2', stdout=out)
+        self.assertIn('Deleted 3 datasets, reclaimed 6 rows.', out.getvalue())
+        self.assertEqual(list(Dataset.objects.values_list('id', flat=True)), self.ids[:2:-1])
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'equipment': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'equipment-tests'},
+})
+class ResponseCacheTests(CommittedTestCase):
+    def setUp(self):
+        User.objects.create_user('operator', password='correct-password')
+        ingest_rows(3)
+        bump_data_version()
+
+    def upload(self, count):
+        rows = ''.join(f'Valve-{i},Valve,4,5,6\n' for i in range(count))
+        response = self.client.post('/api/upload/', {
+            'file': SimpleUploadedFile('equipment.csv', (CSV_HEADER + rows).encode()),
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.json()['dataset_id']
+
+    def test_responses_are_cached_until_an_upload(self):
+        first = self.client.get('/api/summary/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        self.assertEqual(first.json()['total_equipment'], 3)
+        again = self.client.get('/api/summary/')
+        self.assertEqual(again['X-Cache'], 'HIT')
+        self.assertEqual(again['ETag'], first['ETag'])
+        self.assertEqual(again.json(), first.json())
+
+        not_modified = self.client.get('/api/summary/', headers={'If-None-Match': first['ETag']})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified['ETag'], first['ETag'])
+
+        dataset_id = self.upload(7)
+        fresh = self.client.get('/api/summary/', headers={'If-None-Match': first['ETag']})
+        self.assertEqual(fresh.status_code, 200)
+        self.assertEqual(fresh['X-Cache'], 'MISS')
+        self.assertNotEqual(fresh['ETag'], first['ETag'])
+        self.assertEqual(fresh.json()['id'], dataset_id)
+        self.assertEqual(fresh.json()['total_equipment'], 7)
+
+    def test_pruning_invalidates_cached_history(self):
+        dataset_id = self.upload(2)
+        before = self.client.get('/api/history/')
+        self.assertEqual(len(before.json()), 2)
+
+        retention.delete_datasets([dataset_id])
+        after = self.client.get('/api/history/', headers={'If-None-Match': before['ETag']})
+        self.assertEqual(after.status_code, 200)
+        self.assertNotEqual(after['ETag'], before['ETag'])
+        self.assertEqual([item['id'] for item in after.json()], [item['id'] for item in before.json()][1:])
+
+    async def test_async_views_share_the_cache(self):
+        cached = await self.async_client.get('/api/summary/')
+        request = AsyncRequestFactory().get('/api/summary/', headers={
+            'If-None-Match': cached['ETag'], **basic_auth('operator', 'correct-password'),
+        })
+        response = await async_views.summary(request)
+        self.assertEqual(response.status_code, 304)
+
+        request = AsyncRequestFactory().get('/api/summary/', headers=basic_auth('operator', 'correct-password'))
+        response = await async_views.summary(request)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response['ETag'], cached['ETag'])
+        self.assertEqual(json.loads(response.content), cached.json())
+
+
+class DeduplicationTests(TestCase):
+    content = (CSV_HEADER + 'Pump-1,Pump,1,2,3\nValve-1,Valve,4,5,6\n').encode()
+
+    def upload(self):
+        return self.client.post('/api/upload/', {'file': SimpleUploadedFile('equipment.csv', self.content)})
+
+    def test_repeated_multipart_upload_returns_the_stored_dataset(self):
+        first = self.upload()
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(Dataset.objects.get().content_sha256, sha256(self.content))
+
+        second = self.upload()
+        self.assertEqual(second.status_code, 200)
+        self.assertTrue(second.json()['dedup'])
+        self.assertEqual(second.json()['dataset_id'], first.json()['dataset_id'])
+        self.assertEqual(Dataset.objects.count(), 1)
+
+    def test_chunked_upload_of_stored_content_is_not_started(self):
+        dataset_id = self.upload().json()['dataset_id']
+        response = self.client.post('/api/uploads/', {'sha256': sha256(self.content)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['dataset_id'], dataset_id)
+        self.assertFalse(IngestJob.objects.exists())
+
+    def test_completed_chunked_upload_of_stored_content_resolves_to_it(self):
+        dataset_id = self.upload().json()['dataset_id']
+        self.enterContext(override_settings(EQUIPMENT_STAGING_DIR=self.enterContext(tempfile.TemporaryDirectory())))
+        self.enterContext(mock.patch('equipment.background.submit'))
+        upload_id = self.client.post('/api/uploads/').json()['upload_id']
+        self.client.put(f'/api/uploads/{upload_id}/parts/1/', self.content, content_type='application/octet-stream',
+                        headers={'X-Content-SHA256': sha256(self.content)})
+        self.client.post(f'/api/uploads/{upload_id}/complete/', {'parts': 1})
+
+        jobs.run_job(upload_id)
+        job = IngestJob.objects.get(id=upload_id)
+        self.assertEqual(job.status, IngestJob.SUCCEEDED)
+        self.assertEqual(job.dataset_id, dataset_id)
+        self.assertEqual(Dataset.objects.count(), 1)
+
+    def test_ingest_rolls_back_when_the_content_was_stored_meanwhile(self):
+        existing = ingest_rows(1)
+        Dataset.objects.filter(id=existing.id).update(content_sha256=sha256(self.content))
+        events = Event.objects.count()
+
+        result = ingest_csv(io.BytesIO(self.content), sha256=sha256(self.content))
+        self.assertTrue(result.dedup)
+        self.assertEqual(result.dataset.id, existing.id)
+        self.assertEqual(result.rows, 1)
+        self.assertEqual(Dataset.objects.count(), 1)
+        self.assertEqual(Equipment.objects.count(), 1)
+        self.assertEqual(Event.objects.count(), events)
+
+    def test_duplicate_without_a_summary(self):
+        existing = Dataset.objects.create(uploaded_at=timezone.now(), content_sha256=sha256(self.content))
+        result = process_upload(io.BytesIO(self.content), sha256=sha256(self.content))
+        self.assertTrue(result.dedup)
+        self.assertEqual(result.dataset.id, existing.id)
+        self.assertEqual(result.rows, 0)
+
+
+class ColumnarStorageTests(TestCase):
+    def setUp(self):
+        self.columnar_dir = Path(self.enterContext(tempfile.TemporaryDirectory()))
+        self.enterContext(override_settings(EQUIPMENT_STORAGE='columnar', EQUIPMENT_COLUMNAR_DIR=self.columnar_dir))
+
+    def test_columns_are_written_for_a_stored_dataset(self):
+        dataset = ingest_rows(3)
+        self.assertEqual(dataset.storage, Dataset.COLUMNAR)
+        self.assertEqual(len(columnar.ColumnarDataset(dataset.id)), 3)
+        self.assertEqual([path.name for path in self.columnar_dir.iterdir()], [str(dataset.id)])
+
+    def test_failed_ingest_leaves_no_column_files(self):
+        with mock.patch('equipment.events.dataset_created', side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                ingest_rows(3)
+        self.assertFalse(Dataset.objects.exists())
+        self.assertEqual(list(self.columnar_dir.iterdir()), [])
+
+
+class SketchTests(SimpleTestCase):
+    def setUp(self):
+        self.values = np.random.default_rng(7).lognormal(3, 0.6, 100000)
+
+    def merged_sketch(self):
+        # Sketches of batches, merged per part and again after a round trip.
+        merged = stats.Sketch()
+        for part in np.array_split(self.values, 10):
+            sketch = stats.Sketch()
+            for batch in np.array_split(part, 7):
+                sketch.update(batch)
+            merged.merge(stats.Sketch.from_dict(sketch.to_dict()))
+        return merged
+
+    def test_merged_moments_are_exact(self):
+        sketch = self.merged_sketch()
+        self.assertEqual(sketch.count, len(self.values))
+        self.assertAlmostEqual(sketch.mean, self.values.mean(), places=9)
+        self.assertAlmostEqual(sketch.std, self.values.std(ddof=1), places=9)
+        self.assertEqual(sketch.min, self.values.min())
+        self.assertEqual(sketch.max, self.values.max())
+
+    def test_merged_quantiles_are_close_in_rank(self):
+        sketch = self.merged_sketch()
+        self.assertLessEqual(len(sketch.means), stats.DEFAULT_COMPRESSION)
+        for q in stats.QUANTILES.values():
+            with self.subTest(q=q):
+                rank = (self.values < sketch.quantile(q)).mean()
+                self.assertAlmostEqual(rank, q, delta=0.002)
+
+    def test_accumulator_keeps_one_sketch_per_type(self):
+        chunk = pd.DataFrame({
+            'Type': ['Pump', 'Valve', 'Pump', 'Valve', 'Pump'],
+            'Pressure': [1.0, 10.0, 3.0, 20.0, 5.0],
+        })
+        accumulator = stats.StatsAccumulator({'pressure': 'Pressure'})
+        accumulator.update(chunk.iloc[:2])
+        accumulator.update(chunk.iloc[2:])
+        described = stats.describe(stats.load(accumulator.to_dict()))
+        self.assertEqual(described['by_type']['Pump']['pressure']['mean'], 3.0)
+        self.assertEqual(described['by_type']['Valve']['pressure']['max'], 20.0)
+        self.assertEqual(described['overall']['pressure']['count'], 5)
+        self.assertEqual(described['overall']['pressure']['p50'], 5.0)
+
+
+class RollupTests(TestCase):
+    def test_rollup_merges_the_stored_sketches(self):
+        first = ingest_csv(io.BytesIO(f'{CSV_HEADER}P-1,Pump,1,2,3\nV-1,Valve,1,4,3\n'.encode())).dataset
+        second = ingest_csv(io.BytesIO(f'{CSV_HEADER}P-2,Pump,1,6,3\n'.encode())).dataset
+        rollup = get_rollup_data(Dataset.objects.select_related('summary').filter(id__in=[first.id, second.id]))
+        self.assertEqual(rollup['total_equipment'], 3)
+        self.assertEqual(rollup['type_distribution'], {'Pump': 2, 'Valve': 1})
+        pressure = rollup['stats']['overall']['pressure']
+        self.assertEqual((pressure['count'], pressure['min'], pressure['max']), (3, 2.0, 6.0))
+        self.assertAlmostEqual(pressure['mean'], 4.0)
+        self.assertEqual(rollup['stats']['by_type']['Pump']['pressure']['count'], 2)
+
+
+class CompareTests(TestCase):
+    def ingest(self, rows):
+        return ingest_csv(io.BytesIO((CSV_HEADER + ''.join(f'{row}\n' for row in rows)).encode())).dataset
+
+    def test_counts_changes_and_drift(self):
+        a = self.ingest(['P-1,Pump,10,1,1', 'P-2,Pump,20,1,1', 'V-1,Valve,5,1,1', 'X-1,Pump,1,1,1'])
+        b = self.ingest(['P-1,Pump,12,1,1', 'P-2,Pump,20,1,1', 'V-1,Pump,5,1,1', 'N-1,Valve,9,1,1', 'N-1,Valve,3,1,1'])
+        result = compare_datasets(a, b)
+
+        self.assertEqual(result['counts'], {'common': 3, 'changed': 2, 'type_changed': 1, 'added': 1, 'removed': 1})
+        self.assertEqual((result['b']['total_equipment'], result['b']['duplicate_names']), (5, 1))
+        self.assertEqual([row['name'] for row in result['changes']], ['P-1', 'V-1'])
+        self.assertEqual(result['changes'][0]['flowrate_delta'], 2.0)
+        self.assertEqual(result['added'], [{'name': 'N-1', 'type': 'Valve', 'flowrate': 3.0, 'pressure': 1.0, 'temperature': 1.0}])
+        self.assertEqual([row['name'] for row in result['removed']], ['X-1'])
+
+        pump = result['types']['Pump']
+        self.assertEqual((pump['count_a'], pump['count_b'], pump['added'], pump['removed']), (3, 3, 0, 1))
+        self.assertAlmostEqual(pump['drift']['flowrate']['mean_delta'], 2 / 3)
+        self.assertEqual(pump['drift']['flowrate']['max_abs_delta'], 2.0)
+        valve = result['types']['Valve']
+        self.assertEqual((valve['count_a'], valve['count_b'], valve['added'], valve['removed']), (1, 1, 1, 0))
+        self.assertIsNone(valve['drift'])
+
+    def test_unchanged_rows_on_request_and_paging(self):
+        a = self.ingest(['P-1,Pump,1,1,1', 'P-2,Pump,2,1,1', 'P-3,Pump,3,1,1'])
+        b = self.ingest(['P-1,Pump,1,1,1', 'P-2,Pump,2,1,1', 'P-3,Pump,3,1,1'])
+        self.assertEqual(compare_datasets(a, b)['changes'], [])
+        page = compare_datasets(a, b, limit=2, offset=1, order='name', changed_only=False)['changes']
+        self.assertEqual([row['name'] for row in page], ['P-2', 'P-3'])
+
+
+class AnomalyScanTests(TestCase):
+    rules = [
+        anomalies.Rule('flow-z', 'flowrate', z=4.0),
+        anomalies.Rule('valve-pressure', 'pressure', type='Valve', max=50.0),
+        anomalies.Rule('temperature-floor', 'temperature', min=0.0),
+    ]
+
+    def setUp(self):
+        # Two chunks and a bit, with outliers on both sides of each boundary.
+        count = 2 * anomalies.BATCH_SIZE + 100
+        rng = np.random.default_rng(3)
+        self.frame = pd.DataFrame({
+            'Equipment Name': [f'Unit-{i}' for i in range(count)],
+            'Type': np.where(np.arange(count) % 3 == 0, 'Valve', 'Pump'),
+            'Flowrate': rng.normal(100, 5, count).round(3),
+            'Pressure': rng.normal(20, 2, count).round(3),
+            'Temperature': rng.normal(300, 10, count).round(3),
+        })
+        boundary = anomalies.BATCH_SIZE
+        self.frame.loc[[boundary - 1, boundary, 2 * boundary], 'Flowrate'] = 1000.0
+        self.frame.loc[[boundary - 2, boundary + 1, boundary + 2], 'Pressure'] = 80.0
+        self.frame.loc[[3, 2 * boundary + 1], 'Temperature'] = -5.0
+
+    def expected(self):
+        frame = self.frame
+        flow = frame.groupby('Type')['Flowrate']
+        z = (frame['Flowrate'] - flow.transform('mean')) / flow.transform('std')
+        flagged = {(row, 'flow-z', Anomaly.ZSCORE) for row in np.flatnonzero(z.abs() > 4.0)}
+        valve_high = (frame['Type'] == 'Valve') & (frame['Pressure'] > 50.0)
+        flagged |= {(row, 'valve-pressure', Anomaly.MAX) for row in np.flatnonzero(valve_high)}
+        flagged |= {(row, 'temperature-floor', Anomaly.MIN) for row in np.flatnonzero(frame['Temperature'] < 0.0)}
+        return {(int(row), rule, kind) for row, rule, kind in flagged}
+
+    def scan(self):
+        dataset = ingest_csv(io.BytesIO(self.frame.to_csv(index=False).encode())).dataset
+        found = anomalies.scan_dataset(dataset, self.rules)
+        stored = Anomaly.objects.filter(dataset=dataset)
+        self.assertEqual(found, stored.count())
+        for anomaly in stored:
+            self.assertEqual(anomaly.name, f'Unit-{anomaly.row}')
+        return set(stored.values_list('row', 'rule', 'kind'))
+
+    def test_rules_across_chunk_boundaries(self):
+        expected = self.expected()
+        boundary = anomalies.BATCH_SIZE
+        self.assertTrue({(boundary - 1, 'flow-z', Anomaly.ZSCORE), (boundary, 'flow-z', Anomaly.ZSCORE)} <= expected)
+        self.assertEqual(self.scan(), expected)
+
+    def test_rules_on_columnar_storage(self):
+        columnar_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(override_settings(EQUIPMENT_STORAGE='columnar', EQUIPMENT_COLUMNAR_DIR=columnar_dir))
+        self.assertEqual(self.scan(), self.expected())
+
+
+class DownsampleTests(SimpleTestCase):
+    def setUp(self):
+        self.values = np.sin(np.arange(1000) / 25.0)
+        self.values[437] = 5.0
+
+    def test_bucket_stats(self):
+        starts, bucket = downsample.bucket_stats(self.values, 10)
+        self.assertEqual(starts.tolist(), list(range(0, 1000, 100)))
+        for i, start in enumerate(starts):
+            part = self.values[start:start + 100]
+            self.assertEqual(bucket['min'][i], part.min())
+            self.assertEqual(bucket['max'][i], part.max())
+            self.assertAlmostEqual(bucket['mean'][i], part.mean())
+        self.assertEqual(bucket['max'].max(), 5.0)
+
+    def test_short_series_is_returned_whole(self):
+        starts, bucket = downsample.bucket_stats(self.values[:7], 10)
+        self.assertEqual(starts.tolist(), list(range(7)))
+        self.assertIs(bucket['mean'], bucket['min'])
+        self.assertEqual(downsample.lttb(self.values[:7], 10).tolist(), list(range(7)))
+
+    def test_lttb_point_count(self):
+        index = downsample.lttb(self.values, 100)
+        self.assertEqual(len(index), 100)
+        self.assertEqual((index[0], index[-1]), (0, 999))
+        self.assertTrue((np.diff(index) > 0).all())
+        self.assertIn(437, index)
+
+
+class ReadingsTests(TestCase):
+    def setUp(self):
+        rows = ''.join(f'Unit-{i},{"Valve" if i % 4 == 0 else "Pump"},{i},{i % 7},1\n' for i in range(1000))
+        self.dataset = ingest_csv(io.BytesIO((CSV_HEADER + rows).encode())).dataset
+
+    def test_point_counts_per_method(self):
+        for method, names in [('minmax', {'x', 'min', 'max', 'mean'}), ('mean', {'x', 'mean'}), ('lttb', {'x', 'y'})]:
+            with self.subTest(method=method):
+                meta, series = ReadingsAPI.downsample_series(self.dataset, 50, ['flowrate', 'pressure'], method, None)
+                self.assertEqual(meta['rows'], 1000)
+                for arrays in series.values():
+                    self.assertEqual(set(arrays), names)
+                    self.assertTrue(all(len(array) == 50 for array in arrays.values()))
+        self.assertEqual(series['flowrate']['y'][[0, -1]].tolist(), [0.0, 999.0])
+
+    def test_type_filter_and_binary_layout(self):
+        meta, series = ReadingsAPI.downsample_series(self.dataset, 500, ['flowrate'], 'minmax', 'Valve')
+        self.assertEqual(meta['rows'], 250)
+        self.assertEqual(series['flowrate']['mean'].tolist(), [float(i) for i in range(0, 1000, 4)])
+
+        response = ReadingsAPI.binary_response(meta, series)
+        self.assertEqual(response['X-Readings-Layout'],
+                         'flowrate.x:<u4:250;flowrate.min:<f4:250;flowrate.max:<f4:250;flowrate.mean:<f4:250')
+        self.assertEqual(len(response.content), 4 * 4 * 250)
+        self.assertEqual(np.frombuffer(response.content, '<f4', 250, 3 * 4 * 250)[1], 4.0)
+
+
+EXPORT_ROWS = [
+    ('Pump "A", north', 'Pump', 1.5, 2.25, 300.0),
+    ('Valve-1', 'Valve', 0.0, -1.0, 1e-9),
+    ('Ünit-7', 'Heat Exchanger', 123456.789, 0.5, 25.125),
+    ('Pump-2', 'Pump', 3.0, 4.0, 5.0),
+]
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        frame = pd.DataFrame(EXPORT_ROWS, columns=['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature'])
+        self.dataset = ingest_csv(io.BytesIO(frame.to_csv(index=False).encode())).dataset
+
+    def export(self, fmt):
+        # A chunk size below the row count spreads the rows over several chunks.
+        return b''.join(export_stream(self.dataset, fmt, 3))
+
+    def test_csv_round_trip(self):
+        exported = self.export('csv')
+        frame = pd.read_csv(io.BytesIO(exported))
+        self.assertEqual(list(frame.itertuples(index=False, name=None)), EXPORT_ROWS)
+
+        # The export is a valid upload that stores the same readings.
+        self.dataset = ingest_csv(io.BytesIO(exported)).dataset
+        self.assertEqual(self.export('csv'), exported)
+
+    def test_ndjson_round_trip(self):
+        lines = self.export('ndjson').decode().splitlines()
+        records = [json.loads(line) for line in lines]
+        self.assertEqual([tuple(record.values()) for record in records], EXPORT_ROWS)
+        self.assertEqual(list(records[0]), ['name', 'type', 'flowrate', 'pressure', 'temperature'])
+
+    @skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_parquet_round_trip(self):
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(io.BytesIO(self.export('parquet')))
+        self.assertEqual(table.column_names, ['name', 'type', 'flowrate', 'pressure', 'temperature'])
+        self.assertEqual([tuple(row.values()) for row in table.to_pylist()], EXPORT_ROWS)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ExportError):
+            export_stream(self.dataset, 'xlsx', 3)
+
+
+class ExportViewTests(CommittedTestCase):
+    def test_gzip_when_accepted(self):
+        dataset = ingest_rows(10)
+        response = self.client.get(f'/api/datasets/{dataset.id}/export/?format=csv', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="dataset_{dataset.id}.csv"')
+        body = gzip.decompress(b''.join(response.streaming_content)).decode()
+        self.assertEqual(body.splitlines()[0], CSV_HEADER.strip())
+        self.assertEqual(len(body.splitlines()), 11)
+
+        response = self.client.get(f'/api/datasets/{dataset.id}/export/?format=xlsx')
+        self.assertEqual(response.status_code, 400)
+
+
+class UploadFormatTests(TestCase):
+    frame = pd.DataFrame({
+        'Equipment Name': ['Pump-1', 'Valve-1', 'Pump-2'],
+        'Type': ['Pump', 'Valve', 'Pump'],
+        'Flowrate': [1.5, 2.0, 3.25],
+        'Pressure': [4.0, 5.0, 6.0],
+        'Temperature': [300.0, 310.0, 320.0],
+    })
+
+    def upload(self, content, name='equipment.csv'):
+        return self.client.post('/api/upload/', {'file': SimpleUploadedFile(name, content)})
+
+    def assertStored(self, response):
+        self.assertEqual(response.status_code, 201, response.content)
+        readings = Equipment.objects.filter(dataset_id=response.json()['dataset_id']).order_by('id')
+        self.assertEqual(
+            list(readings.values_list('name', 'type__name', 'flowrate', 'pressure', 'temperature')),
+            list(self.frame.itertuples(index=False, name=None)),
+        )
+
+    def csv(self):
+        return self.frame.to_csv(index=False).encode()
+
+    def arrow_table(self):
+        import pyarrow as pa
+
+        # Stray whitespace in a label, an unused column and a dictionary column.
+        table = pa.Table.from_pandas(self.frame.rename(columns={'Type': ' Type '}), preserve_index=False)
+        table = table.append_column('Notes', pa.array(['a', 'b', 'c']))
+        return table.set_column(1, ' Type ', table.column(' Type ').dictionary_encode())
+
+    def test_gzip_csv(self):
+        self.assertStored(self.upload(gzip.compress(self.csv()), 'equipment.csv.gz'))
+
+    @skipUnless(HAS_ZSTANDARD, "zstandard is not installed")
+    def test_zstd_csv(self):
+        import zstandard
+        self.assertStored(self.upload(zstandard.ZstdCompressor().compress(self.csv()), 'equipment.csv.zst'))
+
+    @skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_parquet(self):
+        import pyarrow.parquet as pq
+
+        buffer = io.BytesIO()
+        pq.write_table(self.arrow_table(), buffer, row_group_size=2)
+        self.assertStored(self.upload(buffer.getvalue(), 'equipment.parquet'))
+
+    @skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_arrow_file_and_stream(self):
+        import pyarrow as pa
+
+        for new_writer in (pa.ipc.new_file, pa.ipc.new_stream):
+            with self.subTest(writer=new_writer.__name__):
+                Dataset.objects.all().delete()
+                buffer = io.BytesIO()
+                table = self.arrow_table()
+                with new_writer(buffer, table.schema) as writer:
+                    writer.write_table(table, max_chunksize=2)
+                self.assertStored(self.upload(buffer.getvalue(), 'equipment.arrow'))
+
+    @skipUnless(HAS_PYARROW, "pyarrow is not installed")
+    def test_parquet_missing_value_is_rejected(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        frame = self.frame.copy()
+        frame.loc[2, 'Pressure'] = None
+        buffer = io.BytesIO()
+        pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), buffer, row_group_size=2)
+        response = self.upload(buffer.getvalue(), 'equipment.parquet')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Row 3 has missing values')
+        self.assertFalse(Dataset.objects.exists())
+
+    def test_csv_missing_value_is_reported_across_chunks(self):
+        content = self.csv().replace(b'Pump-2,Pump,3.25', b'Pump-2,,3.25')
+        with self.assertRaisesMessage(IngestError, 'Row 3 has missing values'):
+            ingest_csv(io.BytesIO(content), chunk_size=2)
+        self.assertFalse(Dataset.objects.exists())
+
+    def test_unreadable_uploads_are_rejected(self):
+        for name, content in [
+            ('truncated gzip', gzip.compress(self.csv())[:-12]),
+            ('text in a numeric column', self.csv().replace(b'1.5', b'fast')),
+            ('parquet magic only', b'PAR1 not really parquet'),
+        ]:
+            with self.subTest(name):
+                response = self.upload(content)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('error', response.json())
+
+
+# Run in a fresh process against a migrated database file, so that the
+# replica alias is the real read-only connection rather than the test mirror.
+REPLICA_CHECK = """
+import io
+import django
+django.setup()
+
+from django.db import OperationalError, connections, router
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings, setup_test_environment
+from equipment.ingest import ingest_csv
+from equipment.models import Dataset
+from equipment.routers import reading_from_replica
+
+setup_test_environment()
+ingest_csv(io.BytesIO(b'Equipment Name,Type,Flowrate,Pressure,Temperature\\nPump-1,Pump,1,2,3\\n'))
+
+with override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'equipment': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+}):
+    with CaptureQueriesContext(connections['default']) as writes, \\
+            CaptureQueriesContext(connections['replica']) as reads:
+        response = Client().get('/api/summary/')
+    assert response.status_code == 200 and response.json()['total_equipment'] == 1, response.content
+    assert reads.captured_queries, 'GET did not read from the replica'
+    assert not writes.captured_queries, writes.captured_queries
+
+with reading_from_replica():
+    assert router.db_for_read(Dataset) == 'replica'
+    assert router.db_for_write(Dataset) == 'default'
+    dataset = Dataset.objects.first()
+    assert dataset._state.db == 'replica'
+    dataset.save()
+assert router.db_for_read(Dataset) == 'default'
+
+try:
+    with connections['replica'].cursor() as cursor:
+        cursor.execute('DELETE FROM equipment_dataset')
+except OperationalError as e:
+    assert 'readonly' in str(e), e
+else:
+    raise AssertionError('write through the replica alias succeeded')
+assert Dataset.objects.count() == 1
+"""
+
+
+class ReplicaConnectionTests(SimpleTestCase):
+    def test_reads_use_a_read_only_connection(self):
+        backend_dir = Path(__file__).resolve().parent.parent
+        with tempfile.TemporaryDirectory() as workdir:
+            env = dict(os.environ, DJANGO_SETTINGS_MODULE='config.settings',
+                       EQUIPMENT_DB_PATH=str(Path(workdir) / 'db.sqlite3'))
+            env.pop('EQUIPMENT_ASYNC_VIEWS', None)
+            subprocess.run([sys.executable, 'manage.py', 'migrate', '--verbosity', '0'],
+                           cwd=backend_dir, env=env, check=True)
+            result = subprocess.run([sys.executable, '-c', REPLICA_CHECK],
+                                    cwd=backend_dir, env=env, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
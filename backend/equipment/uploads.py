@@ -0,0 +1,382 @@
+"""
+Resumable chunked uploads.
+
+A client initiates an upload, PUTs numbered parts (1-based, each with its
+SHA-256) in any order and then completes it with the number of parts. Parts
+are written to ``EQUIPMENT_STAGING_DIR/<upload id>/`` under a temporary name
+and renamed once their checksum matches, so a part file either exists whole or
+not at all; re-sending a part that already arrived is a no-op. Sending parts
+touches only the file system.
+
+The ingest job is queued once the upload is completed and reads the parts in
+order through ``PartStream``. The ingest transaction holds the SQLite write
+lock, so it never waits on a client: a slow or abandoned upload holds neither
+the lock nor an ingest worker. Parsing therefore does not overlap the
+transfer: it starts after the last part has arrived and reads the parts from
+local disk. An open upload that has not received a part for
+``EQUIPMENT_UPLOAD_STALL_TIMEOUT`` seconds is discarded (see
+``stalled_uploads``).
+
+Completing an upload computes the SHA-256 of the whole file, which must match
+the digest declared at initiation, if any, and is stored on the dataset for
+deduplication. Ordinary multipart uploads are hashed while Django reads the
+request body, by the upload handlers at the end of this module.
+"""
+import hashlib
+import io
+import json
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.uploadhandler import MemoryFileUploadHandler, TemporaryFileUploadHandler
+
+from .ingest import IngestError
+
+META_FILE = 'upload.json'
+COMPLETE_FILE = 'complete'
+ABORTED_FILE = 'aborted'
+COPY_BUFFER = 1024 * 1024
+
+
+class UploadError(ValueError):
+    """
+    Raised for an upload request that cannot be accepted.
+    """
+
+
+class PartConflict(UploadError):
+    """
+    Raised when a part arrives again with different content.
+    """
+
+
+def upload_dir(upload_id):
+    return Path(settings.EQUIPMENT_STAGING_DIR) / str(upload_id)
+
+
+def part_path(directory, number):
+    return Path(directory) / f'{number:08d}.part'
+
+
+def create_upload(upload_id, filename='', size=None, sha256=''):
+    directory = upload_dir(upload_id)
+    directory.mkdir(parents=True)
+    meta = {
+        'filename': filename,
+        'size': size,
+        'sha256': sha256,
+        'part_size': settings.EQUIPMENT_UPLOAD_PART_SIZE,
+    }
+    (directory / META_FILE).write_text(json.dumps(meta))
+    return meta
+
+
+def read_meta(upload_id):
+    try:
+        return json.loads((upload_dir(upload_id) / META_FILE).read_text())
+    except FileNotFoundError:
+        return None
+
+
+def upload_state(upload_id):
+    directory = upload_dir(upload_id)
+    if (directory / ABORTED_FILE).exists():
+        return 'aborted'
+    if (directory / COMPLETE_FILE).exists():
+        return 'complete'
+    return 'open'
+
+
+def received_parts(upload_id):
+    """
+    ``{part number: size}`` of the parts stored so far.
+    """
+    parts = {}
+    for path in upload_dir(upload_id).glob('*.part'):
+        parts[int(path.stem)] = path.stat().st_size
+    return dict(sorted(parts.items()))
+
+
+def store_part(upload_id, number, stream, sha256, length=None):
+    """
+    Write one part from ``stream`` if its SHA-256 matches. Returns ``True``
+    when the part was new, ``False`` when an identical part was already there.
+    """
+    if upload_state(upload_id) != 'open':
+        raise UploadError("Upload is no longer accepting parts")
+    if number < 1:
+        raise UploadError("Part numbers start at 1")
+    max_size = settings.EQUIPMENT_UPLOAD_MAX_PART_SIZE
+    if length is not None and length > max_size:
+        raise UploadError(f"Parts may be at most {max_size} bytes")
+
+    directory = upload_dir(upload_id)
+    path = part_path(directory, number)
+    checksum_path = path.with_suffix('.sha256')
+    if path.exists():
+        if checksum_path.read_text() != sha256:
+            raise PartConflict(f"Part {number} was already received with a different checksum")
+        return False
+
+    tmp_path = directory / f'.{number:08d}.{uuid.uuid4().hex}'
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, 'wb') as out:
+            while True:
+                data = stream.read(COPY_BUFFER)
+                if not data:
+                    break
+                size += len(data)
+                if size > max_size:
+                    raise UploadError(f"Parts may be at most {max_size} bytes")
+                digest.update(data)
+                out.write(data)
+        if digest.hexdigest() != sha256:
+            raise UploadError(f"Checksum mismatch for part {number}")
+        # The checksum goes first so that a visible part always has one.
+        checksum_path.write_text(sha256)
+        os.replace(tmp_path, path)
+    finally:
+        tmp_path.unlink(missing_ok=True)
+    return True
+
+
+def file_digest(directory, parts):
+    digest = hashlib.sha256()
+    for number in range(1, parts + 1):
+        with open(part_path(directory, number), 'rb') as f:
+            while data := f.read(COPY_BUFFER):
+                digest.update(data)
+    return digest.hexdigest()
+
+
+def complete_upload(upload_id, parts):
+    """
+    Mark the upload as complete once parts ``1..parts`` are all stored.
+    Returns ``(sha256, completed)`` with the SHA-256 of the whole file;
+    ``completed`` is ``False`` when the upload had already been completed with
+    the same parts, so a retried request does not queue a second ingest. An
+    upload that does not match its declared digest is aborted.
+    """
+    state = upload_state(upload_id)
+    if state == 'aborted':
+        raise UploadError("Upload was aborted")
+    if state == 'complete':
+        return _completed_before(upload_id, parts)
+
+    received = received_parts(upload_id)
+    missing = [number for number in range(1, parts + 1) if number not in received]
+    if missing:
+        raise UploadError(f"Missing parts: {missing[:20]}")
+    extra = [number for number in received if number > parts]
+    if extra:
+        raise UploadError(f"Parts beyond {parts} were received: {extra[:20]}")
+
+    directory = upload_dir(upload_id)
+    sha256 = file_digest(directory, parts)
+    declared = read_meta(upload_id).get('sha256')
+    if declared and declared != sha256:
+        abort_upload(upload_id)
+        raise UploadError("Upload does not match its declared SHA-256")
+    try:
+        with open(directory / COMPLETE_FILE, 'x') as f:
+            f.write(json.dumps({'parts': parts, 'sha256': sha256}))
+    except FileExistsError:
+        # Completed by a concurrent request.
+        return _completed_before(upload_id, parts)
+    return sha256, True
+
+
+def _completed_before(upload_id, parts):
+    completion = json.loads((upload_dir(upload_id) / COMPLETE_FILE).read_text())
+    if completion['parts'] != parts:
+        raise UploadError(f"Upload was already completed with {completion['parts']} parts")
+    return completion['sha256'], False
+
+
+def abort_upload(upload_id):
+    (upload_dir(upload_id) / ABORTED_FILE).touch()
+
+
+def delete_upload(directory):
+    shutil.rmtree(directory, ignore_errors=True)
+
+
+def stalled_uploads(timeout):
+    """
+    Ids of open uploads that have not received a part for ``timeout`` seconds.
+    """
+    staging_dir = Path(settings.EQUIPMENT_STAGING_DIR)
+    if not staging_dir.is_dir():
+        return []
+    cutoff = time.time() - timeout
+    stalled = []
+    for directory in staging_dir.iterdir():
+        if not (directory / META_FILE).exists() or upload_state(directory.name) != 'open':
+            continue
+        try:
+            last_activity = max(path.stat().st_mtime for path in directory.iterdir())
+        except (FileNotFoundError, ValueError):
+            continue
+        if last_activity < cutoff:
+            stalled.append(directory.name)
+    return stalled
+
+
+class PartStream(io.RawIOBase):
+    """
+    Read-only file over the parts of a completed upload, in order.
+    """
+    def __init__(self, directory):
+        self.directory = Path(directory)
+        meta = json.loads((self.directory / META_FILE).read_text())
+        self.size = meta.get('size')
+        self.number = 1
+        self.handle = None
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def _completion(self):
+        try:
+            return json.loads((self.directory / COMPLETE_FILE).read_text())
+        except FileNotFoundError:
+            return None
+
+    def _total_parts(self):
+        completion = self._completion()
+        return completion['parts'] if completion else None
+
+    @property
+    def sha256(self):
+        """
+        Digest of the whole upload, known once it is complete.
+        """
+        completion = self._completion()
+        return completion['sha256'] if completion else None
+
+    def _part(self, number):
+        """
+        Path of part ``number``, or ``None`` past the last part.
+        """
+        if (self.directory / ABORTED_FILE).exists():
+            raise IngestError("Upload was aborted")
+        total = self._total_parts()
+        if total is None:
+            raise IngestError("Upload is not complete")
+        if number > total:
+            return None
+        path = part_path(self.directory, number)
+        if not path.exists():
+            raise IngestError(f"Upload is missing part {number}")
+        return path
+
+    def readinto(self, buffer):
+        while True:
+            if self.handle is None:
+                path = self._part(self.number)
+                if path is None:
+                    return 0
+                self.handle = open(path, 'rb')
+            count = self.handle.readinto(buffer)
+            if count:
+                self.position += count
+                return count
+            self.handle.close()
+            self.handle = None
+            self.number += 1
+
+    def _total_size(self):
+        sizes = []
+        while True:
+            path = self._part(len(sizes) + 1)
+            if path is None:
+                return sum(sizes)
+            sizes.append(path.stat().st_size)
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self._total_size()
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+
+        remaining = offset
+        number = 1
+        while True:
+            path = self._part(number)
+            if path is None:
+                # At or past the end: reads return nothing.
+                break
+            size = path.stat().st_size
+            if remaining < size:
+                break
+            remaining -= size
+            number += 1
+        self.number = number
+        if path is not None:
+            self.handle = open(path, 'rb')
+            self.handle.seek(remaining)
+        self.position = offset
+        return offset
+
+    def close(self):
+        if self.handle is not None:
+            self.handle.close()
+            self.handle = None
+        super().close()
+
+
+class UploadReader(io.BufferedReader):
+    @property
+    def sha256(self):
+        return self.raw.sha256
+
+
+def open_upload(directory):
+    return UploadReader(PartStream(directory), COPY_BUFFER)
+
+
+class HashingMixin:
+    """
+    Hash an uploaded file while the request body is read and set the hex
+    digest as ``sha256`` on the resulting file object.
+    """
+    def new_file(self, *args, **kwargs):
+        self.sha256 = hashlib.sha256()
+        super().new_file(*args, **kwargs)
+
+    def receive_data_chunk(self, raw_data, start):
+        passed = super().receive_data_chunk(raw_data, start)
+        if passed is None:
+            # This handler kept the data.
+            self.sha256.update(raw_data)
+        return passed
+
+    def file_complete(self, file_size):
+        file = super().file_complete(file_size)
+        if file is not None:
+            file.sha256 = self.sha256.hexdigest()
+        return file
+
+
+class HashingMemoryFileUploadHandler(HashingMixin, MemoryFileUploadHandler):
+    pass
+
+
+class HashingTemporaryFileUploadHandler(HashingMixin, TemporaryFileUploadHandler):
+    pass
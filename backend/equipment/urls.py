@@ -1,9 +1,31 @@
+from django.conf import settings
 from django.urls import path
-from .views import UploadAPI, SummaryAPI, HistoryAPI, PDFReportAPI
+from . import async_views
+from .views import UploadAPI, ChunkedUploadAPI, ChunkedUploadDetailAPI, UploadPartAPI, UploadCompleteAPI, IngestJobAPI, SummaryAPI, HistoryAPI, HistoryRollupAPI, PDFReportAPI, ReadingsAPI, AnomalyAPI, CompareAPI, ExportAPI, CacheStatsAPI, MetricsAPI, event_stream
+
+if settings.EQUIPMENT_ASYNC_VIEWS:
+    summary_view, history_view = async_views.summary, async_views.history
+    report_view, readings_view = async_views.report_pdf, async_views.readings
+else:
+    summary_view, history_view = SummaryAPI.as_view(), HistoryAPI.as_view()
+    report_view, readings_view = PDFReportAPI.as_view(), ReadingsAPI.as_view()
 
 urlpatterns = [
     path('upload/', UploadAPI.as_view(), name='upload_csv'),
-    path('summary/', SummaryAPI.as_view(), name='get_summary'),
-    path('history/', HistoryAPI.as_view(), name='get_history'),
-    path('report_pdf/', PDFReportAPI.as_view(), name='get_pdf_report'),
+    path('uploads/', ChunkedUploadAPI.as_view(), name='chunked_uploads'),
+    path('uploads/<uuid:upload_id>/', ChunkedUploadDetailAPI.as_view(), name='chunked_upload'),
+    path('uploads/<uuid:upload_id>/parts/<int:part>/', UploadPartAPI.as_view(), name='upload_part'),
+    path('uploads/<uuid:upload_id>/complete/', UploadCompleteAPI.as_view(), name='upload_complete'),
+    path('jobs/<uuid:job_id>/', IngestJobAPI.as_view(), name='ingest_job'),
+    path('summary/', summary_view, name='get_summary'),
+    path('history/', history_view, name='get_history'),
+    path('history/rollup/', HistoryRollupAPI.as_view(), name='history_rollup'),
+    path('report_pdf/', report_view, name='get_pdf_report'),
+    path('datasets/<int:dataset_id>/readings/', readings_view, name='dataset_readings'),
+    path('datasets/<int:dataset_id>/anomalies/', AnomalyAPI.as_view(), name='dataset_anomalies'),
+    path('datasets/compare/', CompareAPI.as_view(), name='dataset_compare'),
+    path('datasets/<int:dataset_id>/export/', ExportAPI.as_view(), name='dataset_export'),
+    path('cache/stats/', CacheStatsAPI.as_view(), name='cache_stats'),
+    path('metrics/', MetricsAPI.as_view(), name='metrics'),
+    path('events/', event_stream, name='events'),
 ]
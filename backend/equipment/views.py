@@ -1,15 +1,38 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from django.utils import timezone
-from django.db.models import Avg, Count
-from django.http import HttpResponse
-import pandas as pd
-from .models import Dataset, Equipment
-from .serializers import DatasetSummarySerializer
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
-import io
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.views.decorators.http import require_GET
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.middleware.gzip import re_accepts_gzip
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence
+from django.utils.dateparse import parse_datetime
+from django.shortcuts import get_object_or_404
+from django.db.models import Q
+from django.urls import reverse
+from .models import Anomaly, Dataset, IngestJob
+from .ingest import find_duplicate, process_upload, IngestError
+from .summaries import NUMERIC_FIELDS, get_summary_data, get_history_data, get_rollup_data
+from .readings import load_columns
+from .export import ExportError, FORMATS as EXPORT_FORMATS, export_stream
+from .caching import cached_response, get_data_version, stats as cache_stats
+from .jobs import abort_parts, complete_parts, start_parts, submit_upload, live_status
+from .serializers import AnomalySerializer, DatasetSummarySerializer, IngestJobSerializer
+from . import downsample, events, metrics, reports, uploads
+from .access import check_access
+from .compare import ORDERINGS as COMPARE_ORDERINGS, compare_datasets
+from .sqlite import busy_response, is_locked
+import numpy as np
+from urllib.parse import urlencode
+
+def dedup_response(dataset):
+    return Response({
+        "message": "Identical upload already stored",
+        "dedup": True,
+        "dataset_id": dataset.id,
+    }, status=status.HTTP_200_OK)
 
 class UploadAPI(APIView):
     def post(self, request):
@@ -17,139 +40,519 @@ class UploadAPI(APIView):
         if not file:
             return Response({"error": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
 
-        try:
-            df = pd.read_csv(file)
-            # Normalize columns: strip whitespace
-            df.columns = df.columns.str.strip()
-            
-            required_cols = ['Equipment Name', 'Type', 'Flowrate', 'Pressure', 'Temperature']
-            missing_cols = [col for col in required_cols if col not in df.columns]
-            
-            if missing_cols:
-                return Response(
-                    {"error": f"Missing columns: {missing_cols}. Found: {list(df.columns)}"}, 
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+        if request.query_params.get('async') in ('1', 'true'):
+            duplicate = find_duplicate(getattr(file, 'sha256', None))
+            if duplicate:
+                return dedup_response(duplicate)
+            job = submit_upload(file)
+            return Response({
+                "message": "Upload accepted",
+                "job_id": str(job.id),
+                "status_url": request.build_absolute_uri(reverse('ingest_job', args=[job.id])),
+            }, status=status.HTTP_202_ACCEPTED)
 
-            # Create Dataset
-            dataset = Dataset.objects.create(uploaded_at=timezone.now())
-
-            # Parse and Save
-            equipment_list = []
-            for _, row in df.iterrows():
-                equipment_list.append(Equipment(
-                    dataset=dataset,
-                    name=row['Equipment Name'],
-                    type=row['Type'],
-                    flowrate=row['Flowrate'],
-                    pressure=row['Pressure'],
-                    temperature=row['Temperature'],
-                    uploaded_at=dataset.uploaded_at
-                ))
-            Equipment.objects.bulk_create(equipment_list)
-
-            # History Management: Keep user's limit of 5
-            all_datasets = Dataset.objects.all().order_by('-uploaded_at')
-            if all_datasets.count() > 5:
-                # Delete older datasets
-                ids_to_keep = all_datasets.values_list('id', flat=True)[:5]
-                Dataset.objects.exclude(id__in=ids_to_keep).delete()
-
-            return Response({"message": "Upload successful", "dataset_id": dataset.id}, status=status.HTTP_201_CREATED)
+        try:
+            result = process_upload(file)
+            if result.dedup:
+                return dedup_response(result.dataset)
+            return Response({"message": "Upload successful", **result.as_dict()}, status=status.HTTP_201_CREATED)
 
+        except IngestError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
+            if is_locked(e):
+                return busy_response()
             return Response({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-def get_summary_data(dataset):
-    if not dataset:
-        return None
-    
-    equipment = dataset.equipment.all()
-    total_count = equipment.count()
-    if total_count == 0:
-        return None
-
-    aggs = equipment.aggregate(
-        avg_flow=Avg('flowrate'),
-        avg_press=Avg('pressure'),
-        avg_temp=Avg('temperature')
-    )
-
-    type_dist = list(equipment.values('type').annotate(count=Count('type')))
-    # Convert query set to dict
-    dist_dict = {item['type']: item['count'] for item in type_dist}
-
-    return {
-        'id': dataset.id,
-        'uploaded_at': dataset.uploaded_at,
-        'total_equipment': total_count,
-        'avg_flowrate': aggs['avg_flow'],
-        'avg_pressure': aggs['avg_press'],
-        'avg_temperature': aggs['avg_temp'],
-        'type_distribution': dist_dict
-    }
+class IngestJobAPI(APIView):
+    def get(self, request, job_id):
+        live = live_status(job_id)
+        if live:
+            return Response(live)
+        job = get_object_or_404(IngestJob, id=job_id)
+        return Response(IngestJobSerializer(job).data)
+
+class ChunkedUploadAPI(APIView):
+    def post(self, request):
+        size = request.data.get('size')
+        try:
+            size = int(size) if size not in (None, '') else None
+        except (TypeError, ValueError):
+            return Response({"error": "size must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+
+        sha256 = str(request.data.get('sha256') or '').strip().lower()
+        if sha256 and (len(sha256) != 64 or any(c not in '0123456789abcdef' for c in sha256)):
+            return Response({"error": "sha256 must be a hex SHA-256 digest"}, status=status.HTTP_400_BAD_REQUEST)
+        duplicate = find_duplicate(sha256)
+        if duplicate:
+            return dedup_response(duplicate)
+
+        job = start_parts(str(request.data.get('filename', ''))[:255], size, sha256)
+        return Response({
+            "upload_id": str(job.id),
+            "part_size": settings.EQUIPMENT_UPLOAD_PART_SIZE,
+            "max_part_size": settings.EQUIPMENT_UPLOAD_MAX_PART_SIZE,
+            "upload_url": request.build_absolute_uri(reverse('chunked_upload', args=[job.id])),
+            "job_id": str(job.id),
+            "status_url": request.build_absolute_uri(reverse('ingest_job', args=[job.id])),
+        }, status=status.HTTP_201_CREATED)
+
+class ChunkedUploadDetailAPI(APIView):
+    def get(self, request, upload_id):
+        meta = uploads.read_meta(upload_id)
+        if meta is None:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        parts = uploads.received_parts(upload_id)
+        return Response({
+            "upload_id": str(upload_id),
+            "state": uploads.upload_state(upload_id),
+            "part_size": meta['part_size'],
+            "parts": list(parts),
+            "bytes_received": sum(parts.values()),
+            "job": live_status(upload_id),
+        })
+
+    def delete(self, request, upload_id):
+        if uploads.read_meta(upload_id) is None:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        if uploads.upload_state(upload_id) == 'complete':
+            return Response({"error": "Upload was already completed"}, status=status.HTTP_409_CONFLICT)
+        abort_parts(upload_id)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class UploadPartAPI(APIView):
+    def put(self, request, upload_id, part):
+        if uploads.read_meta(upload_id) is None:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        sha256 = request.headers.get('X-Content-SHA256', '').strip().lower()
+        if len(sha256) != 64:
+            return Response({"error": "X-Content-SHA256 header with the part's hex digest is required"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        length = request.META.get('CONTENT_LENGTH')
+        if not length:
+            return Response({"error": "Content-Length header is required"},
+                            status=status.HTTP_411_LENGTH_REQUIRED)
+        try:
+            length = int(length)
+        except ValueError:
+            length = -1
+        if length < 0:
+            return Response({"error": "Content-Length must be a non-negative integer"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if request.stream is None:
+            return Response({"error": "Empty part"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            created = uploads.store_part(upload_id, part, request.stream, sha256, length)
+        except uploads.PartConflict as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+        except uploads.UploadError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"part": part, "sha256": sha256},
+                        status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+class UploadCompleteAPI(APIView):
+    def post(self, request, upload_id):
+        if uploads.read_meta(upload_id) is None:
+            return Response({"error": "Upload not found"}, status=status.HTTP_404_NOT_FOUND)
+        try:
+            parts = int(request.data.get('parts'))
+        except (TypeError, ValueError):
+            return Response({"error": "parts must be the number of parts sent"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            sha256 = complete_parts(upload_id, parts)
+        except uploads.UploadError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            "message": "Upload complete",
+            "sha256": sha256,
+            "job_id": str(upload_id),
+            "status_url": request.build_absolute_uri(reverse('ingest_job', args=[upload_id])),
+        }, status=status.HTTP_202_ACCEPTED)
 
 class SummaryAPI(APIView):
     def get(self, request):
+        return cached_response(request, 'summary', self.build)
+
+    def build(self):
         # Get latest dataset
-        latest = Dataset.objects.first() # Ordered by -uploaded_at
+        latest = Dataset.objects.select_related('summary').first() # Ordered by -uploaded_at
         if not latest:
             return Response({"message": "No data available"}, status=200)
         
-        data = get_summary_data(latest)
+        data = get_summary_data(latest, with_stats=True)
         serializer = DatasetSummarySerializer(data)
         return Response(serializer.data)
 
 class HistoryAPI(APIView):
     def get(self, request):
-        datasets = Dataset.objects.all() # Ordered by -uploaded_at
-        history = []
-        for ds in datasets:
-            data = get_summary_data(ds)
-            if data:
-                history.append(data)
-        
-        serializer = DatasetSummarySerializer(history, many=True)
-        return Response(serializer.data)
+        params = urlencode(sorted(request.query_params.items()))
+        return cached_response(request, 'history', lambda: self.build(request), params)
+
+    def get_page(self, request, datasets):
+        """
+        The requested page of ``datasets`` as ``(page, has_more, limit)``.
+        Raises ``ValueError`` for malformed ``limit``, ``before`` or
+        ``before_id``.
+        """
+        datasets, limit = self.page_queryset(request.query_params, datasets)
+        page = list(datasets)
+        return page[:limit], len(page) > limit, limit
+
+    @staticmethod
+    def page_queryset(params, datasets):
+        """
+        ``(queryset, limit)`` where the queryset selects one row more than the
+        page so that the caller can tell whether another page follows.
+
+        The cursor is the ``(uploaded_at, id)`` pair of the last item seen, in
+        ``before`` and ``before_id``, so datasets sharing a timestamp across a
+        page boundary are not skipped. ``before`` alone still selects
+        everything strictly older.
+        """
+        try:
+            limit = int(params.get('limit', settings.EQUIPMENT_HISTORY_PAGE_SIZE))
+        except ValueError:
+            raise ValueError("limit must be an integer")
+        limit = max(1, min(limit, settings.EQUIPMENT_HISTORY_MAX_PAGE_SIZE))
+
+        datasets = datasets.order_by('-uploaded_at', '-id')
+        before = params.get('before')
+        if before:
+            before_dt = parse_datetime(before)
+            if before_dt is None:
+                raise ValueError("before must be an ISO 8601 datetime")
+            before_id = params.get('before_id')
+            if before_id:
+                try:
+                    before_id = int(before_id)
+                except ValueError:
+                    raise ValueError("before_id must be an integer")
+                datasets = datasets.filter(
+                    Q(uploaded_at__lt=before_dt) | Q(uploaded_at=before_dt, id__lt=before_id)
+                )
+            else:
+                datasets = datasets.filter(uploaded_at__lt=before_dt)
+        return datasets[:limit + 1], limit
+
+    @staticmethod
+    def next_link(request, page, limit):
+        query = urlencode({'before': page[-1].uploaded_at.isoformat(), 'before_id': page[-1].id, 'limit': limit})
+        return f'<{request.build_absolute_uri(request.path)}?{query}>; rel="next"'
+
+    def build(self, request):
+        # The sketches are only needed by the rollup.
+        datasets = Dataset.objects.select_related('summary').defer('summary__stats')
+        try:
+            page, has_more, limit = self.get_page(request, datasets)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = DatasetSummarySerializer(get_history_data(page), many=True)
+        response = Response(serializer.data)
+        if has_more:
+            response['Link'] = self.next_link(request, page, limit)
+        return response
+
+class HistoryRollupAPI(HistoryAPI):
+    """
+    Statistics across a page of history, merged from per-dataset sketches.
+    Takes the same ``limit``, ``before`` and ``before_id`` parameters as the
+    history list.
+    """
+    def get(self, request):
+        params = urlencode(sorted(request.query_params.items()))
+        return cached_response(request, 'history_rollup', lambda: self.build(request), params)
+
+    def build(self, request):
+        try:
+            page, has_more, limit = self.get_page(request, Dataset.objects.select_related('summary'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({**get_rollup_data(page), "has_more": has_more})
 
 class PDFReportAPI(APIView):
     def get(self, request):
-        latest = Dataset.objects.first()
-        if not latest:
+        try:
+            kind, dataset_id = self.parse_params(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        params = urlencode({'kind': kind, 'dataset': dataset_id or ''})
+        return cached_response(request, 'report_pdf', lambda: self.build(kind, dataset_id), params)
+
+    @staticmethod
+    def parse_params(params):
+        """
+        ``(kind, dataset_id)``; ``dataset_id`` is ``None`` for the latest.
+        """
+        kind = reports.FULL if params.get('detail') == 'full' else reports.SUMMARY
+        dataset_id = params.get('dataset')
+        if dataset_id and not dataset_id.isdigit():
+            raise ValueError("dataset must be an integer id")
+        return kind, dataset_id or None
+
+    @staticmethod
+    def get_queryset(dataset_id):
+        datasets = Dataset.objects.select_related('summary')
+        return datasets.filter(id=dataset_id) if dataset_id else datasets
+
+    @staticmethod
+    def filename(dataset, kind):
+        return f'dataset_{dataset.id}_{kind}_report.pdf'
+
+    def build(self, kind, dataset_id):
+        dataset = self.get_queryset(dataset_id).first()
+        if not dataset:
             return Response({"error": "No data available"}, status=404)
-        
-        data = get_summary_data(latest)
 
-        buffer = io.BytesIO()
-        p = canvas.Canvas(buffer, pagesize=letter)
-        p.setFont("Helvetica-Bold", 16)
-        p.drawString(100, 750, "Chemical Equipment Summary Report")
-        
-        p.setFont("Helvetica", 12)
-        y = 720
-        p.drawString(100, y, f"Dataset ID: {data['id']}")
-        y -= 20
-        p.drawString(100, y, f"Uploaded At: {data['uploaded_at']}")
-        y -= 40
-        
-        p.drawString(100, y, f"Total Equipment: {data['total_equipment']}")
-        y -= 20
-        p.drawString(100, y, f"Average Flowrate: {data['avg_flowrate']:.2f}")
-        y -= 20
-        p.drawString(100, y, f"Average Pressure: {data['avg_pressure']:.2f}")
-        y -= 20
-        p.drawString(100, y, f"Average Temperature: {data['avg_temperature']:.2f}")
-        y -= 40
-
-        p.setFont("Helvetica-Bold", 14)
-        p.drawString(100, y, "Type Distribution:")
-        y -= 25
-        p.setFont("Helvetica", 12)
-        for dtype, count in data['type_distribution'].items():
-            p.drawString(120, y, f"- {dtype}: {count}")
-            y -= 20
-
-        p.showPage()
-        p.save()
-        buffer.seek(0)
-        return HttpResponse(buffer, content_type='application/pdf')
+        path = reports.get_report(dataset, kind)
+        return FileResponse(
+            open(path, 'rb'),
+            content_type='application/pdf',
+            filename=self.filename(dataset, kind),
+        )
+
+class ReadingsAPI(APIView):
+    """
+    Downsampled reading series for charting:
+    ?points=N&fields=flowrate,pressure&type=Pump&method=minmax|mean|lttb&encoding=json|binary
+    """
+    METHODS = ('minmax', 'mean', 'lttb')
+
+    def get(self, request, dataset_id):
+        try:
+            options = self.parse_params(request.query_params)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return cached_response(
+            request, 'readings', lambda: self.build(dataset_id, **options), self.cache_params(dataset_id, options),
+        )
+
+    @classmethod
+    def parse_params(cls, params):
+        """
+        ``points``, ``fields``, ``method``, ``encoding`` and ``type_name`` from
+        the query string. Raises ``ValueError`` for invalid values.
+        """
+        try:
+            points = int(params.get('points', settings.EQUIPMENT_READINGS_DEFAULT_POINTS))
+        except ValueError:
+            raise ValueError("points must be an integer")
+        points = max(3, min(points, settings.EQUIPMENT_READINGS_MAX_POINTS))
+
+        fields = [field for field in params.get('fields', ','.join(NUMERIC_FIELDS)).split(',') if field]
+        unknown = [field for field in fields if field not in NUMERIC_FIELDS]
+        if unknown or not fields:
+            raise ValueError(f"Unknown fields: {unknown}. Choose from {list(NUMERIC_FIELDS)}")
+        method = params.get('method', 'minmax')
+        if method not in cls.METHODS:
+            raise ValueError(f"method must be one of {list(cls.METHODS)}")
+        encoding = params.get('encoding', 'json')
+        if encoding not in ('json', 'binary'):
+            raise ValueError("encoding must be json or binary")
+        return {
+            'points': points, 'fields': fields, 'method': method,
+            'encoding': encoding, 'type_name': params.get('type'),
+        }
+
+    @staticmethod
+    def cache_params(dataset_id, options):
+        return urlencode({
+            'dataset': dataset_id, 'points': options['points'], 'fields': ','.join(options['fields']),
+            'method': options['method'], 'encoding': options['encoding'], 'type': options['type_name'] or '',
+        })
+
+    def build(self, dataset_id, points, fields, method, encoding, type_name):
+        dataset = get_object_or_404(Dataset, id=dataset_id)
+        meta, series = self.downsample_series(dataset, points, fields, method, type_name)
+        if encoding == 'binary':
+            return self.binary_response(meta, series)
+        return Response(self.json_data(meta, series))
+
+    @staticmethod
+    def downsample_series(dataset, points, fields, method, type_name):
+        """
+        ``(meta, series)`` where ``series`` maps each field to its arrays.
+        """
+        columns = load_columns(dataset, fields, type_name)
+        rows = len(columns[fields[0]])
+
+        series = {}
+        for field in fields:
+            values = columns[field]
+            if method == 'lttb':
+                index = downsample.lttb(values, points)
+                series[field] = {'x': index, 'y': values[index]}
+            else:
+                starts, stats = downsample.bucket_stats(values, points)
+                series[field] = {'x': starts}
+                if method == 'minmax':
+                    series[field].update(min=stats['min'], max=stats['max'])
+                series[field]['mean'] = stats['mean']
+
+        meta = {
+            'dataset_id': dataset.id,
+            'rows': rows,
+            'type': type_name,
+            'method': method,
+            'points': points,
+        }
+        return meta, series
+
+    @staticmethod
+    def json_data(meta, series):
+        meta['series'] = {
+            field: {name: array.tolist() for name, array in arrays.items()}
+            for field, arrays in series.items()
+        }
+        return meta
+
+    @staticmethod
+    def binary_response(meta, series):
+        """
+        Concatenated little-endian arrays (x as uint32, values as float32).
+        The ``X-Readings-Layout`` header lists ``field.name:dtype:length`` in
+        body order.
+        """
+        layout = []
+        parts = []
+        for field, arrays in series.items():
+            for name, array in arrays.items():
+                dtype = '<u4' if name == 'x' else '<f4'
+                parts.append(np.asarray(array).astype(dtype).tobytes())
+                layout.append(f'{field}.{name}:{dtype}:{len(array)}')
+        response = HttpResponse(b''.join(parts), content_type='application/octet-stream')
+        response['X-Readings-Layout'] = ';'.join(layout)
+        response['X-Readings-Rows'] = str(meta['rows'])
+        return response
+
+class AnomalyAPI(APIView):
+    """
+    Flagged readings of a dataset, oldest first:
+    ?after=<anomaly id>&limit=N&field=...&type=...&rule=...&kind=min|max|zscore
+    """
+    FILTERS = ('field', 'rule', 'kind')
+
+    def get(self, request, dataset_id):
+        params = urlencode(sorted(request.query_params.items()))
+        return cached_response(request, 'anomalies', lambda: self.build(request, dataset_id), f'{dataset_id}:{params}')
+
+    def build(self, request, dataset_id):
+        dataset = get_object_or_404(Dataset, id=dataset_id)
+        params = request.query_params
+        try:
+            limit = int(params.get('limit', settings.EQUIPMENT_ANOMALY_PAGE_SIZE))
+            after = int(params.get('after', 0))
+        except ValueError:
+            return Response({"error": "limit and after must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, settings.EQUIPMENT_ANOMALY_MAX_PAGE_SIZE))
+
+        anomalies = Anomaly.objects.filter(dataset=dataset, id__gt=after).select_related('type').order_by('id')
+        for name in self.FILTERS:
+            if params.get(name):
+                anomalies = anomalies.filter(**{name: params[name]})
+        if params.get('type'):
+            anomalies = anomalies.filter(type__name=params['type'])
+
+        page = list(anomalies[:limit + 1])
+        has_more = len(page) > limit
+        page = page[:limit]
+
+        response = Response(AnomalySerializer(page, many=True).data)
+        if has_more:
+            query = urlencode({**{key: value for key, value in params.items() if key != 'after'}, 'after': page[-1].id})
+            response['Link'] = f'<{request.build_absolute_uri(request.path)}?{query}>; rel="next"'
+        return response
+
+class CompareAPI(APIView):
+    """
+    Per-unit differences between two datasets:
+    ?a=<id>&b=<id>&order=name|flowrate|pressure|temperature&limit=N&offset=N&changed=1|0
+    """
+    def get(self, request):
+        params = request.query_params
+        ids = {key: params.get(key, '') for key in ('a', 'b')}
+        if not all(value.isdigit() for value in ids.values()):
+            return Response({"error": "a and b must be integer dataset ids"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(params.get('limit', settings.EQUIPMENT_COMPARE_PAGE_SIZE))
+            offset = int(params.get('offset', 0))
+        except ValueError:
+            return Response({"error": "limit and offset must be integers"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, settings.EQUIPMENT_COMPARE_MAX_PAGE_SIZE))
+        offset = max(0, offset)
+        order = params.get('order', 'flowrate')
+        if order not in COMPARE_ORDERINGS:
+            return Response({"error": f"order must be one of {COMPARE_ORDERINGS}"}, status=status.HTTP_400_BAD_REQUEST)
+        changed_only = params.get('changed', '1') not in ('0', 'false')
+
+        key = urlencode({**ids, 'limit': limit, 'offset': offset, 'order': order, 'changed': int(changed_only)})
+        return cached_response(
+            request, 'compare',
+            lambda: self.build(ids['a'], ids['b'], limit, offset, order, changed_only),
+            key,
+        )
+
+    def build(self, a, b, limit, offset, order, changed_only):
+        dataset_a = get_object_or_404(Dataset, id=a)
+        dataset_b = get_object_or_404(Dataset, id=b)
+        return Response(compare_datasets(dataset_a, dataset_b, limit, offset, order, changed_only))
+
+class ExportAPI(APIView):
+    """
+    Streams a dataset's readings: ?format=csv|ndjson|parquet. Gzip is applied
+    on the fly when the client accepts it.
+    """
+    def perform_content_negotiation(self, request, force=False):
+        # ?format selects the export encoding here, not a DRF renderer.
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, dataset_id):
+        dataset = get_object_or_404(Dataset, id=dataset_id)
+        fmt = request.query_params.get('format', 'csv')
+        try:
+            stream = export_stream(dataset, fmt, settings.EQUIPMENT_EXPORT_CHUNK_SIZE)
+        except ExportError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        content_type, extension = EXPORT_FORMATS[fmt]
+        gzip = bool(re_accepts_gzip.search(request.headers.get('Accept-Encoding', '')))
+        response = StreamingHttpResponse(compress_sequence(stream) if gzip else stream, content_type=content_type)
+        if gzip:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        response['Content-Disposition'] = f'attachment; filename="dataset_{dataset.id}.{extension}"'
+        return response
+
+class CacheStatsAPI(APIView):
+    def get(self, request):
+        return Response({
+            "data_version": get_data_version(),
+            "endpoints": cache_stats.snapshot(),
+        })
+
+class MetricsAPI(APIView):
+    def get(self, request):
+        return HttpResponse(metrics.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@require_GET
+def event_stream(request):
+    """
+    Server-sent ``dataset_created`` / ``dataset_pruned`` events; resumes after
+    ``Last-Event-ID`` (or ``?last_event_id=``) when given. A plain view, so
+    that DRF content negotiation does not turn away ``text/event-stream``, but
+    with the same authentication and permissions as the API views.
+    """
+    denied = check_access(request)
+    if denied is not None:
+        return denied
+    last_event_id = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    if isinstance(request, ASGIRequest):
+        content = events.astream(last_event_id)
+    else:
+        content = events.stream(last_event_id)
+    response = StreamingHttpResponse(content, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
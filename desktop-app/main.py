@@ -84,7 +84,7 @@ class ChemicalVisualizerApp(QMainWindow):
             self,
             "Select CSV File",
             "",
-            "CSV Files (*.csv);;All Files (*)"
+            "Data Files (*.csv *.csv.gz *.csv.zst *.parquet *.arrow *.feather);;All Files (*)"
         )
         
         if not file_path:
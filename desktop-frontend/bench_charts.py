@@ -0,0 +1,117 @@
+"""
+Frame time of a dashboard chart refresh.
+
+Compares the old refresh (clear both axes, restyle, rebuild the bar and pie
+artists and draw synchronously) with the in-place updates of ``BarChart`` and
+``PieChart``. Every refresh gets slightly different averages and type counts,
+as when polling a live backend, and is timed until Qt has painted it.
+
+    python bench_charts.py --refreshes 200
+
+Runs headless through Qt's offscreen platform unless QT_QPA_PLATFORM is set.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication, QHBoxLayout, QWidget
+
+from main import BarChart, MplCanvas, PieChart
+
+TYPES = ['Pump', 'Valve', 'Compressor', 'Reactor', 'HeatExchanger', 'Condenser']
+
+
+def sample_data(rng):
+    return {
+        'avg_flowrate': 120 + rng.uniform(-5, 5),
+        'avg_pressure': 6 + rng.uniform(-0.3, 0.3),
+        'avg_temperature': 110 + rng.uniform(-4, 4),
+        'type_distribution': {name: 1000 + rng.randint(-50, 50) for name in TYPES},
+    }
+
+
+def legacy_refresh(canvas_bar, canvas_pie, data):
+    canvas_bar.axes.cla()
+    canvas_bar.axes.set_facecolor("#0b0b0b")
+    canvas_bar.axes.tick_params(colors="white", which="both")
+    for spine in canvas_bar.axes.spines.values():
+        spine.set_color("white")
+    canvas_bar.axes.xaxis.label.set_color("white")
+    canvas_bar.axes.yaxis.label.set_color("white")
+    params = ['Flowrate', 'Pressure', 'Temp']
+    values = [data['avg_flowrate'], data['avg_pressure'], data['avg_temperature']]
+    canvas_bar.axes.bar(params, values, color='#4a9eff')
+    canvas_bar.axes.grid(True, color='#333', linestyle='--', linewidth=0.5)
+    canvas_bar.draw()
+
+    canvas_pie.axes.cla()
+    canvas_pie.axes.set_facecolor("#0b0b0b")
+    labels = list(data['type_distribution'].keys())
+    sizes = list(data['type_distribution'].values())
+    _, texts, autotexts = canvas_pie.axes.pie(
+        sizes, labels=labels, autopct='%1.1f%%', startangle=90, colors=PieChart.COLORS)
+    for text in texts + autotexts:
+        text.set_color('white')
+    canvas_pie.axes.axis('equal')
+    canvas_pie.draw()
+
+
+def incremental_refresh(canvas_bar, canvas_pie, data):
+    canvas_bar.set_values([data['avg_flowrate'], data['avg_pressure'], data['avg_temperature']])
+    canvas_pie.set_distribution(data['type_distribution'])
+
+
+def measure(app, refresh, canvas_bar, canvas_pie, refreshes, seed):
+    window = QWidget()
+    layout = QHBoxLayout(window)
+    layout.addWidget(canvas_bar)
+    layout.addWidget(canvas_pie)
+    window.resize(1000, 400)
+    window.show()
+
+    rng = random.Random(seed)
+    # Warm-up: the first refresh lays out the figures and caches backgrounds.
+    refresh(canvas_bar, canvas_pie, sample_data(rng))
+    app.processEvents()
+
+    frames = []
+    for _ in range(refreshes):
+        data = sample_data(rng)
+        started = time.perf_counter()
+        refresh(canvas_bar, canvas_pie, data)
+        app.processEvents()
+        frames.append((time.perf_counter() - started) * 1000)
+    window.close()
+    return frames
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measure dashboard chart refresh frame times.')
+    parser.add_argument('--refreshes', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    app = QApplication.instance() or QApplication(sys.argv)
+    results = {
+        'full redraw': measure(app, legacy_refresh, MplCanvas(), MplCanvas(), args.refreshes, args.seed),
+        'in place': measure(
+            app, incremental_refresh, BarChart(['Flowrate', 'Pressure', 'Temp']), PieChart(),
+            args.refreshes, args.seed),
+    }
+
+    print(f"{'refresh':<12} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for name, frames in results.items():
+        ordered = sorted(frames)
+        p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        print(f"{name:<12} {statistics.mean(frames):>9.2f} {statistics.median(frames):>9.2f} "
+              f"{p95:>9.2f} {max(frames):>9.2f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,16 +1,267 @@
 import sys
+import os
+import math
+import time
+import hashlib
+import json
 import requests
 import base64
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                              QHBoxLayout, QLabel, QLineEdit, QPushButton, 
-                             QFileDialog, QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox, QFrame, QScrollArea, QSizePolicy)
-from PyQt5.QtCore import Qt
+                             QFileDialog, QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox, QFrame, QScrollArea, QSizePolicy, QProgressBar)
+from PyQt5.QtCore import Qt, QThread, QThreadPool, QRunnable, QObject, pyqtSignal
 import matplotlib
 matplotlib.use('Qt5Agg')
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
 
 API_URL = "http://localhost:8000/api/"
+# (connect, read) seconds for every request.
+REQUEST_TIMEOUT = (5, 60)
+
+# One keep-alive connection pool shared by all worker threads.
+session = requests.Session()
+session.mount("http://", requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=8))
+session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=8))
+
+class TaskSignals(QObject):
+    done = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+class Task(QRunnable):
+    """
+    Runs ``fn`` on the global QThreadPool and delivers its return value (or
+    error message) to the GUI thread through ``signals``. Network calls and
+    JSON decoding happen inside ``fn`` so the window never waits on them.
+    """
+    active = set()
+
+    def __init__(self, fn):
+        super().__init__()
+        self.fn = fn
+        self.signals = TaskSignals()
+
+    def run(self):
+        try:
+            result = self.fn()
+        except Exception as e:
+            self.signals.failed.emit(str(e))
+        else:
+            self.signals.done.emit(result)
+
+def run_task(fn, on_done, on_failed=None):
+    task = Task(fn)
+    # Keep the task (and its signals) alive until a result is delivered.
+    task.setAutoDelete(False)
+    Task.active.add(task)
+
+    def finish(callback, value):
+        Task.active.discard(task)
+        if callback:
+            callback(value)
+
+    task.signals.done.connect(lambda result: finish(on_done, result))
+    task.signals.failed.connect(lambda error: finish(on_failed, error))
+    QThreadPool.globalInstance().start(task)
+    return task
+
+def get_json(path, auth):
+    r = session.get(API_URL + path, auth=auth, timeout=REQUEST_TIMEOUT)
+    return r.status_code, (r.json() if r.headers.get('Content-Type', '').startswith('application/json') else None)
+
+def format_average(value):
+    # Averages are null for a dataset without rows.
+    return "n/a" if value is None else f"{value:.2f}"
+
+PART_RETRIES = 5
+JOB_POLL_INTERVAL = 0.5
+JOB_TIMEOUT = 60 * 60   # seconds to wait for the server to ingest an upload
+
+class ChunkedUploadWorker(QThread):
+    """
+    Sends a file through the resumable /api/uploads/ protocol: parts go up
+    one at a time with their SHA-256 and failed parts are retried with
+    backoff. When ``upload_url`` belongs to an earlier attempt, only the parts
+    the server does not have yet are sent. After completion the worker
+    follows the ingest job until it finishes. The file's SHA-256 is declared
+    up front, so a file the server already holds is not sent again.
+    """
+    progress = pyqtSignal(int, int)        # bytes sent, total bytes
+    ingest_progress = pyqtSignal(int)      # rows processed
+    started_upload = pyqtSignal(str)       # upload URL, for resuming later
+    succeeded = pyqtSignal(dict)
+    failed = pyqtSignal(str)
+
+    def __init__(self, path, auth, upload_url=None):
+        super().__init__()
+        self.path = path
+        self.auth = auth
+        self.upload_url = upload_url
+
+    def request(self, method, url, **kwargs):
+        delay = 1
+        for attempt in range(PART_RETRIES):
+            try:
+                r = session.request(method, url, auth=self.auth, timeout=REQUEST_TIMEOUT, **kwargs)
+                if r.status_code < 500:
+                    return r
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == PART_RETRIES - 1:
+                    raise
+            time.sleep(delay)
+            delay = min(delay * 2, 30)
+        return r
+
+    def run(self):
+        try:
+            self.upload()
+        except Exception as e:
+            self.failed.emit(str(e))
+
+    def resume_state(self):
+        if not self.upload_url:
+            return None
+        r = self.request('GET', self.upload_url)
+        if r.status_code != 200 or r.json()['state'] != 'open':
+            return None
+        return r.json()
+
+    def file_sha256(self):
+        digest = hashlib.sha256()
+        with open(self.path, 'rb') as f:
+            while data := f.read(1024 * 1024):
+                digest.update(data)
+        return digest.hexdigest()
+
+    def upload(self):
+        size = os.path.getsize(self.path)
+        state = self.resume_state()
+        if state is None:
+            r = self.request('POST', API_URL + "uploads/", json={
+                'filename': os.path.basename(self.path), 'size': size, 'sha256': self.file_sha256(),
+            })
+            if r.status_code == 200 and r.json().get('dedup'):
+                self.progress.emit(size, size)
+                self.succeeded.emit(r.json())
+                return
+            if r.status_code != 201:
+                raise RuntimeError(f"Could not start upload: {r.text}")
+            info = r.json()
+            self.upload_url = info['upload_url']
+            part_size = info['part_size']
+            received = set()
+        else:
+            part_size = state['part_size']
+            received = set(state['parts'])
+        self.started_upload.emit(self.upload_url)
+
+        parts = max(1, -(-size // part_size))
+        sent = 0
+        with open(self.path, 'rb') as f:
+            for number in range(1, parts + 1):
+                if number in received:
+                    f.seek(part_size, os.SEEK_CUR)
+                else:
+                    data = f.read(part_size)
+                    r = self.request(
+                        'PUT', f"{self.upload_url}parts/{number}/", data=data,
+                        headers={
+                            'Content-Type': 'application/octet-stream',
+                            'X-Content-SHA256': hashlib.sha256(data).hexdigest(),
+                        },
+                    )
+                    if r.status_code not in (200, 201):
+                        raise RuntimeError(f"Part {number} failed: {r.text}")
+                sent = min(sent + part_size, size)
+                self.progress.emit(sent, size)
+
+        r = self.request('POST', f"{self.upload_url}complete/", json={'parts': parts})
+        if r.status_code != 202:
+            raise RuntimeError(f"Could not complete upload: {r.text}")
+        self.follow_job(r.json()['status_url'])
+
+    def follow_job(self, status_url):
+        deadline = time.monotonic() + JOB_TIMEOUT
+        while time.monotonic() < deadline:
+            r = self.request('GET', status_url)
+            if r.status_code != 200:
+                raise RuntimeError(f"Could not check the ingest job: {r.status_code} {r.text[:200]}")
+            job = r.json()
+            if job.get('status') == 'succeeded':
+                self.succeeded.emit(job)
+                return
+            if job.get('status') == 'failed':
+                raise RuntimeError(job.get('error') or "Ingest failed")
+            if job.get('status') not in ('queued', 'running'):
+                raise RuntimeError(f"Unexpected ingest job status: {job.get('status')!r}")
+            self.ingest_progress.emit(job.get('rows_processed') or 0)
+            time.sleep(JOB_POLL_INTERVAL)
+        raise RuntimeError(f"The server did not finish ingesting the upload within {JOB_TIMEOUT // 60} minutes")
+
+class EventListener(QThread):
+    """
+    Follows the server's /api/events/ stream and emits each dataset event
+    with its decoded payload. Dropped connections are reopened after the
+    server's retry delay and resume after the last event received, so no
+    upload or pruning is missed while reconnecting.
+    """
+    received = pyqtSignal(str, dict)      # event name, payload
+
+    def __init__(self, auth):
+        super().__init__()
+        self.auth = auth
+        self.last_event_id = None
+        self.retry = 5
+        self.response = None
+        self.stopping = False
+
+    def stop(self):
+        self.stopping = True
+        if self.response is not None:
+            self.response.close()
+        self.wait(2000)
+
+    def run(self):
+        while not self.stopping:
+            try:
+                self.listen()
+            except Exception:
+                pass
+            if not self.stopping:
+                time.sleep(self.retry)
+
+    def listen(self):
+        headers = {'Accept': 'text/event-stream'}
+        if self.last_event_id:
+            headers['Last-Event-ID'] = self.last_event_id
+        # The read timeout outlasts the server's keep-alive interval.
+        with session.get(API_URL + "events/", auth=self.auth, headers=headers,
+                         timeout=REQUEST_TIMEOUT, stream=True) as r:
+            self.response = r
+            if r.status_code != 200:
+                return
+            event_id, kind, data = None, 'message', []
+            for line in r.iter_lines(decode_unicode=True):
+                if self.stopping:
+                    return
+                if line:
+                    field, _, value = line.partition(':')
+                    value = value[1:] if value.startswith(' ') else value
+                    if field == 'id':
+                        event_id = value
+                    elif field == 'event':
+                        kind = value
+                    elif field == 'data':
+                        data.append(value)
+                    elif field == 'retry' and value.isdigit():
+                        self.retry = int(value) / 1000
+                    continue
+                # A blank line ends the event.
+                if data:
+                    if event_id:
+                        self.last_event_id = event_id
+                    self.received.emit(kind, json.loads('\n'.join(data)))
+                event_id, kind, data = None, 'message', []
 
 class LoginWindow(QWidget):
     def __init__(self):
@@ -87,16 +338,26 @@ class LoginWindow(QWidget):
         username = self.username.text()
         password = self.password.text()
         auth = requests.auth.HTTPBasicAuth(username, password)
-        try:
-            r = requests.get(API_URL + "summary/", auth=auth)
-            if r.status_code in [200, 404]:
-                self.open_dashboard(username, password)
-            elif r.status_code in [401, 403]:
-                QMessageBox.warning(self, "Login Failed", "Invalid credentials")
-            else:
-                self.open_dashboard(username, password)
-        except Exception as e:
-            QMessageBox.critical(self, "Connection Error", f"Could not connect: {e}")
+        self.btn_login.setEnabled(False)
+        self.btn_login.setText("Connecting...")
+        run_task(
+            lambda: session.get(API_URL + "summary/", auth=auth, timeout=REQUEST_TIMEOUT).status_code,
+            lambda status_code: self.on_login_checked(status_code, username, password),
+            self.on_login_error,
+        )
+
+    def on_login_checked(self, status_code, username, password):
+        self.btn_login.setEnabled(True)
+        self.btn_login.setText("Login")
+        if status_code in [401, 403]:
+            QMessageBox.warning(self, "Login Failed", "Invalid credentials")
+        else:
+            self.open_dashboard(username, password)
+
+    def on_login_error(self, error):
+        self.btn_login.setEnabled(True)
+        self.btn_login.setText("Login")
+        QMessageBox.critical(self, "Connection Error", f"Could not connect: {error}")
 
     def open_dashboard(self, username, password):
         self.dashboard = DashboardWindow(username, password)
@@ -104,6 +365,10 @@ class LoginWindow(QWidget):
         self.close()
 
 class MplCanvas(FigureCanvas):
+    """
+    Styled canvas that can refresh its animated artists by blitting them
+    over a cached background instead of redrawing the whole figure.
+    """
     def __init__(self, parent=None, width=5, height=4, dpi=100):
         fig = Figure(figsize=(width, height), dpi=dpi, facecolor="#0b0b0b")
         self.axes = fig.add_subplot(111)
@@ -119,6 +384,112 @@ class MplCanvas(FigureCanvas):
         self.setParent(parent)
         self.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.updateGeometry()
+        
+        self.animated = []
+        self.background = None
+        self.mpl_connect('draw_event', self.on_draw)
+
+    def set_animated(self, artists):
+        self.animated = list(artists)
+        for artist in self.animated:
+            artist.set_animated(True)
+
+    def on_draw(self, event):
+        # A full draw leaves the animated artists out; keep the result as
+        # the blitting background and paint them on top.
+        self.background = self.copy_from_bbox(self.figure.bbox)
+        self.draw_animated()
+
+    def draw_animated(self):
+        for artist in self.animated:
+            self.figure.draw_artist(artist)
+
+    def refresh(self, layout_changed=False):
+        """
+        Show updated artists. Only their data changed: blit them. Anything
+        else (limits, ticks, new artists): schedule one full redraw.
+        """
+        if layout_changed or self.background is None:
+            self.draw_idle()
+            return
+        self.restore_region(self.background)
+        self.draw_animated()
+        self.blit(self.figure.bbox)
+
+class BarChart(MplCanvas):
+    def __init__(self, labels, parent=None, color='#4a9eff'):
+        super().__init__(parent)
+        self.bars = self.axes.bar(labels, [0] * len(labels), color=color)
+        self.axes.grid(True, color='#333', linestyle='--', linewidth=0.5)
+        self.set_animated(self.bars)
+        self.values = None
+
+    def set_values(self, values):
+        values = list(values)
+        if values == self.values:
+            return
+        self.values = values
+        for bar, value in zip(self.bars, values):
+            bar.set_height(value)
+        
+        # Rescale only when the bars leave the axes or shrink to under half
+        # of it, so small changes keep the ticks and can be blitted.
+        low, high = self.axes.get_ylim()
+        needed_low, needed_high = min(0, min(values)), max(values)
+        rescale = needed_high > high or needed_low < low or needed_high < 0.5 * high
+        if rescale:
+            self.axes.set_ylim(needed_low * 1.2, max(needed_high * 1.2, 1e-9))
+        self.refresh(layout_changed=rescale)
+
+class PieChart(MplCanvas):
+    COLORS = ['#4a9eff', '#ff6b6b', '#4ecdc4', '#ffe66d', '#a8dadc']
+    START_ANGLE = 90
+    LABEL_DISTANCE = 1.1
+    PCT_DISTANCE = 0.6
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.labels = None
+        self.sizes = None
+
+    def set_distribution(self, distribution):
+        labels, sizes = list(distribution.keys()), list(distribution.values())
+        if labels == self.labels and sizes == self.sizes:
+            return
+        if labels != self.labels:
+            self.build(labels, sizes)
+            self.refresh(layout_changed=True)
+        else:
+            self.move_wedges(sizes)
+            self.refresh()
+        self.labels, self.sizes = labels, sizes
+
+    def build(self, labels, sizes):
+        self.axes.cla()
+        self.axes.set_facecolor("#0b0b0b")
+        self.wedges, self.texts, self.autotexts = self.axes.pie(
+            sizes, labels=labels, autopct='%1.1f%%', startangle=self.START_ANGLE, colors=self.COLORS,
+            labeldistance=self.LABEL_DISTANCE, pctdistance=self.PCT_DISTANCE)
+        for text in self.texts + self.autotexts:
+            text.set_color('white')
+        self.axes.axis('equal')
+        self.set_animated(self.wedges + self.texts + self.autotexts)
+
+    def move_wedges(self, sizes):
+        # Same geometry as Axes.pie: counter-clockwise from START_ANGLE.
+        total = float(sum(sizes)) or 1.0
+        theta1 = self.START_ANGLE
+        for wedge, text, autotext, size in zip(self.wedges, self.texts, self.autotexts, sizes):
+            theta2 = theta1 + 360 * size / total
+            wedge.set_theta1(theta1)
+            wedge.set_theta2(theta2)
+            middle = math.radians((theta1 + theta2) / 2)
+            x, y = math.cos(middle), math.sin(middle)
+            text.set_position((self.LABEL_DISTANCE * x, self.LABEL_DISTANCE * y))
+            text.set_horizontalalignment('left' if x > 0 else 'right')
+            autotext.set_position((self.PCT_DISTANCE * x, self.PCT_DISTANCE * y))
+            autotext.set_text(f"{100 * size / total:.1f}%")
+            theta1 = theta2
 
 class Card(QFrame):
     def __init__(self):
@@ -156,6 +527,12 @@ class DashboardWindow(QMainWindow):
         
         self.main_layout.addStretch()
 
+        self.history = []
+        # Other clients' uploads and retention show up without a refresh.
+        self.event_listener = EventListener(self.auth)
+        self.event_listener.received.connect(self.on_server_event)
+        self.event_listener.start()
+
     def setup_header(self):
         header = QHBoxLayout()
         
@@ -213,6 +590,12 @@ class DashboardWindow(QMainWindow):
         row.addStretch()
         
         layout.addLayout(row)
+        
+        self.upload_progress = QProgressBar()
+        self.upload_progress.setStyleSheet("background-color: #0b0b0b; color: #e0e0e0; border: 1px solid #333;")
+        self.upload_progress.setFixedHeight(16)
+        self.upload_progress.hide()
+        layout.addWidget(self.upload_progress)
         self.main_layout.addWidget(group_box)
 
     def setup_metrics_section(self):
@@ -254,12 +637,12 @@ class DashboardWindow(QMainWindow):
         
         bar_card = Card()
         bar_layout = QVBoxLayout(bar_card)
-        self.canvas_bar = MplCanvas(self)
+        self.canvas_bar = BarChart(['Flowrate', 'Pressure', 'Temp'], self)
         bar_layout.addWidget(self.canvas_bar)
         
         pie_card = Card()
         pie_layout = QVBoxLayout(pie_card)
-        self.canvas_pie = MplCanvas(self)
+        self.canvas_pie = PieChart(self)
         pie_layout.addWidget(self.canvas_pie)
         
         layout.addWidget(bar_card)
@@ -307,7 +690,7 @@ class DashboardWindow(QMainWindow):
         self.main_layout.addWidget(self.history_card)
 
     def browse_file(self):
-        fname, _ = QFileDialog.getOpenFileName(self, 'Open CSV', '.', "CSV Files (*.csv)")
+        fname, _ = QFileDialog.getOpenFileName(self, 'Open CSV', '.', "Data Files (*.csv *.csv.gz *.csv.zst *.parquet *.arrow *.feather)")
         if fname:
             self.selected_file = fname
             self.lbl_file.setText(fname.split('/')[-1])
@@ -319,36 +702,67 @@ class DashboardWindow(QMainWindow):
         if not hasattr(self, 'selected_file') or not self.selected_file:
             QMessageBox.warning(self, "Warning", "Please select a file first.")
             return
-            
-        try:
-            files = {'file': open(self.selected_file, 'rb')}
-            self.lbl_upload_status.setText("Uploading...")
-            
-            r = requests.post(API_URL + "upload/", files=files, auth=self.auth)
-            
-            if r.status_code == 201:
-                self.lbl_upload_status.setText("Upload successful!")
-                self.load_data()
-            else:
-                self.lbl_upload_status.setText("Upload Failed")
-                QMessageBox.warning(self, "Error", f"Upload Failed: {r.text}")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", str(e))
-            self.lbl_upload_status.setText("Error")
+        if getattr(self, 'upload_worker', None) and self.upload_worker.isRunning():
+            return
+        
+        # An interrupted upload of the same file resumes where it stopped.
+        stat = os.stat(self.selected_file)
+        key = (self.selected_file, stat.st_size, stat.st_mtime)
+        self.pending_uploads = getattr(self, 'pending_uploads', {})
+        
+        self.upload_worker = ChunkedUploadWorker(self.selected_file, self.auth, self.pending_uploads.get(key))
+        self.upload_worker.started_upload.connect(lambda url: self.pending_uploads.__setitem__(key, url))
+        self.upload_worker.progress.connect(self.on_upload_progress)
+        self.upload_worker.ingest_progress.connect(
+            lambda rows: self.lbl_upload_status.setText(f"Processing... {rows:,} rows"))
+        self.upload_worker.succeeded.connect(lambda job: self.on_upload_finished(key, job))
+        self.upload_worker.failed.connect(self.on_upload_failed)
+        
+        self.btn_upload.setEnabled(False)
+        self.upload_progress.setValue(0)
+        self.upload_progress.show()
+        self.lbl_upload_status.setText("Uploading...")
+        self.upload_worker.start()
+
+    def on_upload_progress(self, sent, total):
+        self.upload_progress.setMaximum(max(total, 1))
+        self.upload_progress.setValue(sent)
+
+    def on_upload_finished(self, key, job):
+        self.pending_uploads.pop(key, None)
+        self.btn_upload.setEnabled(True)
+        self.upload_progress.hide()
+        if job.get('dedup'):
+            self.lbl_upload_status.setText("Already uploaded - showing the existing dataset")
+        else:
+            self.lbl_upload_status.setText(f"Upload successful! {job['rows_processed']:,} rows")
+        self.load_data()
+
+    def on_upload_failed(self, error):
+        self.btn_upload.setEnabled(True)
+        self.lbl_upload_status.setText("Upload Failed - click Upload to resume")
+        QMessageBox.warning(self, "Error", f"Upload Failed: {error}")
 
     def load_data(self):
-        try:
-            r_sum = requests.get(API_URL + "summary/", auth=self.auth)
-            if r_sum.status_code == 200:
-                data = r_sum.json()
-                if 'total_equipment' in data:
-                    self.update_summary_ui(data)
-            
-            r_hist = requests.get(API_URL + "history/", auth=self.auth)
-            if r_hist.status_code == 200:
-                self.update_history_table(r_hist.json())
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Failed to load data: {e}")
+        # Summary and history are fetched concurrently; responses from an
+        # older refresh that arrive late are dropped.
+        self.load_generation = getattr(self, 'load_generation', 0) + 1
+        generation = self.load_generation
+        run_task(lambda: get_json("summary/", self.auth),
+                 lambda result: self.on_summary_loaded(generation, *result), self.on_load_failed)
+        run_task(lambda: get_json("history/", self.auth),
+                 lambda result: self.on_history_loaded(generation, *result), self.on_load_failed)
+
+    def on_summary_loaded(self, generation, status_code, data):
+        if generation == self.load_generation and status_code == 200 and data and data.get('total_equipment'):
+            self.update_summary_ui(data)
+
+    def on_history_loaded(self, generation, status_code, data):
+        if generation == self.load_generation and status_code == 200 and data is not None:
+            self.update_history_table(data)
+
+    def on_load_failed(self, error):
+        self.lbl_upload_status.setText(f"Failed to load data: {error}")
 
     def update_summary_ui(self, data):
         self.lbl_placeholder.hide()
@@ -356,38 +770,35 @@ class DashboardWindow(QMainWindow):
         self.charts_container.show()
         
         self.lbl_metric_total.setText(f"Total Equipment: {data['total_equipment']}")
-        self.lbl_metric_flow.setText(f"Avg Flow: {data['avg_flowrate']:.2f}")
-        self.lbl_metric_press.setText(f"Avg Pressure: {data['avg_pressure']:.2f}")
-        self.lbl_metric_temp.setText(f"Avg Temp: {data['avg_temperature']:.2f}")
-        
-        self.canvas_bar.axes.cla()
-        self.canvas_bar.axes.set_facecolor("#0b0b0b")
-        self.canvas_bar.axes.tick_params(colors="white", which="both")
-        for spine in self.canvas_bar.axes.spines.values():
-            spine.set_color("white")
-        self.canvas_bar.axes.xaxis.label.set_color("white")
-        self.canvas_bar.axes.yaxis.label.set_color("white")
-        
-        params = ['Flowrate', 'Pressure', 'Temp']
-        values = [data['avg_flowrate'], data['avg_pressure'], data['avg_temperature']]
-        self.canvas_bar.axes.bar(params, values, color='#4a9eff')
-        self.canvas_bar.axes.grid(True, color='#333', linestyle='--', linewidth=0.5)
-        self.canvas_bar.draw()
-        
-        self.canvas_pie.axes.cla()
-        self.canvas_pie.axes.set_facecolor("#0b0b0b")
-        labels = list(data['type_distribution'].keys())
-        sizes = list(data['type_distribution'].values())
-        colors = ['#4a9eff', '#ff6b6b', '#4ecdc4', '#ffe66d', '#a8dadc']
-        wedges, texts, autotexts = self.canvas_pie.axes.pie(sizes, labels=labels, autopct='%1.1f%%', startangle=90, colors=colors)
-        for text in texts:
-            text.set_color('white')
-        for autotext in autotexts:
-            autotext.set_color('white')
-        self.canvas_pie.axes.axis('equal')
-        self.canvas_pie.draw()
+        self.lbl_metric_flow.setText(f"Avg Flow: {format_average(data.get('avg_flowrate'))}")
+        self.lbl_metric_press.setText(f"Avg Pressure: {format_average(data.get('avg_pressure'))}")
+        self.lbl_metric_temp.setText(f"Avg Temp: {format_average(data.get('avg_temperature'))}")
+        
+        # Both charts keep their artists and only move them.
+        averages = [data.get('avg_flowrate'), data.get('avg_pressure'), data.get('avg_temperature')]
+        self.canvas_bar.set_values([value or 0 for value in averages])
+        self.canvas_pie.set_distribution(data.get('type_distribution') or {})
+
+    def on_server_event(self, kind, payload):
+        if kind == 'dataset_created':
+            summary = payload.get('summary') or {}
+            if summary.get('id') is None:
+                return
+            self.update_history_table(
+                [summary] + [row for row in self.history if row['id'] != summary['id']])
+            # Only follow new uploads once the charts are on screen.
+            if not self.metrics_card.isHidden():
+                self.update_summary_ui(summary)
+        elif kind == 'dataset_pruned':
+            pruned = set(payload['dataset_ids'])
+            self.update_history_table([row for row in self.history if row['id'] not in pruned])
+
+    def closeEvent(self, event):
+        self.event_listener.stop()
+        super().closeEvent(event)
 
     def update_history_table(self, history):
+        self.history = history
         self.table.setRowCount(len(history))
         for i, row in enumerate(history):
             self.table.setItem(i, 0, QTableWidgetItem(str(row['id'])))
@@ -395,18 +806,32 @@ class DashboardWindow(QMainWindow):
             self.table.setItem(i, 2, QTableWidgetItem(str(row['total_equipment'])))
 
     def download_pdf(self):
-        try:
-            fname, _ = QFileDialog.getSaveFileName(self, 'Save PDF Report', 'summary_report.pdf', "PDF Files (*.pdf)")
-            if fname:
-                r = requests.get(API_URL + "report_pdf/", auth=self.auth)
-                if r.status_code == 200:
-                    with open(fname, 'wb') as f:
-                        f.write(r.content)
-                    QMessageBox.information(self, "Success", "PDF Report saved successfully!")
-                else:
-                    QMessageBox.warning(self, "Error", "Failed to generate report.")
-        except Exception as e:
-            QMessageBox.critical(self, "Error", str(e))
+        fname, _ = QFileDialog.getSaveFileName(self, 'Save PDF Report', 'summary_report.pdf', "PDF Files (*.pdf)")
+        if not fname:
+            return
+
+        def fetch():
+            with session.get(API_URL + "report_pdf/", auth=self.auth, timeout=REQUEST_TIMEOUT, stream=True) as r:
+                if r.status_code != 200:
+                    return False
+                with open(fname, 'wb') as f:
+                    for chunk in r.iter_content(64 * 1024):
+                        f.write(chunk)
+            return True
+
+        self.btn_download.setEnabled(False)
+        run_task(fetch, self.on_pdf_saved, self.on_pdf_failed)
+
+    def on_pdf_saved(self, ok):
+        self.btn_download.setEnabled(True)
+        if ok:
+            QMessageBox.information(self, "Success", "PDF Report saved successfully!")
+        else:
+            QMessageBox.warning(self, "Error", "Failed to generate report.")
+
+    def on_pdf_failed(self, error):
+        self.btn_download.setEnabled(True)
+        QMessageBox.critical(self, "Error", error)
 
 def main():
     app = QApplication(sys.argv)
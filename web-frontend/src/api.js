@@ -11,4 +11,14 @@ export const setAuthToken = (username, password) => {
     api.defaults.headers.common['Authorization'] = `Basic ${token}`;
 };
 
+// Server-sent dataset events. EventSource reconnects by itself and resumes
+// after the last event it received. Returns a function that closes the stream.
+export const subscribeEvents = (handlers) => {
+    const source = new EventSource(`${API_URL}events/`);
+    Object.entries(handlers).forEach(([kind, handler]) => {
+        source.addEventListener(kind, (event) => handler(JSON.parse(event.data)));
+    });
+    return () => source.close();
+};
+
 export default api;
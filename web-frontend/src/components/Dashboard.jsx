@@ -1,5 +1,5 @@
 import React, { useState, useEffect } from 'react';
-import api from '../api';
+import api, { subscribeEvents } from '../api';
 import {
     Chart as ChartJS,
     CategoryScale,
@@ -53,6 +53,18 @@ const Dashboard = () => {
         // Do NOT fetch summary on mount, per user request.
     }, []);
 
+    // Live updates from other uploads and retention, without refetching.
+    useEffect(() => subscribeEvents({
+        dataset_created: ({ summary: created }) => {
+            if (created?.id == null) return;
+            setHistory(prev => [created, ...prev.filter(item => item.id !== created.id)]);
+            setSummary(prev => (prev ? created : prev));
+        },
+        dataset_pruned: ({ dataset_ids }) => {
+            setHistory(prev => prev.filter(item => !dataset_ids.includes(item.id)));
+        },
+    }), []);
+
     const handleUpload = async (e) => {
         e.preventDefault();
         if (!file) return;
@@ -141,7 +153,7 @@ const Dashboard = () => {
             <div className="card">
                 <h3>Upload Dataset</h3>
                 <form onSubmit={handleUpload} style={{ display: 'flex', gap: '10px', alignItems: 'center' }}>
-                    <input type="file" accept=".csv" onChange={e => setFile(e.target.files[0])} />
+                    <input type="file" accept=".csv,.gz,.zst,.parquet,.arrow,.feather" onChange={e => setFile(e.target.files[0])} />
                     <button type="submit" className="btn btn-primary" disabled={!file || loading}>
                         {loading ? 'Uploading...' : 'Upload CSV'}
                     </button>